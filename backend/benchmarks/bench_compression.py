@@ -0,0 +1,119 @@
+"""Bytes on the wire and server CPU per response, by payload mode and encoding.
+
+Sends the same /analyze-image/ (in each ``image`` mode) and /generate-recipe/
+request ``--repeat`` times straight into the ASGI app, with the stub models
+and warm caches, and reports the response size and the process CPU time per
+request for each Accept-Encoding, plus the CPU spent in compression alone
+(the rest is mostly parsing the upload). The ``304`` rows repeat the request
+with the ETag of the previous response. Responses under
+``COMPRESSION_MIN_SIZE`` are sent as is. ``br`` is only measured if the
+optional brotli package is installed.
+
+    python benchmarks/bench_compression.py --repeat 50
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import sys
+import time
+
+import httpx
+
+os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "memory")
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "memory")
+
+from fake_gemini import BACKEND_DIR, import_main, install_stub_models  # noqa: E402
+
+sys.path.insert(0, BACKEND_DIR)
+
+from compression import available_encodings, compress  # noqa: E402
+
+PHOTO = sorted(glob.glob(os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")))[0]
+
+
+async def send_raw(app, request):
+    """Run ``request`` through the ASGI app; returns (status, headers, body bytes as sent)."""
+    body = request.read()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": request.method,
+        "scheme": "http", "server": ("bench", 80), "client": ("127.0.0.1", 1), "root_path": "",
+        "path": request.url.path, "raw_path": request.url.raw_path, "query_string": request.url.query,
+        "headers": [(name.lower(), value) for name, value in request.headers.raw],
+    }
+    received = False
+    messages = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    headers = {name.decode(): value.decode() for name, value in messages[0]["headers"]}
+    return messages[0]["status"], headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+async def measure(app, build, encoding, repeat, revalidate=False):
+    status, headers, body = await send_raw(app, build(encoding, None))
+    etag = headers.get("etag") if revalidate else None
+    start = time.process_time()
+    for _ in range(repeat):
+        status, headers, body = await send_raw(app, build(encoding, etag))
+    cpu = (time.process_time() - start) / repeat
+    compress_cpu = 0.0
+    if "content-encoding" in headers:
+        _, _, plain = await send_raw(app, build("identity", None))
+        start = time.process_time()
+        for _ in range(repeat):
+            compress(plain, encoding)
+        compress_cpu = (time.process_time() - start) / repeat
+    return status, len(body), cpu, compress_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    main_module = import_main()
+    logging.disable(logging.INFO)
+    install_stub_models(main_module, latency=0)
+
+    with open(PHOTO, "rb") as f:
+        photo = f.read()
+
+    def analyze(mode):
+        def build(encoding, etag):
+            headers = {"accept-encoding": encoding, **({"if-none-match": etag} if etag else {})}
+            return httpx.Request("POST", f"http://bench/analyze-image/?image={mode}", headers=headers,
+                                 files={"file": ("photo.jpg", photo, "image/jpeg")})
+        return build
+
+    def recipe(encoding, etag):
+        headers = {"accept-encoding": encoding, **({"if-none-match": etag} if etag else {})}
+        return httpx.Request("POST", "http://bench/generate-recipe/", headers=headers,
+                             json={"ingredients": ["eggs", "milk", "bread"], "preferences": {}})
+
+    cases = [(f"analyze {mode}", analyze(mode)) for mode in ("base64", "url", "boxes", "none")]
+    cases.append(("recipe", recipe))
+    encodings = ["identity", *available_encodings("br,gzip")]
+    print(f"{os.path.basename(PHOTO)} ({len(photo)} bytes), {args.repeat} requests per row")
+    print(f"{'request':<16} {'encoding':<9} {'status':>6} {'bytes':>9} {'cpu/request':>12} {'compress':>9}")
+    for name, build in cases:
+        rows = [(encoding, False) for encoding in encodings] + [("304", True)]
+        for label, revalidate in rows:
+            encoding = encodings[-1] if revalidate else label
+            status, size, cpu, compress_cpu = asyncio.run(
+                measure(main_module.app, build, encoding, args.repeat, revalidate))
+            print(f"{name:<16} {label:<9} {status:>6} {size:>9} {cpu * 1000:>10.2f}ms {compress_cpu * 1000:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
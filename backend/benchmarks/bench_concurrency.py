@@ -0,0 +1,108 @@
+"""Load benchmark for the Gemini call path.
+
+Runs N concurrent clients against /generate-recipe/ with the models replaced by
+a stub that takes ``--latency`` seconds per call, and reports p50/p99 latency
+and throughput. The app is served by uvicorn in a background thread so the
+clients measure real wall-clock latency. "before" calls the blocking SDK method on the event loop (what
+main.py used to do), "after" goes through gemini_client.ModelClient. Both runs send the same requests, so
+the result caches and the recipe store are off; so is the Gemini rate limit (see bench_scheduler.py), which
+would otherwise set the pace instead of the call path.
+
+    python benchmarks/bench_concurrency.py --clients 32 --requests 128
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+# Every request must reach the model, in both runs
+for name in ("ANALYSIS_CACHE_BACKEND", "RECIPE_CACHE_BACKEND", "LABELED_IMAGE_CACHE_BACKEND", "RECIPE_STORE_BACKEND"):
+    os.environ.setdefault(name, "none")
+os.environ.setdefault("GEMINI_RPM", "0")
+
+from fake_gemini import BackgroundServer, import_main, install_stub_models, unique_ingredient  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+
+class BlockingClient:
+    """The old behaviour: call generate_content directly on the event loop."""
+
+    async def generate_content(self, model, contents, priority=None, **kwargs):
+        return model.generate_content(contents, **kwargs)
+
+    def shutdown(self):
+        pass
+
+
+async def run_load(base_url, clients, total_requests):
+    latencies = []
+    health_latencies = []
+    queue = asyncio.Queue()
+    for index in range(total_requests):
+        queue.put_nowait(index)
+
+    limits = httpx.Limits(max_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # Distinct ingredients per request so single-flight never shares a call
+                payload = {"ingredients": ["eggs", "milk", unique_ingredient(index)], "preferences": {}}
+                start = time.perf_counter()
+                response = await client.post("/generate-recipe/", json=payload)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        async def health_probe():
+            # /test/ should stay fast no matter how many model calls are pending
+            while not queue.empty():
+                start = time.perf_counter()
+                await client.get("/test/")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.05)
+
+        start = time.perf_counter()
+        await asyncio.gather(health_probe(), *(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return latencies, health_latencies, elapsed
+
+
+def report(label, latencies, health_latencies, elapsed):
+    print(
+        f"{label:<8} p50={percentile(latencies, 50) * 1000:8.1f}ms "
+        f"p99={percentile(latencies, 99) * 1000:8.1f}ms "
+        f"req/s={len(latencies) / elapsed:7.1f} "
+        f"/test/ p99={percentile(health_latencies, 99) * 1000:8.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=128)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub Gemini latency in seconds")
+    args = parser.parse_args()
+
+    app_module = import_main()
+    install_stub_models(app_module, args.latency)
+    async_client = app_module.model_client
+
+    print(f"{args.clients} clients, {args.requests} requests, {args.latency * 1000:.0f}ms stub Gemini latency")
+
+    app_module.model_client = BlockingClient()
+    with BackgroundServer(app_module.app) as base_url:
+        report("before", *asyncio.run(run_load(base_url, args.clients, args.requests)))
+
+    app_module.model_client = async_client
+    with BackgroundServer(app_module.app) as base_url:
+        report("after", *asyncio.run(run_load(base_url, args.clients, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare the serial / hedged / race vision fallback strategies.
+
+Simulates the pro and flash models with log-normal latencies and configurable
+error and empty-result rates, runs the same seeded traffic through each
+strategy and reports request p50/p95 plus per-model win rates. Latencies are
+in milliseconds of simulated time so a run takes a few seconds.
+
+    python benchmarks/bench_fallback.py --requests 300 --hedge-delay 0.25
+"""
+import argparse
+import asyncio
+import random
+import sys
+
+from fake_gemini import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from fallback import STRATEGIES, FallbackRunner  # noqa: E402
+
+
+def make_model(rng, median, sigma, error_rate, empty_rate):
+    async def call():
+        await asyncio.sleep(median * rng.lognormvariate(0, sigma))
+        roll = rng.random()
+        if roll < error_rate:
+            raise RuntimeError("simulated 503")
+        if roll < error_rate + empty_rate:
+            return [], []
+        return ["milk"], [("milk", [0.1, 0.1, 0.5, 0.5])]
+    return call
+
+
+async def run_strategy(strategy, args):
+    rng = random.Random(args.seed)
+    runner = FallbackRunner(strategy=strategy, hedge_delay=args.hedge_delay)
+    primary = make_model(rng, args.pro_median, args.sigma, args.pro_errors, args.pro_empty)
+    backup = make_model(rng, args.flash_median, args.sigma, args.flash_errors, args.flash_empty)
+
+    async def one_request():
+        await runner.run(
+            [("gemini-1.5-pro", primary, args.timeout), ("gemini-2.0-flash", backup, args.timeout)],
+            usable=lambda result: bool(result[1]),
+        )
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def bounded():
+        async with semaphore:
+            try:
+                await one_request()
+            except Exception:
+                pass
+
+    await asyncio.gather(*(bounded() for _ in range(args.requests)))
+    return runner.stats.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--hedge-delay", type=float, default=0.25)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--sigma", type=float, default=0.5, help="log-normal spread of model latency")
+    parser.add_argument("--pro-median", type=float, default=0.2)
+    parser.add_argument("--pro-errors", type=float, default=0.05)
+    parser.add_argument("--pro-empty", type=float, default=0.05)
+    parser.add_argument("--flash-median", type=float, default=0.08)
+    parser.add_argument("--flash-errors", type=float, default=0.02)
+    parser.add_argument("--flash-empty", type=float, default=0.1)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, hedge delay {args.hedge_delay * 1000:.0f}ms")
+    for strategy in STRATEGIES:
+        snapshot = asyncio.run(run_strategy(strategy, args))
+        overall = snapshot["strategies"][strategy]
+        wins = ", ".join(
+            f"{name} win_rate={model['win_rate']} p95={model['p95']}"
+            for name, model in snapshot["models"].items()
+        )
+        print(f"{strategy:<7} p50={overall['p50'] * 1000:7.1f}ms p95={overall['p95'] * 1000:7.1f}ms  {wins}")
+
+
+if __name__ == "__main__":
+    main()
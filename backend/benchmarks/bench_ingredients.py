@@ -0,0 +1,96 @@
+"""Ingredient canonicalization: lookup throughput, and its effect on prompts and cache keys.
+
+The label corpus is every alias in ``ingredient_aliases.json`` dressed up the
+way the vision model names things ("fresh ... ", "... jar", "2 ..."), plus
+labels the table does not know.
+
+* "memoized": ``lookup`` on labels seen before (the steady state)
+* "cold": the trie walk alone, as for a label seen for the first time
+* "prepare": canonicalize a 12-item request and drop its allergens
+* prompt / cache keys: recipe prompts and distinct recipe cache keys for the
+  same fridges described with different packaging words
+
+    python benchmarks/bench_ingredients.py --repeat 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from fake_gemini import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from canonical import recipe_request_key  # noqa: E402
+from ingredients import IngredientIndex, ingredient_index  # noqa: E402
+from prompts import build_recipe_prompt  # noqa: E402
+
+DRESSINGS = ("{}", "{} jar", "{} bottle", "fresh {}", "2 {}", "{} carton", "open {} container", "{} (large)")
+UNKNOWN = ("kimchi jar", "miso paste", "tahini", "sauerkraut", "harissa tube", "gochujang", "fish sauce bottle")
+
+
+def corpus(size, seed=0):
+    with open(os.path.join(BACKEND_DIR, "ingredient_aliases.json"), encoding="utf-8") as f:
+        table = json.load(f)
+    names = [name for canonical, aliases in table["ingredients"].items() for name in (canonical, *aliases)]
+    rng = random.Random(seed)
+    labels = []
+    while len(labels) < size:
+        if rng.random() < 0.05:
+            labels.append(rng.choice(UNKNOWN))
+        else:
+            labels.append(rng.choice(DRESSINGS).format(rng.choice(names)))
+    return labels
+
+
+def per_ms(fn, labels, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for label in labels:
+            fn(label)
+        best = min(best, time.perf_counter() - start)
+    return len(labels) / best / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--labels", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    labels = corpus(args.labels)
+    fresh = IngredientIndex.from_file()
+    for label in labels:
+        fresh.lookup(label)
+    print(f"{'memoized lookup':<18}{per_ms(fresh.lookup, labels, args.repeat):>9.0f} labels/ms")
+    print(f"{'cold lookup':<18}{per_ms(fresh._resolve, labels, args.repeat):>9.0f} labels/ms")
+
+    rng = random.Random(1)
+    requests = [rng.sample(labels, 12) for _ in range(1000)]
+    preferences = {"allergies": ["dairy", "peanuts"], "avoidIngredients": ["mushrooms"]}
+    start = time.perf_counter()
+    for request in requests:
+        ingredient_index.prepare(request, preferences)
+    print(f"{'prepare':<18}{(time.perf_counter() - start) / len(requests) * 1e6:>9.1f} us per 12-item request")
+
+    # The same five items, described three ways by the vision model
+    fridges = [
+        ["strawberry jam jar", "milk bottle", "cheddar cheese", "eggs", "spinach"],
+        ["jam", "2% milk carton", "sharp cheddar", "egg carton", "baby spinach"],
+        ["Strawberry Jam", "whole milk", "cheddar cheese block", "brown eggs", "fresh spinach"],
+    ]
+    prompt_raw = sum(len(build_recipe_prompt(fridge, preferences)) for fridge in fridges) / len(fridges)
+    canonical = [ingredient_index.prepare(fridge, preferences)[0] for fridge in fridges]
+    prompt_canonical = sum(len(build_recipe_prompt(fridge, preferences)) for fridge in canonical) / len(canonical)
+    print(f"{'prompt chars':<18}{prompt_raw:>9.0f} raw -> {prompt_canonical:.0f} canonical "
+          f"(allergens removed: {fridges[0]} -> {canonical[0]})")
+    keys_raw = {recipe_request_key(fridge, preferences) for fridge in fridges}
+    keys_canonical = {recipe_request_key(fridge, preferences) for fridge in canonical}
+    print(f"{'cache keys':<18}{len(keys_raw):>9} raw -> {len(keys_canonical)} canonical for {len(fridges)} equivalent fridges")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Blocking analyze + recipe round-trips versus the /jobs/ pipeline, behind a proxy timeout.
+
+``--clients`` users each turn a photo into recipes, with the stub models
+answering after ``--latency`` seconds and the result caches and recipe store
+off:
+
+* blocking: POST /analyze-image/, then POST /generate-recipe/ with its ingredients
+* jobs+poll: POST /jobs/, then GET /jobs/{id} every ``--poll`` seconds
+* jobs+sse: POST /jobs/, then follow GET /jobs/{id}/events to the end
+
+Reports the longest single HTTP request (what a proxy timeout is measured
+against; for SSE, the longest silence between events or keepalives), how many
+exceed ``--proxy-timeout``, and end-to-end time. ``--job-concurrency`` below
+``--clients`` shows the cost of queueing jobs.
+
+    python benchmarks/bench_jobs.py --clients 16 --latency 2 --proxy-timeout 1.5
+"""
+import argparse
+import asyncio
+import io
+import logging
+import os
+import time
+
+import httpx
+
+os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "none")
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "none")
+os.environ.setdefault("RECIPE_STORE_BACKEND", "none")
+os.environ.setdefault("JOB_EVENTS_KEEPALIVE", "0.5")
+
+from fake_gemini import BackgroundServer, import_main, install_stub_models  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+
+def photo(index):
+    """A small JPEG that differs per client, so uploads are not coalesced."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (index % 256, 64, 128)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class Timed:
+    """Durations of every HTTP request a flow makes."""
+
+    def __init__(self, client):
+        self.client = client
+        self.durations = []
+
+    async def request(self, method, url, **kwargs):
+        start = time.perf_counter()
+        response = await self.client.request(method, url, **kwargs)
+        self.durations.append(time.perf_counter() - start)
+        response.raise_for_status()
+        return response
+
+
+async def blocking(timed, index, args):
+    files = {"file": (f"photo{index}.jpg", photo(index), "image/jpeg")}
+    analysis = (await timed.request("POST", "/analyze-image/?image=boxes", files=files)).json()
+    payload = {"ingredients": analysis["ingredients"], "preferences": {}}
+    return (await timed.request("POST", "/generate-recipe/", json=payload)).json()
+
+
+async def submit(timed, index):
+    files = {"file": (f"photo{index}.jpg", photo(index), "image/jpeg")}
+    return (await timed.request("POST", "/jobs/", files=files)).json()["id"]
+
+
+async def jobs_poll(timed, index, args):
+    job_id = await submit(timed, index)
+    while True:
+        job = (await timed.request("GET", f"/jobs/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed", "cancelled"):
+            return job["results"].get("recipes")
+        await asyncio.sleep(args.poll)
+
+
+async def jobs_sse(timed, index, args):
+    job_id = await submit(timed, index)
+    # An event stream is one long request, but it is never idle for longer than the keepalive
+    start = time.perf_counter()
+    async with timed.client.stream("GET", f"/jobs/{job_id}/events") as response:
+        async for line in response.aiter_lines():
+            if line.startswith(("event:", ":")):
+                timed.durations.append(time.perf_counter() - start)
+                start = time.perf_counter()
+
+
+async def run_flow(base_url, flow, args):
+    timings = []
+    totals = []
+
+    async def user(client, index):
+        timed = Timed(client)
+        start = time.perf_counter()
+        await flow(timed, index, args)
+        totals.append(time.perf_counter() - start)
+        timings.extend(timed.durations)
+
+    limits = httpx.Limits(max_connections=args.clients * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        await asyncio.gather(*(user(client, index) for index in range(args.clients)))
+    return timings, totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=2.0)
+    parser.add_argument("--poll", type=float, default=0.25)
+    parser.add_argument("--proxy-timeout", type=float, default=1.5)
+    parser.add_argument("--job-concurrency", type=int, default=None, help="default: one per client")
+    args = parser.parse_args()
+
+    app = import_main()
+    logging.disable(logging.INFO)
+    install_stub_models(app, args.latency)
+    app.job_manager.concurrency = args.job_concurrency or args.clients
+    print(f"{args.clients} clients, model latency {args.latency}s, proxy timeout {args.proxy_timeout}s, "
+          f"job concurrency {app.job_manager.concurrency}")
+    print(f"{'flow':<10} {'requests':>8} {'longest':>8} {'over timeout':>12} {'e2e p50':>8} {'e2e p95':>8}")
+    # A real server, so the event stream is delivered as it is written
+    with BackgroundServer(app.app) as base_url:
+        for name, flow in (("blocking", blocking), ("jobs+poll", jobs_poll), ("jobs+sse", jobs_sse)):
+            timings, totals = asyncio.run(run_flow(base_url, flow, args))
+            over = sum(1 for seconds in timings if seconds > args.proxy_timeout)
+            print(f"{name:<10} {len(timings):>8} {max(timings):>7.2f}s {over:>12} "
+                  f"{percentile(totals, 50):>7.2f}s {percentile(totals, 95):>7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Peak RSS of the image pipeline for one upload, before and after bounded ingestion.
+
+Each measurement runs in a fresh subprocess so ``ru_maxrss`` reflects only that
+pipeline. "legacy" decodes the upload at full size, draws on it and re-saves
+it, as /analyze-image/ originally did; "current" runs prepare_image and the
+box renderer. The reported figure is peak RSS minus the RSS after imports and
+reading the file.
+
+    python benchmarks/bench_memory.py
+"""
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+from fake_gemini import BACKEND_DIR
+
+SAMPLES = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")
+
+CHILD = r"""
+import base64, io, resource, sys
+sys.path.insert(0, sys.argv[3])
+from PIL import Image, ImageDraw
+from image_processing import prepare_image
+from renderer import box_renderer
+
+BOXES = [("milk", [0.1, 0.1, 0.4, 0.4]), ("eggs", [0.5, 0.5, 0.8, 0.8])]
+contents = open(sys.argv[2], "rb").read()
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+if sys.argv[1] == "legacy":
+    image = Image.open(io.BytesIO(contents))
+    draw = ImageDraw.Draw(image)
+    for name, (ymin, xmin, ymax, xmax) in BOXES:
+        w, h = image.size
+        draw.rectangle([(xmin * w, ymin * h), (xmax * w, ymax * h)], outline="red", width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image.format or "JPEG")
+    labeled = buffer.getvalue()
+else:
+    prepared = prepare_image(contents, "image/jpeg")
+    labeled = box_renderer.render(prepared.image, BOXES)
+encoded = base64.b64encode(labeled).decode("utf-8")
+
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak - baseline)
+"""
+
+
+def measure(mode, path):
+    output = subprocess.check_output([sys.executable, "-c", CHILD, mode, path, BACKEND_DIR], text=True)
+    # ru_maxrss is in KiB on Linux
+    return int(output.strip().splitlines()[-1]) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    print(f"{'image':<18}{'size':>10}{'legacy':>12}{'current':>12}")
+    for path in sorted(glob.glob(SAMPLES)):
+        print(
+            f"{os.path.basename(path):<18}{os.path.getsize(path) / 1024:>8.0f}KB"
+            f"{measure('legacy', path):>10.1f}MB{measure('current', path):>10.1f}MB"
+        )
+
+
+if __name__ == "__main__":
+    main()
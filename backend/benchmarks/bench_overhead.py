@@ -0,0 +1,118 @@
+"""Per-request overhead of /generate-recipe/ outside the model call.
+
+"setup" times what a handler does before calling the model: the old code built
+a new GenerativeModel and an f-string prompt on every request, the new code
+reads the shared model from the registry and joins the prompt templates.
+"end to end" posts to the app through an in-process transport with a stub model
+that answers instantly and the recipe cache disabled, so the time is all
+framework, prompt, call-layer and parsing overhead.
+
+    python benchmarks/bench_overhead.py --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "none")
+os.environ.setdefault("RECIPE_STORE_BACKEND", "none")
+
+from fake_gemini import import_main, install_stub_models  # noqa: E402
+
+PREFERENCES = {
+    "allergies": ["peanuts"],
+    "dietaryRestrictions": ["vegetarian"],
+    "mealType": "dinner",
+    "cuisineTypes": ["Italian", "Mexican"],
+    "prepTime": "30 minutes",
+    "cookingMethods": ["baking"],
+    "preferredIngredients": ["spinach"],
+    "avoidIngredients": ["mushrooms"],
+}
+INGREDIENTS = ["eggs", "milk", "bread", "spinach", "cheddar cheese", "tomatoes"]
+
+
+def legacy_setup(main, format_instructions):
+    import re  # noqa: F401  (the old handler imported re on every request)
+    main.genai.GenerativeModel("gemini-2.0-flash")
+    preferences = PREFERENCES
+    constraints = []
+    if preferences.get("allergies"):
+        constraints.append(f"DO NOT include these allergens: {', '.join(preferences['allergies'])}.")
+    if preferences.get("dietaryRestrictions"):
+        constraints.append(f"Follow these dietary restrictions: {', '.join(preferences['dietaryRestrictions'])}.")
+    if preferences.get("mealType"):
+        constraints.append(f"The recipe should be for a {preferences['mealType']}.")
+    if preferences.get("cuisineTypes"):
+        constraints.append(f"The recipe should be in the style of {', '.join(preferences['cuisineTypes'])} cuisine.")
+    if preferences.get("prepTime"):
+        constraints.append(f"The preparation time should be around {preferences['prepTime']}.")
+    if preferences.get("cookingMethods"):
+        constraints.append(f"Use these cooking methods: {', '.join(preferences['cookingMethods'])}.")
+    if preferences.get("preferredIngredients"):
+        constraints.append(
+            f"Try to include these preferred ingredients if possible: {', '.join(preferences['preferredIngredients'])}."
+        )
+    if preferences.get("avoidIngredients"):
+        constraints.append(f"DO NOT use these ingredients: {', '.join(preferences['avoidIngredients'])}.")
+    constraints_text = " ".join(constraints)
+    return f"""
+    Generate THREE different recipes using only the ingredients listed: {", ".join(INGREDIENTS)}.
+
+    You don't have to use all the ingredients, but use a subset of them for each recipe.
+    Make each recipe unique and different from the others.
+
+    {constraints_text}
+    {format_instructions}"""
+
+
+def current_setup(main):
+    main.models.text
+    return main.build_recipe_prompt(INGREDIENTS, PREFERENCES)
+
+
+def time_per_call(fn, repeat, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+async def end_to_end(main, requests):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        payload = {"ingredients": INGREDIENTS, "preferences": PREFERENCES}
+        await client.post("/generate-recipe/", json=payload)
+        start = time.perf_counter()
+        for _ in range(requests):
+            response = await client.post("/generate-recipe/", json=payload)
+            response.raise_for_status()
+        return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = import_main()
+    from prompts import RECIPE_FORMAT_INSTRUCTIONS
+
+    logging.disable(logging.INFO)
+    legacy = time_per_call(lambda: legacy_setup(app, RECIPE_FORMAT_INSTRUCTIONS), args.requests)
+    print(f"{'setup, legacy':<22}{legacy * 1e6:>8.1f}us")
+    print(f"{'setup, templates':<22}{time_per_call(lambda: current_setup(app), args.requests) * 1e6:>8.1f}us")
+
+    install_stub_models(app, latency=0)
+    seconds = asyncio.run(end_to_end(app, args.requests))
+    print(f"{'end to end':<22}{seconds * 1e6:>8.1f}us")
+
+
+if __name__ == "__main__":
+    main()
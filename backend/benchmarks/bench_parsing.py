@@ -0,0 +1,127 @@
+"""Parse time and success rate of the model-output parsers.
+
+"legacy" is the original pair of ad-hoc parsers (fence stripping plus
+json.loads and a regex for detections, a greedy ``\\{.*\\}`` search for recipes).
+"parsing" is parsing.parse_detected_items / parse_recipes. Rows cover the
+malformed-output corpus in tests/fixtures and large synthetic responses.
+
+    python benchmarks/bench_parsing.py --repeat 20
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+from fake_gemini import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from parsing import ModelOutputError, parse_detected_items, parse_recipes  # noqa: E402
+
+CORPUS = os.path.join(BACKEND_DIR, "tests", "fixtures", "model_outputs.json")
+
+
+def legacy_detections(response_text):
+    try:
+        cleaned_text = response_text.strip()
+        if cleaned_text.startswith("```") and cleaned_text.endswith("```"):
+            cleaned_text = cleaned_text[3:-3].strip()
+            if cleaned_text.startswith("json"):
+                cleaned_text = cleaned_text[4:].strip()
+        response_json = json.loads(cleaned_text)
+        items_with_boxes = []
+        food_items = []
+        if 'items' in response_json and isinstance(response_json['items'], list):
+            for item_obj in response_json['items']:
+                if 'name' in item_obj and 'box' in item_obj and isinstance(item_obj['box'], list) and len(item_obj['box']) == 4:
+                    items_with_boxes.append((item_obj['name'], [float(val) for val in item_obj['box']]))
+                    if item_obj['name'] not in food_items:
+                        food_items.append(item_obj['name'])
+            return food_items, items_with_boxes
+        for item, box in response_json.items():
+            if isinstance(box, list) and len(box) == 4:
+                items_with_boxes.append((item, [float(val) for val in box]))
+                if item not in food_items:
+                    food_items.append(item)
+        return food_items, items_with_boxes
+    except json.JSONDecodeError:
+        items_with_boxes = []
+        food_items = []
+        pattern = r'"([^"]+)":\s*\[([0-9.]+),\s*([0-9.]+),\s*([0-9.]+),\s*([0-9.]+)\]'
+        for match in re.findall(pattern, response_text):
+            items_with_boxes.append((match[0], [float(value) for value in match[1:]]))
+            if match[0] not in food_items:
+                food_items.append(match[0])
+        return food_items, items_with_boxes
+
+
+def legacy_recipes(text_response):
+    json_match = re.search(r'\{.*\}', text_response, re.DOTALL)
+    if json_match:
+        text_response = json_match.group(0)
+    return json.loads(text_response)
+
+
+def safe(parse):
+    # Count a parse as successful if it returned something without raising
+    def run(text):
+        try:
+            result = parse(text)
+        except (ModelOutputError, ValueError, AttributeError, TypeError):
+            return False
+        if isinstance(result, tuple):
+            return bool(result[1])
+        return isinstance(result, dict) and bool(result.get("recipes"))
+    return run
+
+
+def synthetic_detections(count):
+    # Many detections of few distinct items: the legacy list dedupe is quadratic in distinct names
+    items = ", ".join(f'"item {index % 500}": [0.1, 0.2, 0.3, 0.4]' for index in range(count))
+    # Truncated so the legacy path has to use its regex fallback
+    return "```json\n{" + items + ', "cut'
+
+
+def synthetic_recipes(count):
+    recipe = {"title": "Toast", "ingredients": ["bread"] * 10, "instructions": ["Toast it"] * 10}
+    return "Here you go {as requested}:\n" + json.dumps({"recipes": [recipe] * count}) + "\nEnjoy {it}!"
+
+
+def timed(parse, texts, repeat):
+    best = float("inf")
+    successes = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        successes = sum(parse(text) for text in texts)
+        best = min(best, time.perf_counter() - start)
+    return best, successes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+    workloads = [
+        ("corpus detections", [case["text"] for case in corpus["detections"]],
+         safe(legacy_detections), safe(parse_detected_items)),
+        ("corpus recipes", [case["text"] for case in corpus["recipes"]],
+         safe(legacy_recipes), safe(parse_recipes)),
+        ("5000 detections", [synthetic_detections(5000)], safe(legacy_detections), safe(parse_detected_items)),
+        ("200 recipes", [synthetic_recipes(200)], safe(legacy_recipes), safe(parse_recipes)),
+    ]
+    print(f"{'workload':<20}{'inputs':>7}{'legacy':>22}{'parsing':>22}")
+    for name, texts, legacy, current in workloads:
+        row = f"{name:<20}{len(texts):>7}"
+        for parse in (legacy, current):
+            seconds, successes = timed(parse, texts, args.repeat)
+            row += f"{seconds * 1000:>11.2f}ms {successes:>3}/{len(texts):<3}ok"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Bytes sent to Gemini and server-side image time, before and after preprocessing.
+
+For each sample image in frontend/public/recipes/ this compares:
+
+* before: the raw upload is sent to the model and decoded again at full size
+  by draw_bounding_boxes
+* after: prepare_image decodes once at reduced scale, and the boxes are drawn
+  on that decoded image
+
+Upload time is modelled from ``--uplink-mbps`` since the stub model ignores size.
+
+    python benchmarks/bench_preprocess.py --uplink-mbps 20
+"""
+import argparse
+import glob
+import os
+import time
+
+from fake_gemini import BACKEND_DIR, import_main
+
+SAMPLES = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")
+BOXES = [
+    ("strawberry jam jar", [0.1, 0.2, 0.3, 0.4]),
+    ("milk bottle", [0.5, 0.6, 0.7, 0.8]),
+    ("cheddar cheese", [0.2, 0.3, 0.4, 0.5]),
+]
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app_module = import_main()
+    from image_processing import prepare_image
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    total_before = total_after = 0
+    print(f"{'image':<18}{'before':>12}{'after':>12}{'cpu before':>12}{'cpu after':>12}{'upload saved':>14}")
+    for path in sorted(glob.glob(SAMPLES)):
+        with open(path, "rb") as f:
+            contents = f.read()
+        prepared = prepare_image(contents, "image/jpeg")
+
+        cpu_before = best_of(lambda: app_module.draw_bounding_boxes(contents, BOXES), args.repeat)
+
+        def after():
+            image = prepare_image(contents, "image/jpeg")
+            app_module.draw_bounding_boxes(image.data, BOXES, image.image)
+
+        cpu_after = best_of(after, args.repeat)
+        saved = (len(contents) - len(prepared.data)) / bytes_per_second
+        total_before += len(contents)
+        total_after += len(prepared.data)
+        print(
+            f"{os.path.basename(path):<18}{len(contents) / 1024:>10.0f}KB{len(prepared.data) / 1024:>10.0f}KB"
+            f"{cpu_before * 1000:>10.1f}ms{cpu_after * 1000:>10.1f}ms{saved * 1000:>12.0f}ms"
+        )
+    print(
+        f"{'total':<18}{total_before / 1024:>10.0f}KB{total_after / 1024:>10.0f}KB"
+        f"  ({100 * (1 - total_after / total_before):.0f}% fewer bytes sent at {args.uplink_mbps:g} Mbit/s uplink)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Local recipe store: search latency, and model calls saved on a pantry-heavy workload.
+
+* search: ``RecipeStore.search`` over ``--recipes`` synthetic recipes (3-6
+  ingredients each, drawn from the alias table) for random 6-12 item requests
+* workload: ``--requests`` /generate-recipe/ calls through the app with the
+  stub model, the result cache off, and the store off vs on. Most requests hold
+  the ingredients of the stub's recorded recipes (eggs, milk, bread, spinach,
+  cheddar, butter) plus a few random extras, so no two are identical; the rest
+  are a different pantry and need the model.
+
+    python benchmarks/bench_recipe_store.py --recipes 5000 --requests 200 --latency 0.2
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import httpx
+
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "none")
+os.environ.setdefault("RECIPE_STORE_BACKEND", "memory")
+
+from fake_gemini import BACKEND_DIR, import_main, install_stub_models, unique_ingredient  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+# What the recorded recipes need, so a store filled by earlier answers can serve these pantries
+PANTRY = ["eggs", "milk", "bread", "spinach", "cheddar cheese", "butter"]
+EXTRAS = ["apples", "tomatoes", "onions", "carrots", "yogurt", "jam", "ham", "flour", "garlic", "honey"]
+
+
+def canonical_names():
+    with open(os.path.join(BACKEND_DIR, "ingredient_aliases.json"), encoding="utf-8") as f:
+        return list(json.load(f)["ingredients"])
+
+
+def bench_search(args):
+    from recipe_store import RecipeStore
+
+    names = canonical_names()
+    rng = random.Random(0)
+    store = RecipeStore(max_recipes=args.recipes)
+    recipes = [
+        {"title": f"Recipe {index}", "ingredients": rng.sample(names, rng.randint(3, 6)), "instructions": ["Cook"]}
+        for index in range(args.recipes)
+    ]
+    start = time.perf_counter()
+    store.add(recipes, {})
+    indexing = time.perf_counter() - start
+    requests = [rng.sample(names, rng.randint(6, 12)) for _ in range(2000)]
+    latencies = []
+    for request in requests:
+        start = time.perf_counter()
+        store.search(request, {})
+        latencies.append(time.perf_counter() - start)
+    print(f"search over {len(store)} recipes (indexed in {indexing:.2f}s): "
+          f"p50 {percentile(latencies, 50) * 1e6:.0f}us  p95 {percentile(latencies, 95) * 1e6:.0f}us  "
+          f"answered {store.hits / len(requests):.0%}")
+
+
+def workload(count, seed=1):
+    rng = random.Random(seed)
+    requests = []
+    for index in range(count):
+        base = PANTRY if rng.random() < 0.8 else ["rice", "broccoli", "soy sauce"]
+        # A unique ingredient makes every request unique, so only the store can help
+        requests.append(base + rng.sample(EXTRAS, 3) + [unique_ingredient(index)])
+    return requests
+
+
+async def replay(main, requests):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for ingredients in requests:
+            start = time.perf_counter()
+            response = await client.post("/generate-recipe/", json={"ingredients": ingredients, "preferences": {}})
+            response.raise_for_status()
+            assert len(response.json()["recipes"]) == 3
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def bench_workload(main, args):
+    from recipe_store import RecipeStore
+
+    requests = workload(args.requests)
+    print(f"{args.requests} recipe requests, model latency {args.latency}s")
+    for label, store in (("store off", None), ("store on", RecipeStore())):
+        text_model, _ = install_stub_models(main, args.latency)
+        main.recipe_store = store
+        latencies = asyncio.run(replay(main, requests))
+        print(f"{label:<10} model calls {text_model.calls:>4}  "
+              f"p50 {percentile(latencies, 50) * 1000:>6.1f}ms  p95 {percentile(latencies, 95) * 1000:>6.1f}ms  "
+              f"total {sum(latencies):.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipes", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    app = import_main()
+    logging.disable(logging.INFO)
+    bench_search(args)
+    bench_workload(app, args)
+
+
+if __name__ == "__main__":
+    main()
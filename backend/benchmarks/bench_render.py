@@ -0,0 +1,101 @@
+"""Render time and output size of the bounding-box renderer.
+
+"legacy" is the original draw_bounding_boxes: a truetype lookup per call, drawing
+at full resolution and re-saving at default quality. The other rows use
+renderer.BoxRenderer with different output settings.
+
+    python benchmarks/bench_render.py --repeat 5
+"""
+import argparse
+import glob
+import io
+import os
+import random
+import sys
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from fake_gemini import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from renderer import BoxRenderer  # noqa: E402
+
+SIZES = [(640, 480), (1536, 1152), (4032, 3024)]
+BOX_COUNTS = [3, 10, 30]
+
+
+def legacy_render(image, items_with_boxes):
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.truetype("arial.ttf", 16)
+    except IOError:
+        font = ImageFont.load_default()
+    width, height = image.size
+    for item, (ymin, xmin, ymax, xmax) in items_with_boxes:
+        box = [(int(xmin * width), int(ymin * height)), (int(xmax * width), int(ymax * height))]
+        draw.rectangle(box, outline="red", width=3)
+        text_position = (box[0][0] + 5, box[0][1] + 5)
+        text_size = draw.textbbox(text_position, item, font=font)
+        draw.rectangle([(text_position[0] - 2, text_position[1] - 2), (text_size[2] + 2, text_size[3] + 2)], fill="red")
+        draw.text(text_position, item, fill="white", font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+SAMPLES = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")
+
+
+def make_photo(size):
+    # A real photo scaled to the size, so output sizes reflect real compression
+    source = Image.open(sorted(glob.glob(SAMPLES))[0])
+    return source.convert("RGB").resize(size)
+
+
+def make_boxes(count, rng):
+    boxes = []
+    for index in range(count):
+        ymin, xmin = rng.uniform(0, 0.7), rng.uniform(0, 0.7)
+        boxes.append((f"item {index}", [ymin, xmin, ymin + rng.uniform(0.05, 0.25), xmin + rng.uniform(0.05, 0.25)]))
+    return boxes
+
+
+def best_of(render, photo, boxes, repeat):
+    timings, output = [], b""
+    for _ in range(repeat):
+        image = photo.copy()
+        start = time.perf_counter()
+        output = render(image, boxes)
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    renderers = {
+        "legacy": legacy_render,
+        # Fonts loaded once, but no downscaling and the same output as legacy
+        "jpeg full": BoxRenderer(max_edge=0, image_format="JPEG", quality=75).render,
+        "jpeg q80": BoxRenderer(max_edge=1280, image_format="JPEG", quality=80).render,
+        "webp q75": BoxRenderer(max_edge=1280, image_format="WEBP", quality=75).render,
+    }
+    print(f"{'image':<12}{'boxes':>6}" + "".join(f"{name:>22}" for name in renderers))
+    for size in SIZES:
+        photo = make_photo(size)
+        for count in BOX_COUNTS:
+            boxes = make_boxes(count, rng)
+            row = f"{f'{size[0]}x{size[1]}':<12}{count:>6}"
+            for render in renderers.values():
+                seconds, output_size = best_of(render, photo, boxes, args.repeat)
+                row += f"{seconds * 1000:>11.1f}ms {output_size / 1024:>6.0f}KB"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
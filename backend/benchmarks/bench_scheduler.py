@@ -0,0 +1,124 @@
+"""A burst of recipe and image requests against a model with a per-minute quota.
+
+The stub models reject calls over ``--quota-rpm`` with a 429, like the API.
+"unscheduled" sends every call straight through (no rate limit, no retries);
+"scheduled" uses the token bucket at the quota, backoff on 429s and the queue
+limit. Reports client status codes, upstream calls and 429s, and latency.
+
+    python benchmarks/bench_scheduler.py --requests 120 --quota-rpm 1200 --latency 0.2
+"""
+import argparse
+import asyncio
+import collections
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+
+import httpx
+from google.api_core.exceptions import ResourceExhausted
+
+os.environ.setdefault("RECIPE_CACHE_BACKEND", "none")
+os.environ.setdefault("ANALYSIS_CACHE_BACKEND", "none")
+os.environ.setdefault("RECIPE_STORE_BACKEND", "none")
+
+from fake_gemini import StubModel, import_main, unique_ingredient  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+
+def photo(index):
+    """A small JPEG that differs per request, so identical uploads are not coalesced."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (index % 256, index // 256 % 256, 128)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class QuotaModel(StubModel):
+    """A StubModel that answers 429 to calls beyond ``rpm`` in any minute (scaled to a sliding second)."""
+
+    def __init__(self, model_name, latency, rpm):
+        super().__init__(model_name, latency=latency)
+        self.per_second = rpm / 60
+        self.accepted = collections.deque()
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        now = time.monotonic()
+        with self._lock:
+            while self.accepted and now - self.accepted[0] > 1:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.per_second:
+                self.rejected += 1
+                raise ResourceExhausted(f"Quota exceeded for {self.model_name}")
+            self.accepted.append(now)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self._admit()
+        return super().generate_content(contents, stream=stream, **kwargs)
+
+
+async def burst(main, requests):
+    transport = httpx.ASGITransport(app=main.app)
+    latencies = []
+    statuses = collections.Counter()
+
+    async def one(client, index):
+        start = time.perf_counter()
+        if index % 3 == 0:
+            files = {"file": (f"photo{index}.jpg", photo(index), "image/jpeg")}
+            response = await client.post("/analyze-image/?image=boxes", files=files)
+        else:
+            payload = {"ingredients": ["eggs", unique_ingredient(index)], "preferences": {}}
+            response = await client.post("/generate-recipe/", json=payload)
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, index) for index in range(requests)))
+        return time.perf_counter() - start, statuses, latencies
+
+
+def run(main, scheduler, args):
+    from scheduler import Scheduler
+
+    text = QuotaModel(main.models.text_name, args.latency, args.quota_rpm)
+    vision = QuotaModel(main.models.vision_name, args.latency, args.quota_rpm)
+    main.models.text, main.models.vision = text, vision
+    main.model_client.scheduler = Scheduler(**scheduler)
+    # Keep the per-attempt fallback errors out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        wall, statuses, latencies = asyncio.run(burst(main, args.requests))
+    upstream = sum(model.calls + model.rejected for model in (text, vision))
+    rejected = text.rejected + vision.rejected
+    codes = " ".join(f"{code}:{count}" for code, count in sorted(statuses.items()))
+    print(
+        f"{wall:>7.2f}s  {codes:<22} upstream calls {upstream:>4}  upstream 429s {rejected:>4}  "
+        f"p50 {percentile(latencies, 50):.2f}s  p95 {percentile(latencies, 95):.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=120)
+    parser.add_argument("--quota-rpm", type=float, default=1200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--queue-max", type=int, default=64)
+    args = parser.parse_args()
+
+    app = import_main()
+    logging.disable(logging.INFO)
+    print(f"{args.requests} requests, quota {args.quota_rpm:g} rpm per model, model latency {args.latency}s")
+    print("unscheduled ", end="")
+    run(app, {"rpm": "0", "retries": 0}, args)
+    print("scheduled   ", end="")
+    run(app, {"rpm": f"{args.quota_rpm:g}", "burst": 1, "queue_max": args.queue_max, "seed": 0}, args)
+
+
+if __name__ == "__main__":
+    main()
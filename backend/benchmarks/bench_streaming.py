@@ -0,0 +1,61 @@
+"""Time-to-first-recipe for /generate-recipe/ vs /generate-recipe/stream/.
+
+The stub model streams its response evenly over ``--latency`` seconds, so the
+first of the three recipes closes roughly a third of the way through.
+
+    python benchmarks/bench_streaming.py --latency 1.0
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from fake_gemini import BackgroundServer, import_main, install_stub_models, unique_ingredient
+from metrics import percentile
+
+
+async def measure(base_url, runs):
+    buffered, first_recipe, streamed_total = [], [], []
+    async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+        for run in range(runs):
+            # Unique ingredients per run so the recipe cache never answers
+            payload = {"ingredients": ["eggs", "milk", unique_ingredient(2 * run)], "preferences": {}}
+
+            start = time.perf_counter()
+            response = await client.post("/generate-recipe/", json=payload)
+            response.raise_for_status()
+            buffered.append(time.perf_counter() - start)
+
+            payload["ingredients"][-1] = unique_ingredient(2 * run + 1)
+            start = time.perf_counter()
+            first = None
+            async with client.stream("POST", "/generate-recipe/stream/", json=payload) as response:
+                async for line in response.aiter_lines():
+                    if line and first is None and json.loads(line)["type"] == "recipe":
+                        first = time.perf_counter() - start
+            first_recipe.append(first)
+            streamed_total.append(time.perf_counter() - start)
+    return buffered, first_recipe, streamed_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=1.0, help="stub Gemini latency in seconds")
+    args = parser.parse_args()
+
+    app_module = import_main()
+    install_stub_models(app_module, args.latency)
+    with BackgroundServer(app_module.app) as base_url:
+        buffered, first_recipe, streamed_total = asyncio.run(measure(base_url, args.runs))
+
+    print(f"{args.runs} runs, {args.latency * 1000:.0f}ms stub Gemini latency")
+    print(f"buffered  full response   p50={percentile(buffered, 50) * 1000:8.1f}ms")
+    print(f"streamed  first recipe    p50={percentile(first_recipe, 50) * 1000:8.1f}ms")
+    print(f"streamed  full response   p50={percentile(streamed_total, 50) * 1000:8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
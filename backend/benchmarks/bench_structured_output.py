@@ -0,0 +1,79 @@
+"""Prompt-only vs schema-constrained output: tokens, modeled latency, parse time.
+
+"prompt" sends the full prompts with their JSON format examples and gets back
+fenced, pretty-printed JSON (the recorded responses the stub backend replays). "schema" sends the
+short prompts plus the response schema from parsing.py and gets back the
+compact JSON Gemini produces in JSON mode. Tokens are estimated at 4 characters
+per token, the schema counting as input; image tokens are the same in both
+modes and left out. Latency is modeled as a fixed overhead plus per-token
+prefill and decode costs, so no API key is needed; pass the rates measured for
+your model to compare real numbers.
+
+    python benchmarks/bench_structured_output.py --decode-ms 4 --prefill-ms 0.05
+"""
+import argparse
+import json
+import time
+
+from fake_gemini import import_main
+from parsing import extract_json
+from stub_gemini import load_recordings
+
+
+def estimate_tokens(text):
+    return -(-len(text) // 4)
+
+
+def schema_mode_outputs(recipes_response, items_response):
+    recipes = extract_json(recipes_response)
+    flat = extract_json(items_response)
+    items = {"items": [{"name": name, "box": box} for name, box in flat.items()]}
+    return json.dumps(recipes), json.dumps(items)
+
+
+def best_time(parse, text, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parse(text)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--overhead-ms", type=float, default=300, help="fixed per-call latency")
+    parser.add_argument("--prefill-ms", type=float, default=0.05, help="latency per input token")
+    parser.add_argument("--decode-ms", type=float, default=4, help="latency per output token")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    app = import_main()
+    ingredients = ["eggs", "milk", "bread", "spinach", "cheddar cheese"]
+    preferences = {"allergies": ["peanuts"], "mealType": "breakfast", "prepTime": "15 minutes"}
+    recipe_schema = json.dumps(app.response_schema(app.RecipeList))
+    vision_schema = json.dumps(app.response_schema(app.DetectionList))
+    recordings = load_recordings()
+    recipes_response, items_response = recordings["text"][0], recordings["vision"][0]
+    recipe_output, items_output = schema_mode_outputs(recipes_response, items_response)
+
+    rows = [
+        ("recipe", "prompt", app.build_recipe_prompt(ingredients, preferences, structured=False), "",
+         recipes_response, app.parse_recipes),
+        ("recipe", "schema", app.build_recipe_prompt(ingredients, preferences, structured=True), recipe_schema,
+         recipe_output, app.parse_recipes),
+        ("vision", "prompt", app.VISION_PROMPT, "", items_response, app.parse_detected_items),
+        ("vision", "schema", app.VISION_SCHEMA_PROMPT, vision_schema, items_output, app.parse_detected_items),
+    ]
+    print(f"{'call':<8}{'mode':<8}{'in tokens':>10}{'out tokens':>11}{'latency':>11}{'parse':>10}")
+    for call, mode, prompt, schema, output, parse in rows:
+        input_tokens = estimate_tokens(prompt) + estimate_tokens(schema)
+        output_tokens = estimate_tokens(output)
+        latency = args.overhead_ms + input_tokens * args.prefill_ms + output_tokens * args.decode_ms
+        parse_seconds = best_time(parse, output, args.repeat)
+        print(f"{call:<8}{mode:<8}{input_tokens:>10}{output_tokens:>11}{latency:>9.0f}ms"
+              f"{parse_seconds * 1e6:>8.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Throughput versus worker count, through serve.py on a real port.
+
+Each worker count gets a fresh ``serve.py`` process on the stub backend with
+result caches and recipe store off, loaded by ``--clients`` concurrent clients:
+
+* ``analyze``: /analyze-image/?image=boxes with a sample photo, bound by image decoding (CPU)
+* ``recipe``: /generate-recipe/ with unique requests, bound by the stub's model latency
+
+CPU-bound throughput should grow with workers up to the number of cores
+(``os.cpu_count()`` is printed); latency-bound throughput is already
+concurrent within one worker.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --requests 64 --clients 16
+"""
+import argparse
+import asyncio
+import glob
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from fake_gemini import BACKEND_DIR, unique_ingredient
+from metrics import percentile
+
+PHOTO = sorted(glob.glob(os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")))[0]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers, port, latency):
+    env = {
+        **os.environ,
+        "GEMINI_BACKEND": "stub",
+        "GEMINI_STUB_LATENCY": str(latency),
+        "ANALYSIS_CACHE_BACKEND": "none",
+        "RECIPE_CACHE_BACKEND": "none",
+        "LABELED_IMAGE_CACHE_BACKEND": "none",
+        "RECIPE_STORE_BACKEND": "none",
+    }
+    command = [sys.executable, "-W", "ignore", os.path.join(BACKEND_DIR, "serve.py"),
+               "--workers", str(workers), "--host", "127.0.0.1", "--port", str(port)]
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/test/").status_code == 200:
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"serve.py with {workers} workers did not start")
+
+
+async def load(base_url, kind, requests, clients, photo):
+    latencies = []
+    queue = asyncio.Queue()
+    for index in range(requests):
+        queue.put_nowait(index)
+
+    async def client_loop(client):
+        while not queue.empty():
+            index = queue.get_nowait()
+            start = time.perf_counter()
+            if kind == "analyze":
+                files = {"file": ("photo.jpg", photo, "image/jpeg")}
+                response = await client.post("/analyze-image/?image=boxes", files=files)
+            else:
+                payload = {"ingredients": ["eggs", unique_ingredient(index)], "preferences": {}}
+                response = await client.post("/generate-recipe/", json=payload)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        return requests / (time.perf_counter() - start), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub model latency in seconds")
+    args = parser.parse_args()
+
+    with open(PHOTO, "rb") as f:
+        photo = f.read()
+    print(f"{os.cpu_count()} CPUs, {args.requests} requests per run, {args.clients} clients")
+    print(f"{'workers':>7} {'endpoint':>8} {'req/s':>8} {'p50':>7} {'p95':>7}")
+    for workers in args.workers:
+        port = free_port()
+        process = start_server(workers, port, args.latency)
+        try:
+            for kind in ("analyze", "recipe"):
+                throughput, latencies = asyncio.run(
+                    load(f"http://127.0.0.1:{port}", kind, args.requests, args.clients, photo)
+                )
+                print(f"{workers:>7} {kind:>8} {throughput:>8.1f} "
+                      f"{percentile(latencies, 50):>6.2f}s {percentile(latencies, 95):>6.2f}s")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Fixtures for the pytest-benchmark suite in this directory.
+
+The app runs against the offline Gemini stub with no latency, and with the
+result caches and recipe store disabled, so every request does the full work
+and no API key or network access is needed::
+
+    python -m pytest benchmarks --benchmark-storage=file://benchmarks/baseline --benchmark-compare=0001
+
+The settings are applied to the imported app for the session only (the unit
+tests in ``tests/`` may share the process), not through the environment.
+"""
+import glob
+import os
+
+import pytest
+
+from fake_gemini import BACKEND_DIR, StubModel, import_main
+
+SAMPLE_PHOTOS = sorted(glob.glob(os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "public", "recipes", "*.jpg")))
+
+
+@pytest.fixture(scope="session")
+def app():
+    with pytest.MonkeyPatch.context() as mp:
+        # Just for the import; main.py wants a key if model_registry was already imported on the live backend
+        if not os.getenv("GEMINI_BACKEND"):
+            mp.setenv("GEMINI_BACKEND", "stub")
+        if not os.getenv("GEMINI_API_KEY"):
+            mp.setenv("GEMINI_API_KEY", "benchmark-stub")
+        main = import_main()
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(main.models, "text", StubModel(main.models.text_name, latency=0))
+        mp.setattr(main.models, "vision", StubModel(main.models.vision_name, latency=0))
+        for name in ("analysis_cache", "recipe_cache", "labeled_image_store", "recipe_store"):
+            mp.setattr(main, name, None)
+        yield main
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session")
+def photo():
+    with open(SAMPLE_PHOTOS[0], "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def stub_latency(app):
+    """Set the stub models' latency for one test."""
+    models = (app.models.text, app.models.vision)
+    saved = [model.latency for model in models]
+
+    def set_latency(seconds):
+        for model in models:
+            model.latency = seconds
+
+    yield set_latency
+    for model, latency in zip(models, saved):
+        model.latency = latency
@@ -0,0 +1,71 @@
+"""Helpers shared by the benchmarks.
+
+The app runs on the offline Gemini stub (``stub_gemini.StubModel``), which
+replays the recorded responses in ``tests/fixtures/gemini_recordings.json``
+after a configurable latency, so no API key or network access is needed.
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import uvicorn
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from ingredients import ingredient_index  # noqa: E402
+from stub_gemini import StubModel  # noqa: E402
+
+
+def import_main():
+    """Import the backend app on the stub backend, so no API key is needed."""
+    os.environ.setdefault("GEMINI_BACKEND", "stub")
+    import main
+    return main
+
+
+def install_stub_models(main, latency=0.5):
+    """Give main.py fresh stub models answering after ``latency`` seconds; returns ``(text, vision)``."""
+    text_model = StubModel(main.models.text_name, latency=latency)
+    vision_model = StubModel(main.models.vision_name, latency=latency)
+    main.models.text = text_model
+    main.models.vision = vision_model
+    return text_model, vision_model
+
+
+def unique_ingredient(index):
+    """A real ingredient label per ``index`` that canonicalizes to a name of its own.
+
+    Canonicalization drops numbers, so "bread 1" and "bread 2" would share a
+    recipe cache key; pairs of table names ("kale with apples") do not.
+    """
+    names = ingredient_index.canonical_names
+    first, second = divmod(index, len(names))
+    return f"{names[first % len(names)]} with {names[second]}"
+
+
+class BackgroundServer:
+    """uvicorn on a free local port, in a daemon thread."""
+
+    def __init__(self, app):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
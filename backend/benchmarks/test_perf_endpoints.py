@@ -0,0 +1,38 @@
+"""Single-request overhead of the endpoints, with a stub model that answers instantly."""
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+RECIPE_REQUEST = {
+    "ingredients": ["eggs", "milk", "bread", "spinach", "cheddar cheese"],
+    "preferences": {"allergies": ["peanuts"], "mealType": "breakfast"},
+}
+
+
+@pytest.mark.parametrize("image_mode", ["base64", "boxes"])
+def test_analyze_image(benchmark, client, photo, image_mode):
+    def analyze():
+        response = client.post(f"/analyze-image/?image={image_mode}", files={"file": ("photo.jpg", photo, "image/jpeg")})
+        assert response.status_code == 200
+        return response.json()
+
+    result = benchmark(analyze)
+    assert result["food_items"]
+
+
+def test_generate_recipe(benchmark, client):
+    def generate():
+        response = client.post("/generate-recipe/", json=RECIPE_REQUEST)
+        assert response.status_code == 200
+        return response.json()
+
+    assert len(benchmark(generate)["recipes"]) == 3
+
+
+def test_generate_recipe_stream(benchmark, client):
+    def generate():
+        response = client.post("/generate-recipe/stream/", json=RECIPE_REQUEST)
+        assert response.status_code == 200
+        return response.text.splitlines()
+
+    assert benchmark(generate)[-1] == '{"type": "done", "cached": false}'
@@ -0,0 +1,44 @@
+"""CPU cost of the parsing, preprocessing and rendering helpers."""
+import io
+import json
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fake_gemini import BACKEND_DIR  # noqa: E402
+from image_processing import prepare_image  # noqa: E402
+from parsing import parse_detected_items, parse_recipes  # noqa: E402
+from renderer import BoxRenderer  # noqa: E402
+
+with open(os.path.join(BACKEND_DIR, "tests", "fixtures", "gemini_recordings.json")) as f:
+    RECORDINGS = json.load(f)
+
+BOXES = [(f"item {index}", [0.02 * index, 0.03 * index, 0.02 * index + 0.2, 0.03 * index + 0.15]) for index in range(20)]
+
+
+def test_parse_detected_items(benchmark):
+    results = benchmark(lambda: [parse_detected_items(text) for text in RECORDINGS["vision"]])
+    assert all(items for _, items in results)
+
+
+def test_parse_recipes(benchmark):
+    results = benchmark(lambda: [parse_recipes(text) for text in RECORDINGS["text"]])
+    assert all(len(result["recipes"]) == 3 for result in results)
+
+
+def test_prepare_image(benchmark, photo):
+    prepared = benchmark(prepare_image, photo, "image/jpeg")
+    assert max(prepared.size) <= 1536
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "WEBP"])
+def test_render_boxes(benchmark, photo, image_format):
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(photo))
+    image.load()
+    renderer = BoxRenderer(image_format=image_format)
+    output = benchmark(lambda: renderer.render(image.copy(), BOXES))
+    assert output
@@ -0,0 +1,46 @@
+"""Bursts of concurrent requests against a stub model with realistic latency.
+
+Each round sends ``CLIENTS`` requests at once. With a non-blocking call layer a
+burst takes about one model latency plus CPU time, not ``CLIENTS`` latencies.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from fake_gemini import unique_ingredient  # noqa: E402
+
+CLIENTS = 16
+MODEL_LATENCY = 0.05
+
+
+def burst(app, make_request):
+    async def run():
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            responses = await asyncio.gather(*(make_request(client, index) for index in range(CLIENTS)))
+        return [response.status_code for response in responses]
+
+    return asyncio.run(run())
+
+
+def test_analyze_image_burst(benchmark, app, photo, stub_latency):
+    stub_latency(MODEL_LATENCY)
+
+    def request(client, index):
+        return client.post("/analyze-image/?image=boxes", files={"file": ("photo.jpg", photo, "image/jpeg")})
+
+    statuses = benchmark.pedantic(burst, args=(app, request), rounds=5, iterations=1)
+    assert statuses == [200] * CLIENTS
+
+
+def test_generate_recipe_burst(benchmark, app, stub_latency):
+    stub_latency(MODEL_LATENCY)
+
+    def request(client, index):
+        return client.post("/generate-recipe/", json={"ingredients": ["eggs", unique_ingredient(index)], "preferences": {}})
+
+    statuses = benchmark.pedantic(burst, args=(app, request), rounds=5, iterations=1)
+    assert statuses == [200] * CLIENTS
@@ -0,0 +1,221 @@
+"""Bounded result caches with TTL.
+
+Two interchangeable backends share the same ``get`` / ``set`` / ``stats`` API:
+
+* ``MemoryCache``: in-process LRU, fastest, private to one worker
+* ``DiskCache``: SQLite file, shared by every worker pointing at the same path
+
+Values must be JSON-serializable, or raw ``bytes``.
+
+``SingleFlight`` collapses concurrent identical async computations into one.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(*parts):
+    """SHA-256 hex digest over the given str/bytes parts."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        # Length-prefix each part so ("ab", "c") and ("a", "bc") differ
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache with a max entry count and per-entry TTL."""
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class DiskCache:
+    """SQLite-backed LRU cache that can be shared between worker processes.
+
+    Counters are per process; size is read from the shared table. Each process
+    opens its own connection, so a cache created before the server forks its
+    workers is safe to use in all of them.
+    """
+
+    def __init__(self, path, max_entries=1024, ttl=3600, table="cache"):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = self._connect()
+        self._pid = os.getpid()
+        self._connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)")
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @property
+    def _conn(self):
+        # An SQLite connection must not be used on both sides of a fork
+        if self._pid != os.getpid():
+            self._connection = self._connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        """Close this process's connection; the next call opens a new one."""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._connection.close()
+                self._pid = None
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        # bytes values are stored as BLOBs and come back as-is
+        return value if isinstance(value, bytes) else json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        payload = value if isinstance(value, bytes) else json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, payload, now + self.ttl, now),
+            )
+            overflow = len(self) - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+
+    def __len__(self):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            size = len(self)
+        return {
+            "backend": "disk",
+            "size": size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    """Run at most one coroutine per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self.deduplicated = 0
+        self._tasks = {}
+
+    async def run(self, key, coroutine_fn):
+        task = self._tasks.get(key)
+        if task is not None:
+            self.deduplicated += 1
+        else:
+            task = asyncio.ensure_future(coroutine_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # Shield so one caller disconnecting does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {"in_flight": len(self._tasks), "deduplicated": self.deduplicated}
+
+
+def make_cache(prefix, default_size=256, default_ttl=3600):
+    """Build a cache from ``<PREFIX>_CACHE_*`` environment variables.
+
+    ``<PREFIX>_CACHE_BACKEND`` is ``memory`` (default), ``disk`` or ``none``.
+    """
+    backend = os.getenv(f"{prefix}_CACHE_BACKEND", "memory").lower()
+    max_entries = int(os.getenv(f"{prefix}_CACHE_SIZE", str(default_size)))
+    ttl = float(os.getenv(f"{prefix}_CACHE_TTL", str(default_ttl)))
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == "disk":
+        path = os.getenv(f"{prefix}_CACHE_PATH", os.path.join(".cache", "results.sqlite3"))
+        return DiskCache(path, max_entries=max_entries, ttl=ttl, table=f"{prefix.lower()}_cache")
+    raise ValueError(f"Unknown {prefix}_CACHE_BACKEND: {backend}")
@@ -0,0 +1,51 @@
+"""Canonical forms of recipe requests, used to build stable cache keys.
+
+Two requests that only differ in ordering, casing, whitespace or duplicate
+entries (e.g. "Eggs, milk" vs "milk, eggs") map to the same canonical form.
+"""
+import json
+
+# Preference fields that hold a list of values vs. a single value
+LIST_PREFERENCES = (
+    "allergies",
+    "dietaryRestrictions",
+    "cuisineTypes",
+    "cookingMethods",
+    "preferredIngredients",
+    "avoidIngredients",
+)
+SCALAR_PREFERENCES = ("mealType", "prepTime")
+
+
+def normalize_term(value):
+    """Lowercase and collapse whitespace: "  Green   Onion " -> "green onion"."""
+    return " ".join(str(value).lower().split())
+
+
+def normalize_list(values):
+    """Sorted, de-duplicated, normalized terms. Accepts a list or a comma-separated string."""
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(",")
+    terms = {normalize_term(value) for value in values}
+    terms.discard("")
+    return sorted(terms)
+
+
+def canonical_recipe_request(ingredients, preferences):
+    """Return the canonical dict for an ingredients + preferences request."""
+    preferences = preferences or {}
+    canonical = {"ingredients": normalize_list(ingredients)}
+    for field in LIST_PREFERENCES:
+        canonical[field] = normalize_list(preferences.get(field))
+    for field in SCALAR_PREFERENCES:
+        value = preferences.get(field)
+        canonical[field] = normalize_term(value) if value else None
+    return canonical
+
+
+def recipe_request_key(ingredients, preferences):
+    """Stable string form of ``canonical_recipe_request`` suitable for hashing."""
+    canonical = canonical_recipe_request(ingredients, preferences)
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
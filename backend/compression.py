@@ -0,0 +1,136 @@
+"""Response compression, negotiated from the request's Accept-Encoding.
+
+``COMPRESSION_ENCODINGS`` lists the encodings to offer, best first: ``br``
+(needs the optional ``brotli`` package, skipped without it) and ``gzip``.
+Responses are compressed when they are at least ``COMPRESSION_MIN_SIZE``
+bytes, are sent in one piece (streamed NDJSON recipes and job events pass
+through, so each event still arrives as soon as it is written), and are not
+images, which are compressed already.
+"""
+import gzip
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import span
+
+# Encodings offered, best first; empty or "none" disables compression
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "br,gzip")
+# Smaller responses are sent as is
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# gzip level 1-9 and brotli quality 0-11; both trade CPU for bytes
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Bodies at least this large are compressed off the event loop
+THREAD_MIN_SIZE = 64 * 1024
+# Already compressed, or streamed event by event
+EXCLUDED_TYPES = ("image/", "text/event-stream", "application/x-ndjson")
+
+logger = logging.getLogger(__name__)
+
+
+def available_encodings(encodings=COMPRESSION_ENCODINGS):
+    """The configured encodings this process can produce, best first."""
+    available = []
+    for encoding in (part.strip().lower() for part in encodings.split(",")):
+        if encoding in ("", "none"):
+            continue
+        if encoding == "br":
+            try:
+                import brotli  # noqa: F401
+            except ImportError:
+                logger.info("brotli is not installed; skipping br in COMPRESSION_ENCODINGS")
+                continue
+        elif encoding != "gzip":
+            raise ValueError(f"Unknown encoding in COMPRESSION_ENCODINGS: {encoding}")
+        available.append(encoding)
+    return available
+
+
+def accepted_encodings(header):
+    """Encodings the client accepts, from an Accept-Encoding header (``q=0`` excluded)."""
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name)
+    return accepted
+
+
+def compress(body, encoding, gzip_level=COMPRESSION_GZIP_LEVEL, brotli_quality=COMPRESSION_BROTLI_QUALITY):
+    if encoding == "br":
+        import brotli
+
+        return brotli.compress(body, quality=brotli_quality)
+    # mtime=0 so identical bodies compress to identical bytes
+    return gzip.compress(body, compresslevel=gzip_level, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compress one-piece responses with the best encoding both sides support."""
+
+    def __init__(self, app, encodings=None, min_size=COMPRESSION_MIN_SIZE,
+                 gzip_level=COMPRESSION_GZIP_LEVEL, brotli_quality=COMPRESSION_BROTLI_QUALITY):
+        self.app = app
+        self.encodings = available_encodings() if encodings is None else encodings
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def choose(self, scope):
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding in self.encodings:
+            if encoding in accepted or "*" in accepted:
+                return encoding
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.encodings:
+            return await self.app(scope, receive, send)
+        encoding = self.choose(scope)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def compressing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                # Held until the first body chunk shows whether the response comes in one piece
+                start = message
+                return
+            if message["type"] != "http.response.body" or start is None:
+                return await send(message)
+            held, start = start, None
+            headers = MutableHeaders(raw=list(held.get("headers", [])))
+            body = message.get("body", b"")
+            headers.add_vary_header("Accept-Encoding")
+            if (
+                message.get("more_body", False)
+                or len(body) < self.min_size
+                or "content-encoding" in headers
+                or headers.get("content-type", "").startswith(EXCLUDED_TYPES)
+            ):
+                await send({**held, "headers": headers.raw})
+                return await send(message)
+            with span("compress"):
+                if len(body) >= THREAD_MIN_SIZE:
+                    body = await run_in_threadpool(compress, body, encoding, self.gzip_level, self.brotli_quality)
+                else:
+                    body = compress(body, encoding, self.gzip_level, self.brotli_quality)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            await send({**held, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,35 @@
+"""ETags for JSON results, so a client repeating a request gets a 304 instead of the body again.
+
+The tag is a hash of the response body, so it changes whenever the result
+does (e.g. after a cache entry expires and is regenerated). Tags are weak,
+since the compression middleware may re-encode the bytes.
+"""
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from cache import content_key
+
+
+def make_etag(body):
+    return f'W/"{content_key(body)[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    """Whether an If-None-Match header value matches ``etag``, using weak comparison."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+
+def json_response(request, payload, cache_control="private, no-cache"):
+    """``payload`` as JSON with an ETag, or an empty 304 if the client already has it."""
+    response = JSONResponse(payload)
+    etag = make_etag(response.body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,160 @@
+"""Model fallback strategies for image analysis.
+
+Each request has an ordered list of attempts (primary model first). Strategies:
+
+* ``serial``: run the primary; only if it fails or its result is unusable, run the fallback
+* ``hedged``: run the primary; if it has not produced a usable result after
+  ``hedge_delay`` seconds (or fails sooner), start the fallback too and take
+  the first usable result
+* ``race``: start every attempt at once and take the first usable result
+
+Attempts still running once a winner is found are cancelled. In ``thread``
+call mode the underlying SDK call cannot be interrupted, so it finishes in the
+background, but the request no longer waits on it.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict, deque
+
+from metrics import percentile
+
+STRATEGIES = ("serial", "hedged", "race")
+
+VISION_FALLBACK_STRATEGY = os.getenv("VISION_FALLBACK_STRATEGY", "serial")
+# Seconds to wait on the primary model before hedging with the fallback
+VISION_HEDGE_DELAY = float(os.getenv("VISION_HEDGE_DELAY", "4"))
+# Per-model timeouts in seconds
+VISION_PRIMARY_TIMEOUT = float(os.getenv("VISION_PRIMARY_TIMEOUT", "30"))
+VISION_FALLBACK_TIMEOUT = float(os.getenv("VISION_FALLBACK_TIMEOUT", "30"))
+
+# Number of recent latencies kept per model / strategy for percentiles
+LATENCY_WINDOW = 1000
+
+logger = logging.getLogger(__name__)
+
+
+def _rounded(seconds):
+    return round(seconds, 4) if seconds is not None else None
+
+
+class FallbackStats:
+    """Per-model latency / outcome counters and per-strategy request latency."""
+
+    def __init__(self):
+        self.models = defaultdict(lambda: {
+            "calls": 0, "usable": 0, "unusable": 0, "errors": 0, "timeouts": 0, "wins": 0, "cancelled": 0,
+        })
+        self.model_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.strategy_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.strategy_requests = defaultdict(int)
+
+    def snapshot(self):
+        models = {}
+        for name, counters in self.models.items():
+            latencies = self.model_latencies[name]
+            models[name] = {
+                **counters,
+                "win_rate": round(counters["wins"] / counters["calls"], 4) if counters["calls"] else None,
+                "p50": _rounded(percentile(latencies, 50)),
+                "p95": _rounded(percentile(latencies, 95)),
+            }
+        strategies = {}
+        for name, latencies in self.strategy_latencies.items():
+            strategies[name] = {
+                "requests": self.strategy_requests[name],
+                "p50": _rounded(percentile(latencies, 50)),
+                "p95": _rounded(percentile(latencies, 95)),
+            }
+        return {"models": models, "strategies": strategies}
+
+
+class FallbackRunner:
+    """Runs an ordered list of model attempts under one of ``STRATEGIES``."""
+
+    def __init__(self, strategy=VISION_FALLBACK_STRATEGY, hedge_delay=VISION_HEDGE_DELAY):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown fallback strategy: {strategy}")
+        self.strategy = strategy
+        self.hedge_delay = hedge_delay
+        self.stats = FallbackStats()
+
+    async def _attempt(self, name, coroutine_fn, timeout, usable):
+        counters = self.stats.models[name]
+        counters["calls"] += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(coroutine_fn(), timeout)
+        except asyncio.TimeoutError:
+            counters["timeouts"] += 1
+            raise
+        except asyncio.CancelledError:
+            counters["cancelled"] += 1
+            raise
+        except Exception:
+            counters["errors"] += 1
+            raise
+        self.stats.model_latencies[name].append(time.perf_counter() - start)
+        counters["usable" if usable(result) else "unusable"] += 1
+        return result
+
+    async def run(self, attempts, usable, strategy=None):
+        """Return the first usable result from ``attempts``.
+
+        ``attempts`` is a list of ``(name, coroutine_fn, timeout)`` tuples in
+        priority order. If no attempt is usable, the last completed result is
+        returned; if every attempt raised, the last error is re-raised.
+        """
+        strategy = strategy or self.strategy
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown fallback strategy: {strategy}")
+        # None waits for the running attempt to finish before starting the next one
+        hedge_delay = {"serial": None, "hedged": self.hedge_delay, "race": 0}[strategy]
+
+        start = time.perf_counter()
+        queue = list(attempts)
+        pending = {}
+        last_result = None
+        last_error = None
+
+        def launch():
+            name, coroutine_fn, timeout = queue.pop(0)
+            pending[asyncio.ensure_future(self._attempt(name, coroutine_fn, timeout, usable))] = name
+
+        launch()
+        try:
+            while pending:
+                while queue and hedge_delay == 0:
+                    launch()
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_delay if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # The running attempts are too slow: hedge with the next one
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning(f"Vision attempt with {name} failed: {str(e)}", exc_info=True)
+                        last_error = e
+                        continue
+                    if usable(result):
+                        self.stats.models[name]["wins"] += 1
+                        return result
+                    last_result = result
+                # Everything started so far failed, move on to the next attempt now
+                if queue and not pending:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            self.stats.strategy_latencies[strategy].append(time.perf_counter() - start)
+            self.stats.strategy_requests[strategy] += 1
+
+        if last_result is not None:
+            return last_result
+        raise last_error
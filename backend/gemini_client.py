@@ -0,0 +1,183 @@
+"""Async call layer for the Gemini models.
+
+The google-generativeai SDK's ``generate_content`` is a blocking call. Running
+it directly inside an ``async def`` endpoint stalls the whole event loop for the
+length of the round-trip, so every model call in the app goes through here.
+Calls are admitted by ``scheduler.Scheduler``, which applies the per-model
+rate limits and retries 429s and 503s with backoff.
+"""
+import asyncio
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from metrics import GEMINI_SECONDS, record, record_usage
+from scheduler import Scheduler
+
+# Max number of Gemini calls a single worker keeps in flight at once
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+
+# "thread" offloads the blocking SDK call to a bounded thread pool,
+# "native" uses the SDK's own generate_content_async
+GEMINI_CALL_MODE = os.getenv("GEMINI_CALL_MODE", "thread")
+
+
+class ModelClient:
+    """Runs model calls without blocking the event loop, with a concurrency cap and rate limits."""
+
+    def __init__(self, max_concurrency=GEMINI_MAX_CONCURRENCY, mode=GEMINI_CALL_MODE, scheduler=None):
+        if mode not in ("thread", "native"):
+            raise ValueError(f"Unknown GEMINI_CALL_MODE: {mode}")
+        self.max_concurrency = max_concurrency
+        self.mode = mode
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="gemini")
+
+    async def generate_content(self, model, contents, priority=None, **kwargs):
+        """Call ``model.generate_content(contents, **kwargs)`` without blocking the loop.
+
+        ``priority`` names the kind of call (see ``GEMINI_PRIORITY``) for when
+        the model is rate limited. Raises ``scheduler.Overloaded`` if the call
+        cannot be made for now.
+        """
+        name = _model_name(model)
+        for attempt in itertools.count():
+            await self.scheduler.acquire(name, priority)
+            try:
+                return await self._generate_once(model, contents, **kwargs)
+            except Exception as e:
+                delay = self.scheduler.retry_delay(name, e, attempt)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+    async def _generate_once(self, model, contents, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            start = time.perf_counter()
+            outcome = "error"
+            response = None
+            try:
+                if self.mode == "native" and hasattr(model, "generate_content_async"):
+                    response = await model.generate_content_async(contents, **kwargs)
+                else:
+                    loop = asyncio.get_running_loop()
+                    response = await loop.run_in_executor(
+                        self._executor, partial(model.generate_content, contents, **kwargs)
+                    )
+                outcome = "ok"
+                return response
+            except asyncio.CancelledError:
+                outcome = "cancelled"
+                raise
+            finally:
+                self.in_flight -= 1
+                _observe(model, start, outcome, getattr(response, "usage_metadata", None))
+
+    async def stream_content(self, model, contents, priority=None, **kwargs):
+        """Async generator over the text chunks of a streamed ``generate_content`` call.
+
+        A call that fails before its first chunk is retried like
+        ``generate_content``; once text has been yielded, errors are raised.
+        """
+        name = _model_name(model)
+        for attempt in itertools.count():
+            await self.scheduler.acquire(name, priority)
+            started = False
+            stream = self._stream_once(model, contents, **kwargs)
+            try:
+                async for text in stream:
+                    started = True
+                    yield text
+                return
+            except Exception as e:
+                delay = None if started else self.scheduler.retry_delay(name, e, attempt)
+                if delay is None:
+                    raise
+            finally:
+                # Stop the underlying call now if our consumer went away early
+                await stream.aclose()
+            await asyncio.sleep(delay)
+
+    async def _stream_once(self, model, contents, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            start = time.perf_counter()
+            outcome = "error"
+            # Usage metadata arrives with the last chunk
+            usage = None
+            try:
+                if self.mode == "native" and hasattr(model, "generate_content_async"):
+                    response = await model.generate_content_async(contents, stream=True, **kwargs)
+                    async for chunk in response:
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        yield chunk.text
+                    outcome = "ok"
+                    return
+
+                # Iterate the blocking stream in the pool and hand chunks back through a queue
+                loop = asyncio.get_running_loop()
+                queue = asyncio.Queue()
+                done = object()
+                stopped = threading.Event()
+
+                def pump():
+                    nonlocal usage
+                    try:
+                        for chunk in model.generate_content(contents, stream=True, **kwargs):
+                            if stopped.is_set():
+                                break
+                            usage = getattr(chunk, "usage_metadata", None) or usage
+                            loop.call_soon_threadsafe(queue.put_nowait, chunk.text)
+                    except Exception as e:
+                        loop.call_soon_threadsafe(queue.put_nowait, e)
+                    finally:
+                        loop.call_soon_threadsafe(queue.put_nowait, done)
+
+                future = loop.run_in_executor(self._executor, pump)
+                try:
+                    while True:
+                        item = await queue.get()
+                        if item is done:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                    outcome = "ok"
+                finally:
+                    # Stop pulling chunks if the consumer went away early
+                    stopped.set()
+                    await future
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"
+                raise
+            finally:
+                self.in_flight -= 1
+                _observe(model, start, outcome, usage)
+
+    def shutdown(self):
+        """Let running calls finish in the background and stop the pool's threads."""
+        self._executor.shutdown(wait=False)
+        # If the app is started again in this process (tests do), calls get a fresh pool
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="gemini")
+
+
+def _model_name(model):
+    return getattr(model, "model_name", "unknown").removeprefix("models/")
+
+
+def _observe(model, start, outcome, usage):
+    """Record one model call's latency and token usage."""
+    seconds = time.perf_counter() - start
+    name = _model_name(model)
+    GEMINI_SECONDS.observe(seconds, model=name, outcome=outcome)
+    record("gemini", seconds, name)
+    record_usage(name, usage)
+
+
+model_client = ModelClient()
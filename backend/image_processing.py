@@ -0,0 +1,113 @@
+"""Image preprocessing before the Gemini upload.
+
+Phone photos are often 12 MP and several megabytes. The model does not need
+that resolution to find food items, so uploads are decoded once (using JPEG
+draft mode to decode at reduced scale), EXIF-rotated, downscaled to
+``IMAGE_MAX_EDGE`` and re-encoded as JPEG before being sent.
+
+Bounding boxes come back normalized to [0, 1], so they are valid for the
+original image as well as the downscaled one: the resize is uniform and the
+EXIF rotation is applied before the model sees the image, the same way image
+viewers display the original.
+
+To keep memory bounded, images over ``IMAGE_MAX_PIXELS`` are rejected from
+their header before any pixels are decoded, and only one decoded copy is
+kept alive: it is reduced in place before the EXIF rotation is applied.
+"""
+import io
+import math
+import os
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Longest edge in pixels of the image sent to the model (0 disables resizing)
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1536"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+# Decompression-bomb guard: max width * height of an upload
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))
+
+# Pillow's own guard, for any other decode path in the process
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+
+class ImageTooLarge(ValueError):
+    """The image's pixel dimensions exceed ``IMAGE_MAX_PIXELS``."""
+
+
+class CorruptImage(ValueError):
+    """The image has a valid header but its data cannot be decoded, e.g. a truncated upload."""
+
+
+class PreparedImage:
+    """A decoded, oriented and downscaled upload, plus its encoded bytes for the model."""
+
+    def __init__(self, image, data, mime_type, original_size, original_bytes):
+        self.image = image
+        self.data = data
+        self.mime_type = mime_type
+        self.original_size = original_size
+        self.original_bytes = original_bytes
+
+    @property
+    def size(self):
+        return self.image.size
+
+
+def prepare_image(contents, content_type=None, max_edge=IMAGE_MAX_EDGE, quality=IMAGE_JPEG_QUALITY,
+                  max_pixels=IMAGE_MAX_PIXELS):
+    """Decode ``contents`` once and return a ``PreparedImage`` ready for the model."""
+    try:
+        return _prepare_image(contents, content_type, max_edge, quality, max_pixels)
+    except UnidentifiedImageError:
+        raise
+    except OSError as e:
+        # Pillow reports truncated or corrupt data as a plain OSError
+        raise CorruptImage(str(e)) from e
+
+
+def _prepare_image(contents, content_type, max_edge, quality, max_pixels):
+    # Only the header is parsed here; pixels are decoded lazily
+    image = Image.open(io.BytesIO(contents))
+    if image.width * image.height > max_pixels:
+        raise ImageTooLarge(f"Image has {image.width}x{image.height} pixels, the limit is {max_pixels}")
+    original_size = image.size
+    original_format = image.format
+    orientation = image.getexif().get(0x0112, 1)
+
+    needs_resize = max_edge and max(original_size) > max_edge
+    if needs_resize and original_format == "JPEG":
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale, never below the target size
+        scale = max_edge / max(original_size)
+        image.draft("RGB", (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)))
+
+    if needs_resize:
+        # Resizing before rotating keeps the rotation cheap; the bound is square either way
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+    ImageOps.exif_transpose(image, in_place=True)
+
+    if not needs_resize and orientation == 1 and original_format == "JPEG":
+        # Already small and upright: sending the original bytes avoids a lossy re-encode.
+        # Nothing has been decoded yet, so a file that does not end in an EOI marker (truncated,
+        # or with trailing data) is decoded now to make sure it is a whole image.
+        if not contents.endswith(b"\xff\xd9"):
+            image.load()
+        return PreparedImage(image, contents, content_type or "image/jpeg", original_size, len(contents))
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return PreparedImage(image, buffer.getvalue(), "image/jpeg", original_size, len(contents))
+
+
+def image_mime_type(data):
+    """MIME type of encoded image bytes, from their magic number."""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "application/octet-stream"
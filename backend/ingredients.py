@@ -0,0 +1,241 @@
+"""Canonical ingredient names for detected labels and recipe requests.
+
+The vision model names what it sees ("strawberry jam jar", "milk bottle",
+"2 yogurt cups"). ``IngredientIndex`` maps those labels to canonical
+ingredients ("jam", "milk", "yogurt") using the alias table in
+``ingredient_aliases.json``:
+
+* labels are lowercased and split into words, numbers and punctuation are
+  dropped, words are reduced to a singular form, and packaging, descriptor
+  and unit words from the ``ignore`` list are removed
+* a label is renamed only if what is left is a canonical name or alias as a
+  whole; anything else is kept as cleaned up, so modifiers the table does not
+  know survive ("ice cream" is not cream, "lemon juice" is not juice)
+* every canonical name or alias found anywhere in the label is a mention, for
+  allergy checks ("chicken broth" mentions chicken), except the ones the
+  ``distinct`` table marks as part of a longer name ("peanut butter" is not
+  butter)
+* results are memoized per raw label, so repeated labels cost a dict lookup
+
+Allergies and avoided ingredients are resolved the same way, with group names
+such as "dairy" or "tree nuts" expanding to their members, and matching
+ingredients are dropped before the prompt is built. Terms the table does not
+know ("sesame") cannot be looked up, so labels containing their words are
+dropped instead. ``staples`` (salt, oil,
+water...) are assumed to be in every kitchen.
+"""
+import json
+import os
+import re
+
+INGREDIENT_ALIASES_PATH = os.getenv(
+    "INGREDIENT_ALIASES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ingredient_aliases.json")
+)
+# Canonicalize recipe ingredients and drop allergens before calling the model
+INGREDIENT_NORMALIZATION = os.getenv("INGREDIENT_NORMALIZATION", "1").lower() in ("1", "true", "yes")
+
+# Memoized labels kept before the memo is cleared
+MEMO_SIZE = 50_000
+
+# Runs of letters, in any script; digits and punctuation separate words
+_WORD = re.compile(r"[^\W\d_]+")
+
+
+def singular(word):
+    """A crude singular form, applied to both labels and aliases so they meet in the middle."""
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("oes", "ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+class IngredientIndex:
+    """Maps free-form ingredient labels to canonical names, and filters them by preferences."""
+
+    def __init__(self, ingredients, groups=None, ignore=(), staples=(), distinct=None):
+        self.ignore = {singular(word) for word in ignore}
+        # Word trie: each node maps a word to the next node; the None key holds the canonical name
+        self._trie = {}
+        self.canonical_names = list(ingredients)
+        self._names = frozenset(ingredients)
+        for canonical in ingredients:
+            self._add(canonical, canonical)
+        for canonical, aliases in ingredients.items():
+            for alias in aliases:
+                self._add(alias, canonical)
+        self.groups = {}
+        for name, members in (groups or {}).items():
+            self.groups[" ".join(self._keys(name))] = frozenset(members)
+        self.distinct = {canonical: frozenset(parts) for canonical, parts in (distinct or {}).items()}
+        self._memo = {}
+        self.staples = frozenset(self._resolve(staple)[0] for staple in staples)
+
+    @classmethod
+    def from_file(cls, path=INGREDIENT_ALIASES_PATH):
+        with open(path, encoding="utf-8") as f:
+            table = json.load(f)
+        return cls(
+            table["ingredients"], table.get("groups"), table.get("ignore", ()), table.get("staples", ()),
+            table.get("distinct"),
+        )
+
+    def _words(self, text):
+        """``(surface, key)`` pairs for the meaningful words of ``text``."""
+        words = []
+        for word in _WORD.findall(str(text).lower()):
+            key = singular(word)
+            if key not in self.ignore:
+                words.append((word, key))
+        return words
+
+    def _keys(self, text):
+        return [key for _, key in self._words(text)]
+
+    def _add(self, phrase, canonical):
+        node = self._trie
+        for key in self._keys(phrase):
+            node = node.setdefault(key, {})
+        # Canonical names are added first, so an alias never overrides one
+        node.setdefault(None, canonical)
+
+    def lookup(self, label):
+        """``(canonical, known)`` for ``label``.
+
+        ``canonical`` is None if nothing is left after cleaning (e.g. "jar").
+        ``known`` holds every canonical ingredient mentioned anywhere in the
+        label, for allergy checks ("peanut chicken" mentions peanuts and chicken).
+        """
+        result = self._memo.get(label)
+        if result is None:
+            if len(self._memo) >= MEMO_SIZE:
+                self._memo.clear()
+            result = self._memo[label] = self._resolve(label)
+        return result
+
+    def _resolve(self, label):
+        words = self._words(label)
+        if not words:
+            return None, frozenset()
+        keys = [key for _, key in words]
+        matches = []
+        for start in range(len(keys)):
+            node = self._trie
+            for end in range(start, len(keys)):
+                node = node.get(keys[end])
+                if node is None:
+                    break
+                canonical = node.get(None)
+                if canonical is not None:
+                    matches.append((start, end, canonical))
+        whole = next((canonical for start, end, canonical in matches if start == 0 and end == len(keys) - 1), None)
+        known = set()
+        for start, end, canonical in matches:
+            # Only the distinct table hides a phrase inside a longer one: "peanut butter" does not mention butter
+            if any(
+                outer_start <= start and end <= outer_end and (outer_start, outer_end) != (start, end)
+                and canonical in self.distinct.get(outer, ())
+                for outer_start, outer_end, outer in matches
+            ):
+                continue
+            known.add(canonical)
+        if whole is None:
+            return " ".join(surface for surface, _ in words), frozenset(known)
+        return whole, frozenset(known)
+
+    def canonicalize(self, label):
+        """The canonical name for one label, or None if it names nothing."""
+        return self.lookup(label)[0]
+
+    def canonicalize_all(self, labels):
+        """Canonical names for ``labels``, in first-seen order without duplicates."""
+        names = []
+        seen = set()
+        for label in _as_list(labels):
+            canonical = self.lookup(label)[0]
+            if canonical is not None and canonical not in seen:
+                seen.add(canonical)
+                names.append(canonical)
+        return names
+
+    def words(self, text):
+        """The cleaned words of ``text``, as matched by ``unknown_terms``."""
+        return tuple(self._keys(text))
+
+    def exclusions(self, terms):
+        """Canonical ingredients ruled out by allergy or avoid ``terms``, with groups expanded."""
+        excluded = set()
+        for term in terms:
+            group = self.groups.get(" ".join(self._keys(term)))
+            if group:
+                excluded |= group
+            canonical = self.lookup(term)[0]
+            if canonical is not None:
+                excluded.add(canonical)
+        return excluded
+
+    def unknown_terms(self, terms):
+        """The words of allergy or avoid ``terms`` that name no group or known ingredient."""
+        unknown = set()
+        for term in terms:
+            words = self.words(term)
+            if words and " ".join(words) not in self.groups and self.lookup(term)[0] not in self._names:
+                unknown.add(words)
+        return unknown
+
+    def preference_terms(self, preferences):
+        """A request's allergies and avoided ingredients."""
+        preferences = preferences or {}
+        return [*_as_list(preferences.get("allergies")), *_as_list(preferences.get("avoidIngredients"))]
+
+    def preference_exclusions(self, preferences):
+        """Canonical ingredients ruled out by a request's allergies and avoided ingredients."""
+        return self.exclusions(self.preference_terms(preferences))
+
+    def prepare(self, ingredients, preferences):
+        """Canonical ingredients for a recipe request, minus allergens and avoided ones.
+
+        Returns ``(kept, removed)``: ``kept`` holds canonical names in
+        first-seen order, ``removed`` the original labels that were dropped.
+        """
+        terms = self.preference_terms(preferences)
+        excluded = self.exclusions(terms)
+        unknown = self.unknown_terms(terms)
+        kept = []
+        removed = []
+        seen = set()
+        for label in _as_list(ingredients):
+            canonical, known = self.lookup(label)
+            if canonical is None or canonical in seen:
+                continue
+            if canonical in excluded or not excluded.isdisjoint(known) or contains(self.words(label), unknown):
+                removed.append(label)
+                continue
+            seen.add(canonical)
+            kept.append(canonical)
+        return kept, removed
+
+
+def contains(words, phrases):
+    """Whether any of the word tuples ``phrases`` appears in ``words`` as consecutive words."""
+    return any(
+        words[start:start + len(phrase)] == phrase
+        for phrase in phrases
+        for start in range(len(words) - len(phrase) + 1)
+    )
+
+
+def _as_list(values):
+    # Requests send lists, but comma-separated strings are accepted too (see canonical.py)
+    if not values:
+        return []
+    if isinstance(values, str):
+        values = values.split(",")
+    return [label for label in (str(value).strip() for value in values) if label]
+
+
+ingredient_index = IngredientIndex.from_file()
@@ -0,0 +1,235 @@
+"""Background jobs for the analyze -> normalize -> recipes pipeline.
+
+A client submits an image and gets a job id back at once; the pipeline then
+runs in the background and each stage's result is recorded on the job as it
+finishes. Clients poll the job's snapshot or follow its events, instead of
+holding a connection open for the whole pipeline.
+
+* at most ``JOB_CONCURRENCY`` jobs run at once; the rest wait their turn
+* once ``JOB_QUEUE_MAX`` jobs are waiting or running, new ones are turned away
+  with ``Overloaded``
+* finished jobs are kept for ``JOB_TTL`` seconds, and at most
+  ``JOB_RETAIN_MAX`` of them, so late pollers still see the result
+
+Jobs live in the worker process that accepted them.
+"""
+import asyncio
+import logging
+import math
+import os
+import secrets
+import time
+
+from scheduler import Overloaded
+
+# Jobs running at once, per worker; they mostly wait on the model, whose rate the scheduler limits
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "16"))
+# Jobs waiting or running before new submissions get a 429
+JOB_QUEUE_MAX = int(os.getenv("JOB_QUEUE_MAX", "64"))
+# Seconds a finished job stays available, and how many finished jobs are kept
+JOB_TTL = float(os.getenv("JOB_TTL", "600"))
+JOB_RETAIN_MAX = int(os.getenv("JOB_RETAIN_MAX", "1000"))
+# Seconds between keepalive comments on an idle event stream
+JOB_EVENTS_KEEPALIVE = float(os.getenv("JOB_EVENTS_KEEPALIVE", "15"))
+
+STATUSES = ("queued", "running", "succeeded", "failed", "cancelled")
+FINISHED = ("succeeded", "failed", "cancelled")
+
+logger = logging.getLogger(__name__)
+
+
+class JobFailed(Exception):
+    """Raised by a pipeline stage to fail its job with ``detail`` as the error."""
+
+    def __init__(self, detail, status_code=500):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class Job:
+    """One pipeline run: its status, the results of finished stages, and the events sent so far."""
+
+    def __init__(self, payload):
+        self.id = secrets.token_urlsafe(12)
+        self.payload = payload
+        self.status = "queued"
+        self.stage = None
+        self.results = {}
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events = []
+        self.task = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self):
+        return self.status in FINISHED
+
+    def publish(self, event):
+        """Record ``event`` and wake everyone following the job."""
+        event = {"id": len(self.events) + 1, **event}
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def set_status(self, status, **fields):
+        self.status = status
+        self.publish({"type": "status", "status": status, "stage": self.stage, **fields})
+
+    def begin_stage(self, stage):
+        self.stage = stage
+        self.publish({"type": "status", "status": self.status, "stage": stage})
+
+    def finish_stage(self, stage, result):
+        self.results[stage] = result
+        self.publish({"type": "stage", "stage": stage, "result": result})
+
+    async def follow(self, after=0, keepalive=15.0):
+        """Yield events after id ``after`` as they are published, until the job finishes.
+
+        Yields None every ``keepalive`` seconds without an event, so the caller
+        can keep idle connections open.
+        """
+        while True:
+            while after < len(self.events):
+                after += 1
+                yield self.events[after - 1]
+            if self.finished:
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "results": self.results,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Runs submitted jobs through ``pipeline(job)`` with bounded concurrency, queue and retention."""
+
+    def __init__(self, pipeline, concurrency=16, queue_max=64, ttl=600.0, retain_max=1000):
+        self.pipeline = pipeline
+        self.concurrency = concurrency
+        self.queue_max = queue_max
+        self.ttl = ttl
+        self.retain_max = retain_max
+        self.jobs = {}
+        self.completed = {status: 0 for status in FINISHED}
+        self.rejected = 0
+        # Recent job duration, for the Retry-After of rejected submissions
+        self.average_seconds = None
+        self._semaphore = None
+        self._loop = None
+
+    def active(self):
+        return sum(1 for job in self.jobs.values() if not job.finished)
+
+    def submit(self, payload):
+        """Queue a new job; raises ``Overloaded`` if the queue is full."""
+        self.expire()
+        if self.active() >= self.queue_max:
+            self.rejected += 1
+            waves = math.ceil(self.queue_max / max(self.concurrency, 1))
+            retry_after = max(1, math.ceil((self.average_seconds or 1.0) * waves))
+            raise Overloaded("Job queue is full", retry_after)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Created here so it belongs to the serving event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        job = Job(payload)
+        self.jobs[job.id] = job
+        job.publish({"type": "status", "status": "queued", "stage": None})
+        job.task = asyncio.ensure_future(self._run(job))
+        # A job cancelled before its task first ran never reaches _run's handlers
+        job.task.add_done_callback(lambda _: job.finished or self._finish(job, "cancelled", "Cancelled"))
+        return job
+
+    def get(self, job_id):
+        self.expire()
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; finished jobs are left as they are."""
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.task.cancel()
+        return job
+
+    def cancel_all(self):
+        """Cancel every unfinished job, e.g. when the worker shuts down."""
+        for job in self.jobs.values():
+            if not job.finished:
+                job.task.cancel()
+
+    async def _run(self, job):
+        try:
+            async with self._semaphore:
+                job.started_at = time.time()
+                job.set_status("running")
+                await self.pipeline(job)
+        except asyncio.CancelledError:
+            self._finish(job, "cancelled", "Cancelled")
+            return
+        except JobFailed as e:
+            self._finish(job, "failed", e.detail, status_code=e.status_code)
+            return
+        except Overloaded as e:
+            self._finish(job, "failed", str(e), status_code=e.status_code, retry_after=e.retry_after)
+            return
+        except Exception as e:
+            logger.exception(f"Error running job {job.id}")
+            self._finish(job, "failed", f"Error running job: {str(e)}")
+            return
+        self._finish(job, "succeeded")
+
+    def _finish(self, job, status, error=None, **fields):
+        job.finished_at = time.time()
+        job.error = error
+        # The upload is no longer needed once the job is done
+        job.payload = None
+        if job.started_at is not None:
+            seconds = job.finished_at - job.started_at
+            if self.average_seconds is None:
+                self.average_seconds = seconds
+            self.average_seconds = 0.9 * self.average_seconds + 0.1 * seconds
+        self.completed[status] += 1
+        if error is not None:
+            fields["error"] = error
+        job.set_status(status, **fields)
+
+    def expire(self):
+        """Drop finished jobs past their TTL, and the oldest beyond ``retain_max``."""
+        now = time.time()
+        finished = [job for job in self.jobs.values() if job.finished]
+        overflow = len(finished) - self.retain_max
+        for job in finished:
+            if overflow > 0 or now - job.finished_at > self.ttl:
+                del self.jobs[job.id]
+                overflow -= 1
+
+    def stats(self):
+        counts = {status: 0 for status in STATUSES}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {
+            "jobs": counts,
+            "completed": dict(self.completed),
+            "rejected": self.rejected,
+            "concurrency": self.concurrency,
+            "queue_max": self.queue_max,
+        }
@@ -1,41 +1,155 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 import google.generativeai as genai
 import os
 from dotenv import load_dotenv
 import json
 import io
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, UnidentifiedImageError
 import base64
-import re
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 import logging
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from gemini_client import model_client
+from cache import SingleFlight, content_key, make_cache
+from canonical import recipe_request_key
+from ingredients import INGREDIENT_NORMALIZATION, ingredient_index
+from recipe_store import make_recipe_store
+from streaming import JsonArrayStreamParser
+from model_registry import GEMINI_BACKEND, ModelRegistry
+from prompts import VISION_PROMPT, VISION_SCHEMA_PROMPT, build_recipe_prompt
+from parsing import (
+    DetectionList,
+    ModelOutputError,
+    RecipeList,
+    parse_detected_items,
+    parse_recipes,
+    response_schema,
+    validate_recipe,
+)
+from image_processing import (
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_EDGE,
+    CorruptImage,
+    ImageTooLarge,
+    image_mime_type,
+    prepare_image,
+)
+from uploads import BodySizeLimitMiddleware, read_upload
+from compression import CompressionMiddleware
+from etags import etag_matches, json_response
+from renderer import box_renderer, load_font
+from metrics import TimingMiddleware, record, registry as metrics_registry, span
+from scheduler import Overloaded
+from jobs import JOB_CONCURRENCY, JOB_EVENTS_KEEPALIVE, JOB_QUEUE_MAX, JOB_RETAIN_MAX, JOB_TTL, JobFailed, JobManager
+from fallback import (
+    STRATEGIES as FALLBACK_STRATEGIES,
+    VISION_FALLBACK_TIMEOUT,
+    VISION_PRIMARY_TIMEOUT,
+    FallbackRunner,
+)
 
 # Load environment variables
 load_dotenv()
 
-# Configure the API key
+# Configure the API key (the offline stub backend does not need one)
 api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
+if not api_key and GEMINI_BACKEND == "live":
     raise ValueError("GEMINI_API_KEY environment variable not set")
 
-genai.configure(api_key=api_key)
+if api_key:
+    genai.configure(api_key=api_key)
+
+# Initialize the models once (GEMINI_TEXT_MODEL, GEMINI_VISION_MODEL)
+models = ModelRegistry()
+
+# "prompt" describes the JSON format in the prompt; "schema" has Gemini return JSON
+# constrained to the response schemas in parsing.py, so the prompts can be shorter
+GEMINI_OUTPUT_MODES = ("prompt", "schema")
+GEMINI_OUTPUT_MODE = os.getenv("GEMINI_OUTPUT_MODE", "prompt")
+if GEMINI_OUTPUT_MODE not in GEMINI_OUTPUT_MODES:
+    raise ValueError(f"Unknown GEMINI_OUTPUT_MODE: {GEMINI_OUTPUT_MODE}")
+STRUCTURED_OUTPUT = GEMINI_OUTPUT_MODE == "schema"
+
+
+def json_generation_config(schema_model):
+    """Generation config asking for JSON that matches ``schema_model``."""
+    return {"response_mime_type": "application/json", "response_schema": response_schema(schema_model)}
+
+
+VISION_GENERATION_CONFIG = json_generation_config(DetectionList) if STRUCTURED_OUTPUT else None
+RECIPE_GENERATION_CONFIG = json_generation_config(RecipeList) if STRUCTURED_OUTPUT else None
+vision_prompt = VISION_SCHEMA_PROMPT if STRUCTURED_OUTPUT else VISION_PROMPT
+
+# Cache of /analyze-image/ results keyed by image content, prompt and model
+analysis_cache = make_cache("ANALYSIS", default_size=256, default_ttl=24 * 3600)
+
+# Identical uploads being analyzed at the same time share one detection
+analysis_flights = SingleFlight()
+
+# Rendered labeled images, served by GET /labeled-images/{image_id}
+labeled_image_store = make_cache("LABELED_IMAGE", default_size=128, default_ttl=600)
+
+# How /analyze-image/ returns the labeled image; "none" leaves out the boxes too
+IMAGE_MODES = ("base64", "url", "boxes", "none")
+
+# Max files per /analyze-images/ request and how many are analyzed at once
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "10"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+
+# Cache of parsed /generate-recipe/ results keyed by the canonical request,
+# plus single-flight so identical concurrent requests share one model call
+recipe_cache = make_cache("RECIPE", default_size=1024, default_ttl=6 * 3600)
+recipe_flights = SingleFlight()
+
+# Previously generated recipes, searched before calling the model (RECIPE_STORE_*)
+recipe_store = make_recipe_store()
+
+# Schedules the pro -> flash fallback for image analysis (VISION_FALLBACK_STRATEGY)
+vision_fallback = FallbackRunner()
+
+@asynccontextmanager
+async def lifespan(app):
+    """Per-worker resources: set up when a worker starts serving, released when it stops.
 
-# Initialize the model
-model = genai.GenerativeModel('gemini-2.0-flash')
-vision_model = genai.GenerativeModel('gemini-1.5-pro')  # Better for vision tasks
+    Module-level objects are created at import, which a preloading server does
+    once in the parent; anything that cannot cross a fork is rebuilt here.
+    """
+    if models.rebuild_after_fork():
+        logger.info(f"Rebuilt Gemini models in worker {os.getpid()}")
+    # Load the label font now rather than on the first labeled image
+    load_font(12)
+    yield
+    job_manager.cancel_all()
+    model_client.shutdown()
+    for cache in (analysis_cache, recipe_cache, labeled_image_store, recipe_store):
+        if hasattr(cache, "close"):
+            cache.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
-# Configure CORS
+# Reject oversized request bodies before the multipart parser spools them
+app.add_middleware(BodySizeLimitMiddleware)
+
+# gzip/brotli for one-piece responses (COMPRESSION_*); inside the timing middleware so it is timed
+app.add_middleware(CompressionMiddleware)
+
+# Request latency histogram, plus the Server-Timing header when SERVER_TIMING is set
+app.add_middleware(TimingMiddleware)
+
+# Configure CORS (added last so it wraps every other middleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # In production, replace with specific origins
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After", "Location", "ETag"],
 )
 
 # Set up logging
@@ -46,213 +160,364 @@ logger = logging.getLogger(__name__)
 def read_root():
     return {"message": "Recipe Generator API"}
 
-def draw_bounding_boxes(image_bytes, items_with_boxes):
-    """Draw bounding boxes and labels on the image for detected food items."""
+def draw_bounding_boxes(image_bytes, items_with_boxes, image=None):
+    """Draw bounding boxes and labels on the image for detected food items.
+
+    Pass the already decoded ``image`` to draw on it directly instead of decoding ``image_bytes``.
+    """
     try:
-        # Open the image
-        image = Image.open(io.BytesIO(image_bytes))
-        draw = ImageDraw.Draw(image)
-        
-        # Try to load a font, use default if not available
-        try:
-            font = ImageFont.truetype("arial.ttf", 16)
-        except IOError:
-            font = ImageFont.load_default()
-        
-        width, height = image.size
-        
-        # Draw boxes and labels
-        for item, box in items_with_boxes:
-            try:
-                if len(box) == 4:
-                    ymin, xmin, ymax, xmax = box
-                    
-                    # Ensure values are in the valid range (0-1)
-                    xmin = max(0, min(1, xmin))
-                    ymin = max(0, min(1, ymin))
-                    xmax = max(0, min(1, xmax))
-                    ymax = max(0, min(1, ymax))
-                    
-                    # Convert normalized coordinates to pixel coordinates
-                    xmin_px = int(xmin * width)
-                    ymin_px = int(ymin * height)
-                    xmax_px = int(xmax * width)
-                    ymax_px = int(ymax * height)
-                    
-                    # Ensure box has reasonable dimensions (not too small or too large)
-                    if (xmax_px > xmin_px and ymax_px > ymin_px and 
-                        (xmax_px - xmin_px) < 0.9 * width and 
-                        (ymax_px - ymin_px) < 0.9 * height):
-                        
-                        # Draw rectangle with thicker width for visibility
-                        draw.rectangle([(xmin_px, ymin_px), (xmax_px, ymax_px)], outline="red", width=3)
-                        
-                        # Draw label with background for better visibility
-                        text_position = (xmin_px + 5, ymin_px + 5)
-                        text_size = draw.textbbox(text_position, item, font=font)
-                        draw.rectangle([(text_position[0]-2, text_position[1]-2), 
-                                       (text_size[2]+2, text_size[3]+2)], fill="red")
-                        draw.text(text_position, item, fill="white", font=font)
-            except Exception as e:
-                print(f"Error drawing box for {item}: {str(e)}")
-                continue
-        
-        # Save the image to a bytes buffer
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format=image.format if image.format else 'JPEG')
-        img_byte_arr.seek(0)
-        
-        return img_byte_arr.getvalue()
+        # Open the image unless the caller already decoded it
+        if image is None:
+            image = Image.open(io.BytesIO(image_bytes))
+        return box_renderer.render(image, items_with_boxes)
     except Exception as e:
         print(f"Error drawing bounding boxes: {str(e)}")
         # Return original image if labeling fails
         return image_bytes
 
-def parse_food_items_with_boxes(response_text):
-    """Parse the food items and their bounding boxes from Gemini's response."""
-    try:
-        # Clean up the response text to handle potential formatting issues
-        cleaned_text = response_text.strip()
-        # If the response starts with backticks (markdown code block), remove them
-        if cleaned_text.startswith("```") and cleaned_text.endswith("```"):
-            cleaned_text = cleaned_text[3:-3].strip()
-            if cleaned_text.startswith("json"):
-                cleaned_text = cleaned_text[4:].strip()
-        
-        # Try to parse the entire response as JSON first
-        response_json = json.loads(cleaned_text)
-        items_with_boxes = []
-        food_items = []
-        
-        # Handle nested structure with 'items' key if present
-        if 'items' in response_json and isinstance(response_json['items'], list):
-            for item_obj in response_json['items']:
-                if 'name' in item_obj and 'box' in item_obj and isinstance(item_obj['box'], list) and len(item_obj['box']) == 4:
-                    item_name = item_obj['name']
-                    box = [float(val) for val in item_obj['box']]
-                    items_with_boxes.append((item_name, box))
-                    if item_name not in food_items:
-                        food_items.append(item_name)
-            return food_items, items_with_boxes
-        
-        # Handle flat structure with item names as keys
-        for item, box in response_json.items():
-            if isinstance(box, list) and len(box) == 4:
-                # Convert all values to float
-                box = [float(val) for val in box]
-                items_with_boxes.append((item, box))
-                if item not in food_items:
-                    food_items.append(item)
-        
-        return food_items, items_with_boxes
-    except json.JSONDecodeError:
-        # If not valid JSON, try regex pattern matching
-        items_with_boxes = []
-        food_items = []
-        
-        # Look for patterns like: "item": [0.1, 0.2, 0.3, 0.4]
-        pattern = r'"([^"]+)":\s*\[([0-9.]+),\s*([0-9.]+),\s*([0-9.]+),\s*([0-9.]+)\]'
-        matches = re.findall(pattern, response_text)
-        
-        for match in matches:
-            item = match[0]
-            box = [float(match[1]), float(match[2]), float(match[3]), float(match[4])]
-            items_with_boxes.append((item, box))
-            if item not in food_items:
-                food_items.append(item)
-        
-        return food_items, items_with_boxes
+async def analyze_contents(base_url, contents, content_type, fallback=None, image="base64"):
+    """Run detection on one uploaded image and build its response for the given ``image`` mode.
 
-@app.post("/analyze-image/")
-async def analyze_image(file: UploadFile = File(...)):
-    try:
-        # Read the image file
-        contents = await file.read()
-        
-        # Create a unified prompt that asks for both food items and bounding boxes
-        unified_prompt = """
-        Analyze this image carefully and identify each individual food item or ingredient visible.
-        
-        For EACH SPECIFIC ITEM (not categories or shelves), provide a tight bounding box in normalized [ymin, xmin, ymax, xmax] format:
-        - ymin: the top edge (0 = top of image, 1 = bottom of image)
-        - xmin: the left edge (0 = left of image, 1 = right of image)
-        - ymax: the bottom edge (0 = top of image, 1 = bottom of image)
-        - xmax: the right edge (0 = left of image, 1 = right of image)
-        
-        Important rules:
-        1. Identify INDIVIDUAL ITEMS, not categories or shelves
-        2. Draw TIGHT boxes around each specific product
-        3. If you see multiple instances of the same item, create a separate box for each
-        4. Be specific with item names (e.g., "strawberry jam" instead of just "jam")
-        5. Boxes can overlap if items are close to each other
-        
-        Return a JSON object where:
-        - Each key is the name of a specific food item
-        - Each value is an array of coordinates [ymin, xmin, ymax, xmax]
-        
-        Example response:
-        {
-            "strawberry jam jar": [0.1, 0.2, 0.3, 0.4],
-            "milk bottle": [0.5, 0.6, 0.7, 0.8],
-            "cheddar cheese": [0.2, 0.3, 0.4, 0.5]
-        }
-        
-        OR alternatively, you can return a structure with an 'items' array:
-        
-        {
-            "items": [
-                {"name": "strawberry jam jar", "box": [0.1, 0.2, 0.3, 0.4]},
-                {"name": "milk bottle", "box": [0.5, 0.6, 0.7, 0.8]},
-                {"name": "cheddar cheese", "box": [0.2, 0.3, 0.4, 0.5]}
-            ]
-        }
-        
-        Only include food items that are clearly visible and identifiable in the image.
-        Return only the JSON object without any additional text or explanations.
-        """
+    ``base_url`` is the request's base URL, for the ``labeled_image_url`` of ``image=url``.
+    """
+    # Serve repeated uploads of the same photo from the cache
+    cache_key = content_key(
+        models.vision_name,
+        models.text_name,
+        vision_prompt,
+        content_type or "",
+        f"{IMAGE_MAX_EDGE}:{IMAGE_JPEG_QUALITY}",
+        contents,
+    )
+    cached = None
+    if analysis_cache is not None:
+        cached = await run_in_threadpool(analysis_cache.get, cache_key)
+    
+    prepared = None
+    if cached is not None:
+        food_items = cached["food_items"]
+        items_with_boxes = [(item, box) for item, box in cached["items"]]
+    else:
+        # Decode once, fix EXIF orientation and downscale before uploading to the model
+        with span("decode"):
+            prepared = await run_in_threadpool(prepare_image, contents, content_type)
         
         # Prepare the image for the model
         image_parts = [
             {
-                "mime_type": file.content_type,
-                "data": contents
+                "mime_type": prepared.mime_type,
+                "data": prepared.data
             }
         ]
         
-        # First try with the more powerful vision model
-        try:
-            response = vision_model.generate_content([unified_prompt, *image_parts])
-            text_response = response.text
-            food_items, items_with_boxes = parse_food_items_with_boxes(text_response)
-            
-            # If no items detected with the pro model, try with the flash model as backup
-            if not items_with_boxes:
-                response = model.generate_content([unified_prompt, *image_parts])
-                text_response = response.text
-                food_items, items_with_boxes = parse_food_items_with_boxes(text_response)
-        except Exception as e:
-            # If the pro model fails, fall back to the flash model
-            print(f"Error with vision_model: {str(e)}")
-            response = model.generate_content([unified_prompt, *image_parts])
-            text_response = response.text
-            food_items, items_with_boxes = parse_food_items_with_boxes(text_response)
-        
-        # Draw bounding boxes on the image
-        labeled_image = draw_bounding_boxes(contents, items_with_boxes)
+        async def detect(detector):
+            response = await model_client.generate_content(
+                detector,
+                [vision_prompt, *image_parts],
+                priority="vision",
+                generation_config=VISION_GENERATION_CONFIG,
+            )
+            with span("parse"):
+                return parse_detected_items(response.text)
+        
+        # Try the more powerful vision model first, with the flash model as backup
+        # if it fails or detects nothing. How the two are scheduled depends on the strategy,
+        # so only identical uploads with the same strategy share a flight.
+        flight_key = content_key(cache_key, fallback or vision_fallback.strategy)
+        food_items, items_with_boxes = await analysis_flights.run(flight_key, lambda: vision_fallback.run(
+            [
+                (models.vision_name, lambda: detect(models.vision), VISION_PRIMARY_TIMEOUT),
+                (models.text_name, lambda: detect(models.text), VISION_FALLBACK_TIMEOUT),
+            ],
+            usable=lambda result: bool(result[1]),
+            strategy=fallback,
+        ))
+        
+        # Only cache successful detections so a bad model response can be retried
+        if analysis_cache is not None and items_with_boxes:
+            await run_in_threadpool(
+                analysis_cache.set, cache_key, {"food_items": food_items, "items": items_with_boxes}
+            )
+    
+    result = {
+        "food_items": food_items,
+        # Canonical names ("milk bottle" -> "milk"), ready to send to /generate-recipe/
+        "ingredients": ingredient_index.canonicalize_all(food_items),
+        "boxes": [{"name": item, "box": box} for item, box in items_with_boxes],
+    }
+    
+    # Just the ingredient lists
+    if image == "none":
+        del result["boxes"]
+        return result
+    
+    # The client draws the boxes itself
+    if image == "boxes":
+        return result
+    
+    # Reuse the rendered image from an earlier request if we still have it; the boxes are part
+    # of the key, since an uncached or retried detection can find different items in the same photo
+    image_id = content_key(cache_key, box_renderer.signature, json.dumps(items_with_boxes, separators=(",", ":")))
+    labeled_image = None
+    if labeled_image_store is not None:
+        labeled_image = await run_in_threadpool(labeled_image_store.get, image_id)
+    if labeled_image is None:
+        if prepared is None:
+            with span("decode"):
+                prepared = await run_in_threadpool(prepare_image, contents, content_type)
+        # Draw bounding boxes on the image (CPU-bound, keep it off the event loop)
+        with span("render"):
+            labeled_image = await run_in_threadpool(
+                draw_bounding_boxes, prepared.data, items_with_boxes, prepared.image
+            )
+        if labeled_image_store is not None:
+            await run_in_threadpool(labeled_image_store.set, image_id, labeled_image)
+    
+    if image == "url":
+        result["labeled_image_url"] = str(
+            app.url_path_for("get_labeled_image", image_id=image_id).make_absolute_url(base_url)
+        )
+        return result
+    
+    # Convert the labeled image to base64 for sending to frontend
+    with span("base64"):
+        result["labeled_image"] = base64.b64encode(labeled_image).decode('utf-8')
+    return result
+
+# Uploads that are too large to decode or are not a whole image
+IMAGE_ERRORS = (ImageTooLarge, Image.DecompressionBombError, UnidentifiedImageError, CorruptImage)
+
+def image_error(e):
+    """The 413/415 response for one of ``IMAGE_ERRORS``."""
+    if isinstance(e, (ImageTooLarge, Image.DecompressionBombError)):
+        return HTTPException(status_code=413, detail=str(e))
+    return HTTPException(status_code=415, detail=f"Could not decode image: {str(e)}")
+
+def overloaded_error(e):
+    """The 429/503 response for an ``Overloaded`` error, with its ``Retry-After``."""
+    return HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+def check_analysis_options(fallback, image):
+    """Reject unknown ``fallback`` / ``image`` query parameters with a 400."""
+    if fallback is not None and fallback not in FALLBACK_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"fallback must be one of {', '.join(FALLBACK_STRATEGIES)}")
+    if image not in IMAGE_MODES:
+        raise HTTPException(status_code=400, detail=f"image must be one of {', '.join(IMAGE_MODES)}")
+    if image == "url" and labeled_image_store is None:
+        raise HTTPException(status_code=400, detail="image=url needs LABELED_IMAGE_CACHE_BACKEND enabled")
+
+@app.post("/analyze-image/")
+async def analyze_image(
+    request: Request,
+    file: UploadFile = File(...),
+    fallback: Optional[str] = None,
+    image: str = "base64",
+):
+    """Detect food items and their bounding boxes in an uploaded photo.
+
+    ``image`` selects how the labeled image is returned: ``base64`` (default)
+    inlines it as ``labeled_image``, ``url`` returns a short-lived
+    ``labeled_image_url``, ``boxes`` skips rendering so the client can
+    draw the returned ``boxes`` itself, and ``none`` returns only the
+    ``food_items`` and ``ingredients``. Repeating a request with the
+    response's ETag in If-None-Match gets a 304.
+    """
+    check_analysis_options(fallback, image)
+    try:
+        # Read the image file in chunks, rejecting oversized or non-image uploads early
+        with span("upload_read"):
+            contents = await read_upload(file)
+        
+        return json_response(request, await analyze_contents(str(request.base_url), contents, file.content_type, fallback, image))
+    
+    except IMAGE_ERRORS as e:
+        raise image_error(e)
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+
+@app.post("/analyze-images/")
+async def analyze_images(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    fallback: Optional[str] = None,
+    image: str = "base64",
+):
+    """Analyze several photos (e.g. fridge, freezer and pantry) in one round-trip.
+
+    Images are analyzed concurrently, at most ``BATCH_MAX_CONCURRENCY`` at a
+    time, and identical uploads are only analyzed once. Returns the merged,
+    de-duplicated ``food_items`` plus one entry per uploaded file, in order,
+    shaped like an /analyze-image/ response. Files that fail, including
+    uploads rejected as too large or not an image, carry an ``error``.
+    """
+    check_analysis_options(fallback, image)
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+    try:
+        # A rejected file only fails its own entry
+        uploads = []
+        # Index in ``uploads`` -> the 413/415 that rejected it
+        rejected = {}
+        with span("upload_read"):
+            for upload in files:
+                try:
+                    uploads.append((upload, await read_upload(upload)))
+                except HTTPException as e:
+                    logger.warning(f"Rejected {upload.filename}: {e.detail}")
+                    rejected[len(uploads)] = e
+                    uploads.append((upload, None))
+        
+        # Identical photos share one analysis
+        digests = [
+            content_key(upload.content_type or "", contents) if contents is not None else None
+            for upload, contents in uploads
+        ]
+        semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+        overloaded = []
+        # Digest -> the 413/415 for a file that could not be decoded
+        undecodable = {}
+        
+        async def analyze_one(digest, upload, contents):
+            async with semaphore:
+                try:
+                    return await analyze_contents(str(request.base_url), contents, upload.content_type, fallback, image)
+                except Overloaded as e:
+                    overloaded.append(e)
+                    return {"error": str(e)}
+                except IMAGE_ERRORS as e:
+                    error = undecodable[digest] = image_error(e)
+                    logger.warning(f"Rejected {upload.filename}: {error.detail}")
+                    return {"error": error.detail}
+                except Exception as e:
+                    logger.exception(f"Error analyzing {upload.filename}")
+                    return {"error": f"Error processing image: {str(e)}"}
+        
+        tasks = {}
+        for digest, (upload, contents) in zip(digests, uploads):
+            if digest is not None and digest not in tasks:
+                tasks[digest] = asyncio.ensure_future(analyze_one(digest, upload, contents))
+        await asyncio.gather(*tasks.values())
+        
+        images = []
+        food_items = []
+        seen = set()
+        # The 413/415 for each file rejected before or during decoding
+        client_errors = []
+        for index, (digest, (upload, _)) in enumerate(zip(digests, uploads)):
+            if index in rejected or digest in undecodable:
+                error = rejected.get(index) or undecodable[digest]
+                client_errors.append(error)
+                images.append({"filename": upload.filename, "error": error.detail})
+                continue
+            result = tasks[digest].result()
+            images.append({"filename": upload.filename, **result})
+            for item in result.get("food_items", []):
+                key = item.strip().lower()
+                if key not in seen:
+                    seen.add(key)
+                    food_items.append(item)
         
-        # Convert the labeled image to base64 for sending to frontend
-        base64_image = base64.b64encode(labeled_image).decode('utf-8')
+        if all("error" in result for result in images):
+            if overloaded:
+                raise overloaded_error(max(overloaded, key=lambda e: e.retry_after))
+            # Every file was rejected or could not be decoded: answer with the first rejection (413 or 415)
+            if len(client_errors) == len(images):
+                raise client_errors[0]
+            raise HTTPException(status_code=500, detail=images[0]["error"])
         
-        return {
+        return json_response(request, {
             "food_items": food_items,
-            "labeled_image": base64_image
-        }
-            
+            "ingredients": ingredient_index.canonicalize_all(food_items),
+            "images": images,
+        })
+    
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error processing images: {str(e)}")
+
+@app.get("/labeled-images/{image_id}")
+async def get_labeled_image(image_id: str, request: Request):
+    if labeled_image_store is None:
+        raise HTTPException(status_code=404, detail="Labeled image not found or expired")
+    headers = {
+        "Cache-Control": f"private, max-age={int(labeled_image_store.ttl)}, immutable",
+        "ETag": f'"{image_id}"',
+    }
+    # The id is a content hash, so the bytes behind it never change
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    labeled_image = await run_in_threadpool(labeled_image_store.get, image_id)
+    if labeled_image is None:
+        raise HTTPException(status_code=404, detail="Labeled image not found or expired")
+    return Response(content=labeled_image, media_type=image_mime_type(labeled_image), headers=headers)
+
+def recipe_ingredients(ingredients, preferences):
+    """Canonical ingredients for a recipe request, without allergens or avoided ingredients.
+
+    Raises a 400 if nothing is left to cook with.
+    """
+    if not INGREDIENT_NORMALIZATION:
+        return ingredients
+    kept, removed = ingredient_index.prepare(ingredients, preferences)
+    if removed:
+        logger.info(f"Removed for allergies or avoided ingredients: {removed}")
+    if not kept:
+        raise HTTPException(
+            status_code=400, detail="No ingredients left after removing allergens and avoided ingredients"
+        )
+    return kept
+
+async def generate_recipes(ingredients, preferences):
+    """Recipes for already prepared ``ingredients``: from the cache, the recipe store, or the model."""
+    # Requests that differ only in ordering, casing or whitespace share a result
+    cache_key = content_key(models.text_name, recipe_request_key(ingredients, preferences))
+    if recipe_cache is not None:
+        cached = await run_in_threadpool(recipe_cache.get, cache_key)
+        if cached is not None:
+            return cached
+    
+    # Common pantries are usually answered by recipes generated for earlier requests
+    if recipe_store is not None:
+        with span("retrieve"):
+            stored = await run_in_threadpool(recipe_store.search, ingredients, preferences)
+        if stored is not None:
+            return {"recipes": stored}
+    
+    prompt = build_recipe_prompt(ingredients, preferences, structured=STRUCTURED_OUTPUT)
+    
+    async def generate():
+        # Generate content
+        response = await model_client.generate_content(
+            models.text, prompt, priority="recipe", generation_config=RECIPE_GENERATION_CONFIG
+        )
+        
+        # Extract the text response
+        text_response = response.text
+        
+        # Try to parse as JSON
+        try:
+            with span("parse"):
+                recipe = parse_recipes(text_response)
+        except ModelOutputError:
+            # If JSON parsing fails, return the raw text
+            return {"error": "Failed to parse recipe", "raw_response": text_response}
+        
+        if recipe_cache is not None:
+            await run_in_threadpool(recipe_cache.set, cache_key, recipe)
+        if recipe_store is not None:
+            await run_in_threadpool(recipe_store.add, recipe["recipes"], preferences)
+        return recipe
+    
+    # N concurrent identical requests trigger exactly one model call
+    return await recipe_flights.run(cache_key, generate)
 
 @app.post("/generate-recipe/")
-async def generate_recipe(request_data: dict):
+async def generate_recipe(request_data: dict, request: Request):
     try:
         # Log that the endpoint was hit
         logger.info("Generate recipe endpoint hit!")
@@ -265,121 +530,300 @@ async def generate_recipe(request_data: dict):
         preferences = request_data.get("preferences", {})
         logger.info(f"Preferences: {preferences}")
         
-        # Extract specific preferences
-        allergies = preferences.get("allergies", [])
-        dietary_restrictions = preferences.get("dietaryRestrictions", [])
-        meal_type = preferences.get("mealType")
-        cuisine_types = preferences.get("cuisineTypes", [])
-        prep_time = preferences.get("prepTime")
-        cooking_methods = preferences.get("cookingMethods", [])
-        preferred_ingredients = preferences.get("preferredIngredients", [])
-        avoid_ingredients = preferences.get("avoidIngredients", [])
-        
-        # Create a text-only model for recipe generation
-        text_model = genai.GenerativeModel('gemini-2.0-flash')
-        
-        # Join ingredients into a comma-separated string
-        ingredients_text = ", ".join(ingredients)
-        
-        # Build preference constraints
-        constraints = []
-        
-        if allergies:
-            constraints.append(f"DO NOT include these allergens: {', '.join(allergies)}.")
-        
-        if dietary_restrictions:
-            constraints.append(f"Follow these dietary restrictions: {', '.join(dietary_restrictions)}.")
-        
-        if meal_type:
-            constraints.append(f"The recipe should be for a {meal_type}.")
-        
-        if cuisine_types:
-            constraints.append(f"The recipe should be in the style of {', '.join(cuisine_types)} cuisine.")
-        
-        if prep_time:
-            constraints.append(f"The preparation time should be around {prep_time}.")
-        
-        if cooking_methods:
-            constraints.append(f"Use these cooking methods: {', '.join(cooking_methods)}.")
-        
-        if preferred_ingredients:
-            constraints.append(f"Try to include these preferred ingredients if possible: {', '.join(preferred_ingredients)}.")
-        
-        if avoid_ingredients:
-            constraints.append(f"DO NOT use these ingredients: {', '.join(avoid_ingredients)}.")
-        
-        constraints_text = " ".join(constraints)
-        
-        # Prompt for recipe generation
-        prompt = f"""
-        Generate THREE different recipes using only the ingredients listed: {ingredients_text}.
-
-        You don't have to use all the ingredients, but use a subset of them for each recipe.
-        Make each recipe unique and different from the others.
-
-        {constraints_text}
-
-        Format the response as a JSON object with the following structure:
-        {{
-            "recipes": [
-                {{
-                    "title": "Recipe 1 Name",
-                    "ingredients": ["ingredient 1", "ingredient 2", ...],
-                    "instructions": ["step 1", "step 2", ...],
-                    "prep_time": "X minutes",
-                    "cook_time": "Y minutes",
-                    "servings": Z
-                }},
-                {{
-                    "title": "Recipe 2 Name",
-                    "ingredients": ["ingredient 1", "ingredient 2", ...],
-                    "instructions": ["step 1", "step 2", ...],
-                    "prep_time": "X minutes",
-                    "cook_time": "Y minutes",
-                    "servings": Z
-                }},
-                {{
-                    "title": "Recipe 3 Name",
-                    "ingredients": ["ingredient 1", "ingredient 2", ...],
-                    "instructions": ["step 1", "step 2", ...],
-                    "prep_time": "X minutes",
-                    "cook_time": "Y minutes",
-                    "servings": Z
-                }}
-            ]
-        }}
-
-        Return only the JSON object without any additional text.
-        """
-        
-        # Generate content
-        response = text_model.generate_content(prompt)
-        
-        # Extract the text response
-        text_response = response.text
+        # "milk bottle" -> "milk", minus anything the user is allergic to or avoids
+        ingredients = recipe_ingredients(ingredients, preferences)
         
-        # Try to parse as JSON
-        try:
-            # Find JSON object in the response if it's not a clean JSON
-            import re
-            json_match = re.search(r'\{.*\}', text_response, re.DOTALL)
-            if json_match:
-                text_response = json_match.group(0)
-                
-            recipe = json.loads(text_response)
-            return recipe
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw text
-            return {"error": "Failed to parse recipe", "raw_response": text_response}
-            
+        return json_response(request, await generate_recipes(ingredients, preferences))
+    
+    except Overloaded as e:
+        raise overloaded_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating recipe: {str(e)}")
 
+@app.post("/generate-recipe/stream/")
+async def generate_recipe_stream(request_data: dict):
+    """Streaming variant of /generate-recipe/.
+
+    Responds with newline-delimited JSON, one event per line:
+    ``{"type": "recipe", "index": i, "recipe": {...}}`` as soon as each recipe's
+    JSON object is complete, then ``{"type": "done", "cached": bool}``, or
+    ``{"type": "error", "detail": "..."}`` if generation fails.
+    """
+    logger.info("Generate recipe stream endpoint hit!")
+    preferences = request_data.get("preferences", {})
+    ingredients = recipe_ingredients(request_data.get("ingredients", []), preferences)
+    cache_key = content_key(models.text_name, recipe_request_key(ingredients, preferences))
+
+    def event(payload):
+        return json.dumps(payload) + "\n"
+
+    async def events():
+        if recipe_cache is not None:
+            cached = await run_in_threadpool(recipe_cache.get, cache_key)
+            if cached is not None:
+                for index, recipe in enumerate(cached.get("recipes", [])):
+                    yield event({"type": "recipe", "index": index, "recipe": recipe})
+                yield event({"type": "done", "cached": True})
+                return
+        if recipe_store is not None:
+            with span("retrieve"):
+                stored = await run_in_threadpool(recipe_store.search, ingredients, preferences)
+            if stored is not None:
+                for index, recipe in enumerate(stored):
+                    yield event({"type": "recipe", "index": index, "recipe": recipe})
+                yield event({"type": "done", "cached": True})
+                return
+
+        prompt = build_recipe_prompt(ingredients, preferences, structured=STRUCTURED_OUTPUT)
+        parser = JsonArrayStreamParser("recipes")
+        recipes = []
+        chunks = []
+        # Parsing is spread over the chunks; it is recorded as one span at the end
+        parse_seconds = 0.0
+        try:
+            async for text in model_client.stream_content(
+                models.text, prompt, priority="recipe", generation_config=RECIPE_GENERATION_CONFIG
+            ):
+                chunks.append(text)
+                start = time.perf_counter()
+                completed = [recipe for recipe in map(validate_recipe, parser.feed(text)) if recipe]
+                parse_seconds += time.perf_counter() - start
+                for recipe in completed:
+                    yield event({"type": "recipe", "index": len(recipes), "recipe": recipe})
+                    recipes.append(recipe)
+
+            # The model may not have used the expected shape; fall back to a full parse
+            if not recipes:
+                try:
+                    with span("parse"):
+                        parsed = parse_recipes("".join(chunks))
+                except ModelOutputError:
+                    yield event({"type": "error", "detail": "Failed to parse recipe"})
+                    return
+                for recipe in parsed["recipes"]:
+                    yield event({"type": "recipe", "index": len(recipes), "recipe": recipe})
+                    recipes.append(recipe)
+        except Overloaded as e:
+            yield event({"type": "error", "detail": str(e), "retry_after": e.retry_after})
+            return
+        except Exception as e:
+            logger.exception("Error streaming recipes")
+            yield event({"type": "error", "detail": f"Error generating recipe: {str(e)}"})
+            return
+        finally:
+            if parse_seconds:
+                record("parse", parse_seconds)
+
+        if recipe_cache is not None and recipes:
+            await run_in_threadpool(recipe_cache.set, cache_key, {"recipes": recipes})
+        if recipe_store is not None and recipes:
+            await run_in_threadpool(recipe_store.add, recipes, preferences)
+        yield event({"type": "done", "cached": False})
+
+    # The status is sent with the first event, so turn requests away while we still can
+    try:
+        model_client.scheduler.check(models.text_name)
+    except Overloaded as e:
+        raise overloaded_error(e)
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+async def run_job(job):
+    """The /jobs/ pipeline: detect food items, canonicalize and filter them, then generate recipes."""
+    payload = job.payload
+    preferences = payload["preferences"]
+    
+    job.begin_stage("analysis")
+    try:
+        analysis = await analyze_contents(
+            payload["base_url"], payload["contents"], payload["content_type"], payload["fallback"], payload["image"]
+        )
+    except IMAGE_ERRORS as e:
+        error = image_error(e)
+        raise JobFailed(error.detail, status_code=error.status_code)
+    job.finish_stage("analysis", analysis)
+    
+    job.begin_stage("ingredients")
+    if INGREDIENT_NORMALIZATION:
+        ingredients, removed = ingredient_index.prepare(analysis["food_items"], preferences)
+    else:
+        ingredients, removed = analysis["food_items"], []
+    job.finish_stage("ingredients", {"ingredients": ingredients, "removed": removed})
+    if not ingredients:
+        raise JobFailed("No ingredients left after removing allergens and avoided ingredients", status_code=400)
+    
+    job.begin_stage("recipes")
+    recipes = await generate_recipes(ingredients, preferences)
+    job.finish_stage("recipes", recipes)
+    if "recipes" not in recipes:
+        raise JobFailed(recipes.get("error", "Failed to generate recipes"))
+
+# Pipeline jobs submitted to /jobs/ (JOB_CONCURRENCY, JOB_QUEUE_MAX, JOB_TTL)
+job_manager = JobManager(
+    run_job, concurrency=JOB_CONCURRENCY, queue_max=JOB_QUEUE_MAX, ttl=JOB_TTL, retain_max=JOB_RETAIN_MAX
+)
+
+@app.post("/jobs/", status_code=202)
+async def submit_job(
+    request: Request,
+    response: Response,
+    file: UploadFile = File(...),
+    preferences: Optional[str] = Form(None),
+    fallback: Optional[str] = None,
+    image: str = "boxes",
+):
+    """Start the analyze -> ingredients -> recipes pipeline for a photo and return its job at once.
+
+    ``preferences`` is the JSON preferences object sent to /generate-recipe/.
+    Follow the job with GET /jobs/{id} or GET /jobs/{id}/events; each stage's
+    result appears under ``results`` as it finishes.
+    """
+    check_analysis_options(fallback, image)
+    try:
+        preferences = json.loads(preferences) if preferences else {}
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"preferences must be JSON: {str(e)}")
+    if not isinstance(preferences, dict):
+        raise HTTPException(status_code=400, detail="preferences must be a JSON object")
+    
+    with span("upload_read"):
+        contents = await read_upload(file)
+    try:
+        job = job_manager.submit({
+            # Only the base URL, for labeled image links; the request is gone by the time the job runs
+            "base_url": str(request.base_url),
+            "contents": contents,
+            "content_type": file.content_type,
+            "fallback": fallback,
+            "image": image,
+            "preferences": preferences,
+        })
+    except Overloaded as e:
+        raise overloaded_error(e)
+    response.headers["Location"] = str(request.url_for("get_job", job_id=job.id))
+    return job.snapshot()
+
+def find_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    # Polls that find nothing new get a 304
+    return json_response(request, find_job(job_id).snapshot(), cache_control="no-cache")
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, request: Request, after: int = 0):
+    """Server-sent events for a job: ``status`` changes and each ``stage`` result, until it finishes.
+
+    Events carry ids, so a reconnecting client (``Last-Event-ID``, or ``?after=``)
+    only gets what it missed.
+    """
+    job = find_job(job_id)
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        after = int(last_event_id)
+    
+    async def events():
+        async for event in job.follow(after, keepalive=JOB_EVENTS_KEEPALIVE):
+            if event is None:
+                # A comment line, so proxies do not close an idle connection
+                yield ": keepalive\n\n"
+            else:
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job. Finished jobs are returned unchanged."""
+    job = find_job(job_id)
+    if not job.finished:
+        job_manager.cancel(job_id)
+        # Let the job record its cancellation before answering
+        await asyncio.wait([job.task], timeout=5)
+    return job.snapshot()
+
+@app.get("/cache-stats/")
+async def cache_stats():
+    return {
+        "analysis": analysis_cache.stats() if analysis_cache is not None else None,
+        "labeled_image": labeled_image_store.stats() if labeled_image_store is not None else None,
+        "recipe": recipe_cache.stats() if recipe_cache is not None else None,
+        "recipe_single_flight": recipe_flights.stats(),
+        "analysis_single_flight": analysis_flights.stats(),
+        "recipe_store": recipe_store.stats() if recipe_store is not None else None,
+    }
+
+@app.get("/fallback-stats/")
+async def fallback_stats():
+    return {
+        "strategy": vision_fallback.strategy,
+        "hedge_delay": vision_fallback.hedge_delay,
+        **vision_fallback.stats.snapshot(),
+    }
+
+def collect_metrics():
+    """Cache, single-flight, fallback and call-layer counters for /metrics."""
+    caches = {"analysis": analysis_cache, "labeled_image": labeled_image_store, "recipe": recipe_cache}
+    for name, cache in caches.items():
+        if cache is None:
+            continue
+        stats = cache.stats()
+        labels = {"cache": name}
+        yield "cache_hits_total", "counter", "Cache lookups that found an entry", labels, stats["hits"]
+        yield "cache_misses_total", "counter", "Cache lookups that found nothing", labels, stats["misses"]
+        yield "cache_evictions_total", "counter", "Entries evicted to stay under the size limit", labels, stats["evictions"]
+        yield "cache_entries", "gauge", "Entries currently cached", labels, stats["size"]
+    if recipe_store is not None:
+        stats = recipe_store.stats()
+        yield ("recipe_store_hits_total", "counter",
+               "Recipe requests answered from stored recipes without the model", {}, stats["hits"])
+        yield ("recipe_store_misses_total", "counter",
+               "Recipe requests the stored recipes could not answer", {}, stats["misses"])
+        yield "recipe_store_recipes", "gauge", "Recipes in the local store", {}, stats["size"]
+    flights = recipe_flights.stats()
+    yield ("recipe_single_flight_deduplicated_total", "counter",
+           "Recipe requests that shared an in-flight model call", {}, flights["deduplicated"])
+    flights = analysis_flights.stats()
+    yield ("analysis_single_flight_deduplicated_total", "counter",
+           "Image analyses that shared an in-flight detection", {}, flights["deduplicated"])
+    for model_name, counters in vision_fallback.stats.snapshot()["models"].items():
+        for outcome in ("usable", "unusable", "errors", "timeouts", "cancelled"):
+            yield ("vision_fallback_attempts_total", "counter", "Image analysis attempts per model and outcome",
+                   {"model": model_name, "outcome": outcome}, counters[outcome])
+        yield ("vision_fallback_wins_total", "counter", "Image analyses answered by each model",
+               {"model": model_name}, counters["wins"])
+    jobs = job_manager.stats()
+    for status, count in jobs["jobs"].items():
+        yield "jobs", "gauge", "Pipeline jobs held by this worker, by status", {"status": status}, count
+    for status, count in jobs["completed"].items():
+        yield "jobs_completed_total", "counter", "Pipeline jobs finished, by outcome", {"status": status}, count
+    yield "jobs_rejected_total", "counter", "Pipeline jobs turned away because the queue was full", {}, jobs["rejected"]
+    yield "gemini_in_flight", "gauge", "Gemini calls currently running in this worker", {}, model_client.in_flight
+    for model_name, priority, depth in model_client.scheduler.depths():
+        yield ("gemini_queue_depth", "gauge", "Gemini calls waiting for their model's rate limit",
+               {"model": model_name, "priority": priority}, depth)
+
+
+metrics_registry.add_collector(collect_metrics)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/test/")
 async def test_endpoint():
     logger.info("Test endpoint hit!")
     return {"message": "API is working!"}
 
 if __name__ == "__main__":
+    # Single process for development; serve.py runs several workers
     import uvicorn
     uvicorn.run(app, host="localhost", port=8000)
\ No newline at end of file
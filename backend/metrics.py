@@ -0,0 +1,266 @@
+"""Request timing and Prometheus metrics.
+
+Code under ``span("name")`` is timed into the ``stage_duration_seconds``
+histogram and into the current request's timings, which
+``TimingMiddleware`` reports as a ``Server-Timing`` header when
+``SERVER_TIMING`` is enabled. The current request is tracked with a context
+variable, so spans inside ``run_in_threadpool`` calls and tasks started by the
+request are attributed to it.
+
+Metrics are kept per worker process and rendered in the Prometheus text
+format by ``render()``. Values owned by other modules (cache and fallback
+counters) are read at scrape time through ``add_collector``.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Add a Server-Timing header with the request's spans to every response
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in ("1", "true", "yes")
+
+# Histogram bucket upper bounds in seconds, from a cache hit to a slow model call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def percentile(values, pct):
+    """The ``pct`` percentile of ``values`` (nearest rank), or None if there are none."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _labels(self.label_names, key), value
+
+
+class Histogram:
+    """Observations bucketed per label combination, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One slot per bucket, then the sum and the count
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        for key, counts in sorted(values.items()):
+            for bound, count in zip((*self.buckets, float("inf")), (*counts[:-2], counts[-1])):
+                yield f"{self.name}_bucket", _labels(self.label_names, key, [("le", _number(bound))]), count
+            yield f"{self.name}_sum", _labels(self.label_names, key), counts[-2]
+            yield f"{self.name}_count", _labels(self.label_names, key), counts[-1]
+
+
+class Registry:
+    """The metrics one worker exposes at /metrics."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register ``collect()``, which yields ``(name, kind, help, labels dict, value)`` at scrape time."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        # Samples of one metric must be contiguous, whatever order collectors yield them in
+        families = {}
+        for collect in self._collectors:
+            for name, kind, help_text, labels, value in collect():
+                family = families.setdefault(name, [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"])
+                family.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "Time to the end of the response body", ["method", "route", "status"]
+)
+STAGE_SECONDS = registry.histogram(
+    "stage_duration_seconds", "Time spent in each stage of a request", ["stage"]
+)
+GEMINI_SECONDS = registry.histogram(
+    "gemini_call_duration_seconds", "Gemini call latency per model", ["model", "outcome"]
+)
+GEMINI_TOKENS = registry.counter(
+    "gemini_tokens_total", "Tokens reported in Gemini usage metadata", ["model", "kind"]
+)
+GEMINI_QUEUE_SECONDS = registry.histogram(
+    "gemini_queue_wait_seconds", "Time a Gemini call waited for its model's rate limit", ["model", "priority"]
+)
+GEMINI_RETRIED = registry.counter(
+    "gemini_retries_total", "Gemini calls retried after a 429 or 503", ["model", "code"]
+)
+GEMINI_REJECTED = registry.counter(
+    "gemini_rejected_total", "Gemini calls given up with a 429 or 503 to the client", ["model", "reason"]
+)
+
+
+class RequestTimings:
+    """Spans recorded while handling one request, for the Server-Timing header."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, description=None):
+        # Spans that run several times (batch images, fallback models) are summed
+        with self._lock:
+            total, count = self._spans.get((name, description), (0.0, 0))
+            self._spans[(name, description)] = (total + seconds, count + 1)
+
+    def header(self):
+        entries = []
+        with self._lock:
+            spans = list(self._spans.items())
+        for (name, description), (seconds, count) in spans:
+            entry = name
+            if description:
+                entry += f';desc="{_escape(description)}"'
+            entries.append(f"{entry};dur={seconds * 1000:.1f}")
+        entries.append(f"total;dur={(time.perf_counter() - self.start) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current = contextvars.ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def span(name, description=None):
+    """Time the enclosed block as request stage ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start, description)
+
+
+def record(name, seconds, description=None):
+    """Record an already measured stage, e.g. one timed across callbacks."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds, description)
+
+
+def record_usage(model_name, usage):
+    """Add a Gemini response's ``usage_metadata`` token counts to the counters."""
+    if usage is None:
+        return
+    for kind, field in (("prompt", "prompt_token_count"), ("output", "candidates_token_count")):
+        count = getattr(usage, field, 0)
+        if count:
+            GEMINI_TOKENS.inc(count, model=model_name, kind=kind)
+
+
+class TimingMiddleware:
+    """Times every HTTP request and optionally adds its spans as a Server-Timing header."""
+
+    def __init__(self, app, server_timing=SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.header().encode("latin-1")))
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _current.reset(token)
+            # The matched route's path template, so IDs in URLs don't create new series
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - timings.start, method=scope["method"], route=route, status=status
+            )
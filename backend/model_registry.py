@@ -0,0 +1,89 @@
+"""Gemini models shared by every request.
+
+``GenerativeModel`` objects are cheap to call but not free to build, and they
+carry the generation config and safety settings, so the app creates them once
+at startup from configuration instead of per request.
+
+Models come from a backend: ``live`` builds real ``GenerativeModel`` objects,
+``stub`` builds ``stub_gemini.StubModel`` objects that replay recorded
+responses offline. A backend is any callable
+``(name, generation_config, safety_settings) -> model`` whose models provide
+``model_name``, ``generate_content`` and ``generate_content_async``.
+"""
+import os
+
+import google.generativeai as genai
+
+from stub_gemini import StubModel
+
+# "live" calls the Gemini API, "stub" replays recorded responses without network access
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "live")
+
+# Recipe generation, and the fallback for image analysis
+GEMINI_TEXT_MODEL = os.getenv("GEMINI_TEXT_MODEL", "gemini-2.0-flash")
+# Primary model for image analysis
+GEMINI_VISION_MODEL = os.getenv("GEMINI_VISION_MODEL", "gemini-1.5-pro")
+# Generation settings applied to every call; unset keeps the model defaults
+GEMINI_TEMPERATURE = os.getenv("GEMINI_TEMPERATURE")
+GEMINI_MAX_OUTPUT_TOKENS = os.getenv("GEMINI_MAX_OUTPUT_TOKENS")
+# Block threshold for every harm category, e.g. BLOCK_ONLY_HIGH; unset keeps the API default
+GEMINI_SAFETY_THRESHOLD = os.getenv("GEMINI_SAFETY_THRESHOLD")
+
+
+def generation_config_from_env():
+    config = {}
+    if GEMINI_TEMPERATURE:
+        config["temperature"] = float(GEMINI_TEMPERATURE)
+    if GEMINI_MAX_OUTPUT_TOKENS:
+        config["max_output_tokens"] = int(GEMINI_MAX_OUTPUT_TOKENS)
+    return config or None
+
+
+def live_backend(name, generation_config, safety_settings):
+    return genai.GenerativeModel(name, generation_config=generation_config, safety_settings=safety_settings)
+
+
+def stub_backend(name, generation_config, safety_settings):
+    return StubModel(name)
+
+
+BACKENDS = {"live": live_backend, "stub": stub_backend}
+
+
+class ModelRegistry:
+    """The text and vision models, built once per process with shared settings.
+
+    Per-call settings (such as a response schema) passed to ``generate_content``
+    are merged over the ``generation_config`` given here.
+    """
+
+    def __init__(self, text_name=GEMINI_TEXT_MODEL, vision_name=GEMINI_VISION_MODEL,
+                 generation_config=None, safety_settings=GEMINI_SAFETY_THRESHOLD, backend=GEMINI_BACKEND):
+        if generation_config is None:
+            generation_config = generation_config_from_env()
+        if isinstance(backend, str):
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown GEMINI_BACKEND: {backend}")
+            backend = BACKENDS[backend]
+        self.text_name = text_name
+        self.vision_name = vision_name
+        self.generation_config = generation_config
+        self.safety_settings = safety_settings
+        self.backend = backend
+        self.build()
+
+    def build(self):
+        self.text = self.backend(self.text_name, self.generation_config, self.safety_settings)
+        self.vision = self.backend(self.vision_name, self.generation_config, self.safety_settings)
+        self.pid = os.getpid()
+
+    def rebuild_after_fork(self):
+        """Build fresh models if this process was forked after they were built.
+
+        The SDK's gRPC channels cannot be shared with a forked child, so each
+        worker of a preloaded server needs its own. Returns True if it rebuilt.
+        """
+        if self.pid == os.getpid():
+            return False
+        self.build()
+        return True
@@ -0,0 +1,266 @@
+"""Tolerant parsing of the JSON the models return.
+
+Models wrap their JSON in markdown fences, add chatter before or after it,
+leave trailing commas, or stop mid-object. ``extract_json`` handles all of
+these in linear time (a bounded number of scans over the text); the Pydantic
+models below then validate the detected-item and recipe schemas so malformed
+entries are dropped instead of reaching the client.
+"""
+import json
+import re
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+# Max number of candidate JSON values tried before giving up
+MAX_CANDIDATES = 8
+
+
+class ModelOutputError(ValueError):
+    """The model's response did not contain usable JSON for the expected schema."""
+
+
+class DetectedItem(BaseModel):
+    name: str
+    box: List[float] = Field(min_length=4, max_length=4, description="[ymin, xmin, ymax, xmax], normalized to 0-1")
+
+    @field_validator("name")
+    @classmethod
+    def strip_name(cls, value):
+        value = value.strip()
+        if not value:
+            raise ValueError("empty item name")
+        return value
+
+
+class DetectionList(BaseModel):
+    items: List[DetectedItem]
+
+
+class Recipe(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    title: str
+    ingredients: List[str]
+    instructions: List[str]
+    prep_time: Optional[str] = None
+    cook_time: Optional[str] = None
+    servings: Optional[Union[int, str]] = None
+
+    @field_validator("prep_time", "cook_time", mode="before")
+    @classmethod
+    def number_to_text(cls, value):
+        # "prep_time": 10 is common; keep the documented string form
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"{value:g} minutes"
+        return value
+
+    @field_validator("ingredients", "instructions", mode="before")
+    @classmethod
+    def items_to_text(cls, value):
+        # Steps sometimes come back as {"step": 1, "text": "..."} objects
+        if not isinstance(value, list):
+            return value
+        texts = []
+        for item in value:
+            if isinstance(item, dict):
+                item = item.get("text") or item.get("instruction") or item.get("name") or json.dumps(item)
+            texts.append(item if isinstance(item, str) else str(item))
+        return texts
+
+
+class RecipeList(BaseModel):
+    recipes: List[Recipe]
+
+
+# JSON Schema keywords Gemini's response_schema understands, with their names there
+_SCHEMA_KEYWORDS = {"type": "type", "description": "description", "enum": "enum",
+                    "minItems": "min_items", "maxItems": "max_items"}
+
+
+def response_schema(model):
+    """Gemini ``response_schema`` for a Pydantic model.
+
+    Gemini accepts a small OpenAPI subset: ``$ref`` is inlined, ``Optional[X]``
+    becomes a nullable X, other unions use their first member, and titles,
+    defaults and extra keywords are dropped.
+    """
+    schema = model.model_json_schema()
+    definitions = schema.pop("$defs", {})
+
+    def convert(node):
+        if "$ref" in node:
+            node = definitions[node["$ref"].rsplit("/", 1)[-1]]
+        nullable = False
+        if "anyOf" in node:
+            options = [option for option in node["anyOf"] if option.get("type") != "null"]
+            nullable = len(options) < len(node["anyOf"])
+            node = {**options[0], **{key: value for key, value in node.items() if key != "anyOf"}}
+            if "$ref" in node:
+                node = convert(node)
+        result = {name: node[key] for key, name in _SCHEMA_KEYWORDS.items() if key in node}
+        if nullable:
+            result["nullable"] = True
+        if "properties" in node:
+            result["properties"] = {name: convert(value) for name, value in node["properties"].items()}
+            if node.get("required"):
+                result["required"] = list(node["required"])
+        if "items" in node:
+            result["items"] = convert(node["items"])
+        return result
+
+    return convert(schema)
+
+
+# A complete (or, at the very end, unterminated) string literal
+_STRING = r'"(?:[^"\\]|\\.)*(?:(")|\\?\Z)'
+# Tokens that matter to the bracket scan; everything else is skipped in C
+_TOKEN = re.compile(_STRING + r"|[{}\[\]]")
+_TRAILING_COMMA = re.compile("(" + _STRING + r")|,(\s*[}\]])")
+
+
+def _repair(text):
+    """Drop trailing commas before a closing bracket, outside strings. Linear time."""
+    return _TRAILING_COMMA.sub(lambda match: match.group(1) or match.group(3), text)
+
+
+def _scan_value(text, start):
+    """Return (end, closers) for the JSON value opening at ``start``.
+
+    ``end`` is the index just past the matching close bracket, or ``len(text)``
+    if the value is truncated, in which case ``closers`` holds the brackets
+    (and quote) needed to close it.
+    """
+    stack = []
+    for match in _TOKEN.finditer(text, start):
+        token = match.group(0)
+        if token.startswith('"'):
+            if match.group(1) is None:
+                return len(text), '"' + "".join(reversed(stack))
+        elif token in "{[":
+            stack.append("}" if token == "{" else "]")
+        elif not stack or stack[-1] != token:
+            return match.start(), None
+        else:
+            stack.pop()
+            if not stack:
+                return match.end(), ""
+    return len(text), "".join(reversed(stack))
+
+
+# A key, key-value pair or separator left dangling where the output was cut off
+_DANGLING = re.compile(r'(,\s*"(?:[^"\\]|\\.)*"\s*(:\s*("(?:[^"\\]|\\.)*")?)?|[,:])\s*$')
+
+
+def _candidates(value, closers):
+    """Texts to try ``json.loads`` on for one scanned value, most faithful first."""
+    if not closers:
+        yield value
+        yield _repair(value)
+        return
+    # Truncated output: close the open string, then every open bracket
+    body = value.rstrip()
+    if closers.startswith('"'):
+        body += '"'
+        closers = closers[1:]
+    for attempt in (body + closers, _DANGLING.sub("", body) + closers):
+        yield attempt
+        yield _repair(attempt)
+
+
+def extract_json(text):
+    """Return the first JSON object or array found in ``text``.
+
+    Raises ``ModelOutputError`` if none can be recovered.
+    """
+    if not isinstance(text, str):
+        raise ModelOutputError("model response is not text")
+    position = 0
+    for _ in range(MAX_CANDIDATES):
+        starts = [index for index in (text.find("{", position), text.find("[", position)) if index != -1]
+        if not starts:
+            break
+        start = min(starts)
+        end, closers = _scan_value(text, start)
+        if closers is not None:
+            for attempt in _candidates(text[start:end], closers):
+                try:
+                    return json.loads(attempt)
+                except (json.JSONDecodeError, RecursionError):
+                    continue
+        position = start + 1
+    raise ModelOutputError("no JSON found in model response")
+
+
+# "name": [ymin, xmin, ymax, xmax] with any JSON number form
+_NUMBER = r"(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)"
+_ITEM_PATTERN = re.compile(r'"([^"\\]+)"\s*:\s*\[\s*' + r"\s*,\s*".join([_NUMBER] * 4) + r"\s*\]")
+
+
+def _items_from_json(data):
+    if isinstance(data, dict) and isinstance(data.get("items"), list):
+        return data["items"]
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict):
+        return [{"name": name, "box": box} for name, box in data.items()]
+    return []
+
+
+def parse_detected_items(text):
+    """Parse ``(food_items, items_with_boxes)`` out of a vision model response.
+
+    Accepts ``{"name": [box], ...}``, ``{"items": [{"name", "box"}, ...]}`` or a
+    bare list of items. ``food_items`` keeps first-seen order without duplicates.
+    """
+    try:
+        food_items, items_with_boxes = _validate_items(_items_from_json(extract_json(text)))
+    except ModelOutputError:
+        food_items, items_with_boxes = [], []
+    if not items_with_boxes:
+        # Not JSON we understand: pick out "name": [box] pairs wherever they appear
+        raw_items = [{"name": match[0], "box": match[1:]} for match in _ITEM_PATTERN.findall(text or "")]
+        food_items, items_with_boxes = _validate_items(raw_items)
+    return food_items, items_with_boxes
+
+
+def _validate_items(raw_items):
+    food_items = []
+    items_with_boxes = []
+    seen = set()
+    for raw in raw_items:
+        try:
+            item = DetectedItem.model_validate(raw)
+        except ValidationError:
+            continue
+        items_with_boxes.append((item.name, item.box))
+        if item.name not in seen:
+            seen.add(item.name)
+            food_items.append(item.name)
+    return food_items, items_with_boxes
+
+
+def validate_recipe(data):
+    """Return ``data`` as a validated recipe dict, or None if it does not fit the schema."""
+    try:
+        return Recipe.model_validate(data).model_dump(exclude_none=True)
+    except ValidationError:
+        return None
+
+
+def parse_recipes(text):
+    """Parse ``{"recipes": [...]}`` out of a recipe model response.
+
+    Invalid recipes are dropped. Raises ``ModelOutputError`` if none are left.
+    """
+    data = extract_json(text)
+    if isinstance(data, list):
+        data = {"recipes": data}
+    elif isinstance(data, dict) and "recipes" not in data and "title" in data:
+        data = {"recipes": [data]}
+    if not isinstance(data, dict) or not isinstance(data.get("recipes"), list):
+        raise ModelOutputError("model response has no recipes list")
+    recipes = [recipe for recipe in map(validate_recipe, data["recipes"]) if recipe is not None]
+    if not recipes:
+        raise ModelOutputError("model response has no valid recipes")
+    return {"recipes": recipes}
@@ -0,0 +1,138 @@
+"""Prompt templates for the Gemini calls.
+
+Every fixed piece of text is built once at import. A recipe prompt is then a
+single ``"".join`` over those pieces, the ingredients and one short string per
+preference that is set.
+"""
+
+# Unified prompt that asks for both food items and bounding boxes
+VISION_PROMPT = """
+Analyze this image carefully and identify each individual food item or ingredient visible.
+
+For EACH SPECIFIC ITEM (not categories or shelves), provide a tight bounding box in normalized [ymin, xmin, ymax, xmax] format:
+- ymin: the top edge (0 = top of image, 1 = bottom of image)
+- xmin: the left edge (0 = left of image, 1 = right of image)
+- ymax: the bottom edge (0 = top of image, 1 = bottom of image)
+- xmax: the right edge (0 = left of image, 1 = right of image)
+
+Important rules:
+1. Identify INDIVIDUAL ITEMS, not categories or shelves
+2. Draw TIGHT boxes around each specific product
+3. If you see multiple instances of the same item, create a separate box for each
+4. Be specific with item names (e.g., "strawberry jam" instead of just "jam")
+5. Boxes can overlap if items are close to each other
+
+Return a JSON object where:
+- Each key is the name of a specific food item
+- Each value is an array of coordinates [ymin, xmin, ymax, xmax]
+
+Example response:
+{
+    "strawberry jam jar": [0.1, 0.2, 0.3, 0.4],
+    "milk bottle": [0.5, 0.6, 0.7, 0.8],
+    "cheddar cheese": [0.2, 0.3, 0.4, 0.5]
+}
+
+OR alternatively, you can return a structure with an 'items' array:
+
+{
+    "items": [
+        {"name": "strawberry jam jar", "box": [0.1, 0.2, 0.3, 0.4]},
+        {"name": "milk bottle", "box": [0.5, 0.6, 0.7, 0.8]},
+        {"name": "cheddar cheese", "box": [0.2, 0.3, 0.4, 0.5]}
+    ]
+}
+
+Only include food items that are clearly visible and identifiable in the image.
+Return only the JSON object without any additional text or explanations.
+"""
+
+# The same instructions without the format description, for GEMINI_OUTPUT_MODE=schema
+VISION_SCHEMA_PROMPT = """
+Identify each individual food item or ingredient clearly visible in this image.
+List specific items, not categories or shelves, with one entry per instance, and
+be specific with names (e.g., "strawberry jam" instead of just "jam").
+Give each a tight bounding box; boxes can overlap.
+"""
+
+# Appended to the recipe prompt unless the response schema already fixes the format
+RECIPE_FORMAT_INSTRUCTIONS = """
+    Format the response as a JSON object with the following structure:
+    {
+        "recipes": [
+            {
+                "title": "Recipe 1 Name",
+                "ingredients": ["ingredient 1", "ingredient 2", ...],
+                "instructions": ["step 1", "step 2", ...],
+                "prep_time": "X minutes",
+                "cook_time": "Y minutes",
+                "servings": Z
+            },
+            {
+                "title": "Recipe 2 Name",
+                "ingredients": ["ingredient 1", "ingredient 2", ...],
+                "instructions": ["step 1", "step 2", ...],
+                "prep_time": "X minutes",
+                "cook_time": "Y minutes",
+                "servings": Z
+            },
+            {
+                "title": "Recipe 3 Name",
+                "ingredients": ["ingredient 1", "ingredient 2", ...],
+                "instructions": ["step 1", "step 2", ...],
+                "prep_time": "X minutes",
+                "cook_time": "Y minutes",
+                "servings": Z
+            }
+        ]
+    }
+
+    Return only the JSON object without any additional text.
+    """
+
+
+# (preference key, text before the value, text after it), in prompt order.
+# List values are comma-joined; a plain string is used as is.
+RECIPE_CONSTRAINTS = (
+    ("allergies", "DO NOT include these allergens: ", "."),
+    ("dietaryRestrictions", "Follow these dietary restrictions: ", "."),
+    ("mealType", "The recipe should be for a ", "."),
+    ("cuisineTypes", "The recipe should be in the style of ", " cuisine."),
+    ("prepTime", "The preparation time should be around ", "."),
+    ("cookingMethods", "Use these cooking methods: ", "."),
+    ("preferredIngredients", "Try to include these preferred ingredients if possible: ", "."),
+    ("avoidIngredients", "DO NOT use these ingredients: ", "."),
+)
+
+_RECIPE_HEAD = """
+    Generate THREE different recipes using only the ingredients listed: """
+_RECIPE_BODY = """.
+
+    You don't have to use all the ingredients, but use a subset of them for each recipe.
+    Make each recipe unique and different from the others.
+
+    """
+_RECIPE_TAIL = """
+    """
+_RECIPE_TAIL_WITH_FORMAT = _RECIPE_TAIL + RECIPE_FORMAT_INSTRUCTIONS
+
+
+def build_recipe_prompt(ingredients, preferences, structured=False):
+    """Build the recipe generation prompt from the ingredients and user preferences.
+
+    With ``structured`` the JSON format is left to the response schema.
+    """
+    constraints = []
+    for key, before, after in RECIPE_CONSTRAINTS:
+        value = preferences.get(key)
+        if value:
+            # Lists are joined; anything else (a string, or a number such as prepTime 30) is used as is
+            text = ", ".join(map(str, value)) if isinstance(value, (list, tuple)) else str(value)
+            constraints.append(before + text + after)
+    return "".join((
+        _RECIPE_HEAD,
+        ingredients if isinstance(ingredients, str) else ", ".join(ingredients),
+        _RECIPE_BODY,
+        " ".join(constraints),
+        _RECIPE_TAIL if structured else _RECIPE_TAIL_WITH_FORMAT,
+    ))
@@ -0,0 +1,268 @@
+"""Local store of generated recipes, searched before asking the model.
+
+Every recipe list the model returns (and ``parse_recipes`` validates) is added
+here. Each recipe is indexed under the canonical names of its ingredients
+(see ingredients.py), minus the staples every kitchen has, in an inverted
+index from ingredient to recipes.
+
+A request is answered from the store when enough stored recipes can be cooked
+from its ingredients:
+
+* candidates are the recipes indexed under any requested ingredient
+* a recipe's coverage is the share of its ingredients the request has; it must
+  be at least ``RECIPE_STORE_MIN_COVERAGE``
+* recipes whose title or ingredient lines mention an allergen or avoided
+  ingredient anywhere ("2 cups chicken broth" for meat), or contain the words
+  of a term the alias table does not know, are skipped
+* the free-text preferences (diet, cuisine, meal type, prep time, cooking
+  methods) must match the ones the recipe was generated for
+* the best ``RECIPE_STORE_MATCHES`` distinct recipes are returned, ranked by
+  coverage, then preferred ingredients used, then requested ingredients used
+
+With fewer matches than that, the request goes to the model as before.
+
+``RECIPE_STORE_BACKEND`` is ``memory`` (default), ``disk`` or ``none``. The
+index is always in memory; with ``disk`` the recipes are also kept in an
+SQLite table, loaded at startup and re-read for rows added by other workers.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from cache import content_key
+from canonical import normalize_list, normalize_term
+from ingredients import contains, ingredient_index
+
+RECIPE_STORE_BACKEND = os.getenv("RECIPE_STORE_BACKEND", "memory").lower()
+RECIPE_STORE_PATH = os.getenv("RECIPE_STORE_PATH", os.path.join(".cache", "results.sqlite3"))
+# Recipes kept; the oldest are dropped beyond this
+RECIPE_STORE_SIZE = int(os.getenv("RECIPE_STORE_SIZE", "5000"))
+# Share of a recipe's ingredients (staples aside) the request must have
+RECIPE_STORE_MIN_COVERAGE = float(os.getenv("RECIPE_STORE_MIN_COVERAGE", "0.8"))
+# Matching recipes needed to answer without the model (the prompt asks for three)
+RECIPE_STORE_MATCHES = int(os.getenv("RECIPE_STORE_MATCHES", "3"))
+
+# Preferences a stored recipe cannot be checked against, so they must match exactly
+PROFILE_LISTS = ("dietaryRestrictions", "cuisineTypes", "cookingMethods")
+PROFILE_SCALARS = ("mealType", "prepTime")
+
+# Seconds between checks of the disk table for recipes added by other workers
+REFRESH_INTERVAL = 2.0
+
+
+def preference_profile(preferences):
+    """The free-text preferences a recipe was generated for, as a stable string."""
+    preferences = preferences or {}
+    profile = {field: normalize_list(preferences.get(field)) for field in PROFILE_LISTS}
+    for field in PROFILE_SCALARS:
+        value = preferences.get(field)
+        profile[field] = normalize_term(value) if value else None
+    return json.dumps(profile, sort_keys=True, separators=(",", ":"))
+
+
+class _Entry:
+    __slots__ = ("recipe", "title", "profile", "needs", "mentions", "words")
+
+    def __init__(self, recipe, profile, index):
+        self.recipe = recipe
+        self.title = normalize_term(recipe.get("title", ""))
+        self.profile = profile
+        needs = set()
+        # The title counts for allergies too: "Crab Fried Rice" is shellfish whatever the lines say
+        mentions = set(index.lookup(recipe.get("title", ""))[1])
+        lines = recipe.get("ingredients", [])
+        self.words = tuple(index.words(text) for text in (recipe.get("title", ""), *lines))
+        for line in lines:
+            canonical, known = index.lookup(line)
+            if canonical is None:
+                continue
+            mentions |= known
+            mentions.add(canonical)
+            # "salt and pepper" is not a known name, but only mentions staples
+            if not (known and known <= index.staples):
+                needs.add(canonical)
+        self.needs = frozenset(needs)
+        self.mentions = frozenset(mentions)
+
+
+class RecipeStore:
+    """Inverted index from canonical ingredient to stored recipes."""
+
+    def __init__(self, path=None, max_recipes=5000, min_coverage=0.8, matches=3, index=ingredient_index):
+        self.path = path
+        self.max_recipes = max_recipes
+        self.min_coverage = min_coverage
+        self.matches = matches
+        self.index = index
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self._entries = {}
+        # (profile, ingredient) -> ids of the recipes that need it
+        self._postings = {}
+        self._keys = set()
+        self._next_id = 1
+        self._last_row = 0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._connection = self._connect()
+            self._pid = os.getpid()
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS recipe_store ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL, profile TEXT NOT NULL, recipe TEXT NOT NULL)"
+            )
+            self._refresh()
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+
+    @property
+    def _conn(self):
+        # As in DiskCache: one connection per process
+        if self._pid != os.getpid():
+            self._connection = self._connect()
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        with self._lock:
+            if self.path is not None and self._pid == os.getpid():
+                self._connection.close()
+                self._pid = None
+
+    def _refresh(self):
+        """Index rows other processes added since the last look; called with the lock held."""
+        self._last_refresh = time.monotonic()
+        rows = self._conn.execute(
+            "SELECT id, key, profile, recipe FROM recipe_store WHERE id > ? ORDER BY id", (self._last_row,)
+        ).fetchall()
+        for row_id, key, profile, recipe in rows:
+            self._last_row = row_id
+            self._index(key, profile, json.loads(recipe))
+        self._trim()
+
+    def _index(self, key, profile, recipe):
+        if key in self._keys:
+            return False
+        entry = _Entry(recipe, profile, self.index)
+        if not entry.needs:
+            return False
+        entry_id = self._next_id
+        self._next_id += 1
+        self._keys.add(key)
+        self._entries[entry_id] = (key, entry)
+        for ingredient in entry.needs:
+            self._postings.setdefault((profile, ingredient), set()).add(entry_id)
+        return True
+
+    def _trim(self):
+        # Ids increase with insertion, and dicts keep insertion order
+        while len(self._entries) > self.max_recipes:
+            entry_id = next(iter(self._entries))
+            key, entry = self._entries.pop(entry_id)
+            self._keys.discard(key)
+            for ingredient in entry.needs:
+                postings = self._postings[(entry.profile, ingredient)]
+                postings.discard(entry_id)
+                if not postings:
+                    del self._postings[(entry.profile, ingredient)]
+
+    def add(self, recipes, preferences):
+        """Store validated ``recipes`` generated for ``preferences``; returns how many were new."""
+        profile = preference_profile(preferences)
+        added = 0
+        with self._lock:
+            for recipe in recipes:
+                key = content_key(
+                    profile, normalize_term(recipe.get("title", "")), json.dumps(sorted(recipe.get("ingredients", [])))
+                )
+                if self.path is not None:
+                    self._conn.execute(
+                        "INSERT OR IGNORE INTO recipe_store (key, profile, recipe) VALUES (?, ?, ?)",
+                        (key, profile, json.dumps(recipe)),
+                    )
+                if self._index(key, profile, recipe):
+                    added += 1
+            self._trim()
+            if self.path is not None:
+                overflow = self._conn.execute("SELECT COUNT(*) FROM recipe_store").fetchone()[0] - self.max_recipes
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM recipe_store WHERE id IN (SELECT id FROM recipe_store ORDER BY id LIMIT ?)",
+                        (overflow,),
+                    )
+            self.added += added
+        return added
+
+    def search(self, ingredients, preferences):
+        """``RECIPE_STORE_MATCHES`` stored recipes for this request, or None to ask the model."""
+        preferences = preferences or {}
+        profile = preference_profile(preferences)
+        have = set(self.index.canonicalize_all(ingredients))
+        terms = self.index.preference_terms(preferences)
+        excluded = self.index.exclusions(terms)
+        unknown = self.index.unknown_terms(terms)
+        preferred = set(self.index.canonicalize_all(preferences.get("preferredIngredients")))
+        with self._lock:
+            if self.path is not None and time.monotonic() - self._last_refresh > REFRESH_INTERVAL:
+                self._refresh()
+            found = Counter()
+            for ingredient in have:
+                found.update(self._postings.get((profile, ingredient), ()))
+            ranked = []
+            for entry_id, count in found.items():
+                entry = self._entries[entry_id][1]
+                coverage = count / len(entry.needs)
+                if coverage < self.min_coverage or not excluded.isdisjoint(entry.mentions):
+                    continue
+                if unknown and any(contains(words, unknown) for words in entry.words):
+                    continue
+                ranked.append((-coverage, -len(entry.needs & preferred), -count, entry_id))
+            ranked.sort()
+            recipes = []
+            titles = set()
+            for *_, entry_id in ranked:
+                entry = self._entries[entry_id][1]
+                if entry.title in titles:
+                    continue
+                titles.add(entry.title)
+                recipes.append(entry.recipe)
+                if len(recipes) == self.matches:
+                    self.hits += 1
+                    return recipes
+            self.misses += 1
+            return None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            "backend": "memory" if self.path is None else "disk",
+            "size": len(self._entries),
+            "max_recipes": self.max_recipes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "added": self.added,
+        }
+
+
+def make_recipe_store():
+    """Build the store from ``RECIPE_STORE_*`` environment variables, or None if disabled."""
+    if RECIPE_STORE_BACKEND == "none":
+        return None
+    if RECIPE_STORE_BACKEND not in ("memory", "disk"):
+        raise ValueError(f"Unknown RECIPE_STORE_BACKEND: {RECIPE_STORE_BACKEND}")
+    return RecipeStore(
+        RECIPE_STORE_PATH if RECIPE_STORE_BACKEND == "disk" else None,
+        max_recipes=RECIPE_STORE_SIZE,
+        min_coverage=RECIPE_STORE_MIN_COVERAGE,
+        matches=RECIPE_STORE_MATCHES,
+    )
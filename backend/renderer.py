@@ -0,0 +1,123 @@
+"""Bounding-box renderer for the labeled images returned by /analyze-image/.
+
+Fonts are looked up once per process and cached per size, labels and line
+widths scale with the image, and because the labeled image is only ever
+displayed, large inputs are drawn on a copy reduced by an integer factor
+towards ``RENDER_MAX_EDGE`` and encoded with a configurable format and quality.
+"""
+import io
+import os
+from functools import lru_cache
+
+from PIL import ImageDraw, ImageFont
+
+# Target longest edge in pixels of the rendered image (0 keeps the input size).
+# Images are only reduced by whole factors, which is several times cheaper than
+# an exact resample, so the output edge ends up between this and twice this.
+RENDER_MAX_EDGE = int(os.getenv("RENDER_MAX_EDGE", "1280"))
+# JPEG, WEBP or PNG
+RENDER_FORMAT = os.getenv("RENDER_FORMAT", "JPEG").upper()
+RENDER_QUALITY = int(os.getenv("RENDER_QUALITY", "80"))
+
+# Tried in order; the first one that loads is used for every label
+FONT_CANDIDATES = [
+    os.getenv("LABEL_FONT_PATH", ""),
+    "arial.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+
+
+def _find_font_path():
+    for candidate in FONT_CANDIDATES:
+        if not candidate:
+            continue
+        try:
+            ImageFont.truetype(candidate, 16)
+            return candidate
+        except OSError:
+            continue
+    return None
+
+
+FONT_PATH = _find_font_path()
+
+
+@lru_cache(maxsize=32)
+def load_font(size):
+    """The label font at ``size`` pixels, loaded at most once per size."""
+    if FONT_PATH:
+        return ImageFont.truetype(FONT_PATH, size)
+    return ImageFont.load_default(size=size)
+
+
+class BoxRenderer:
+    """Draws labeled boxes on an image and encodes the result."""
+
+    def __init__(self, max_edge=RENDER_MAX_EDGE, image_format=RENDER_FORMAT, quality=RENDER_QUALITY):
+        if image_format not in ("JPEG", "WEBP", "PNG"):
+            raise ValueError(f"Unknown RENDER_FORMAT: {image_format}")
+        self.max_edge = max_edge
+        self.format = image_format
+        self.quality = quality
+
+    @property
+    def signature(self):
+        """Identifies the output settings, for use in cache keys."""
+        return f"{self.max_edge}:{self.format}:{self.quality}"
+
+    def render(self, image, items_with_boxes):
+        """Return ``image`` with ``(name, [ymin, xmin, ymax, xmax])`` boxes drawn on it, encoded."""
+        factor = max(image.size) // self.max_edge if self.max_edge else 1
+        if factor > 1:
+            image = image.reduce(factor)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        width, height = image.size
+        short_edge = min(width, height)
+        font = load_font(max(12, round(short_edge * 0.025)))
+        line_width = max(2, round(short_edge / 250))
+        padding = max(2, line_width)
+
+        draw = ImageDraw.Draw(image)
+        for item, box in items_with_boxes:
+            try:
+                if len(box) != 4:
+                    continue
+                # Clamp to the valid range (0-1) and convert to pixel coordinates
+                ymin, xmin, ymax, xmax = (max(0.0, min(1.0, value)) for value in box)
+                xmin_px = int(xmin * width)
+                ymin_px = int(ymin * height)
+                xmax_px = int(xmax * width)
+                ymax_px = int(ymax * height)
+
+                # Skip degenerate boxes and ones covering almost the whole image
+                if not (xmax_px > xmin_px and ymax_px > ymin_px and
+                        (xmax_px - xmin_px) < 0.9 * width and
+                        (ymax_px - ymin_px) < 0.9 * height):
+                    continue
+
+                draw.rectangle([(xmin_px, ymin_px), (xmax_px, ymax_px)], outline="red", width=line_width)
+
+                # Draw label with background for better visibility
+                text_position = (xmin_px + line_width + padding, ymin_px + line_width + padding)
+                text_box = draw.textbbox(text_position, item, font=font)
+                draw.rectangle([(text_box[0] - padding, text_box[1] - padding),
+                                (text_box[2] + padding, text_box[3] + padding)], fill="red")
+                draw.text(text_position, item, fill="white", font=font)
+            except Exception as e:
+                print(f"Error drawing box for {item}: {str(e)}")
+                continue
+
+        buffer = io.BytesIO()
+        if self.format == "PNG":
+            image.save(buffer, format="PNG")
+        else:
+            image.save(buffer, format=self.format, quality=self.quality)
+        return buffer.getvalue()
+
+
+box_renderer = BoxRenderer()
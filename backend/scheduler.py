@@ -0,0 +1,216 @@
+"""Rate-limit-aware scheduling of outbound Gemini calls.
+
+Each model gets a token bucket sized to its requests-per-minute quota
+(``GEMINI_RPM``). A call that finds the bucket empty waits in that model's
+queue, where waiters are served by priority (``GEMINI_PRIORITY``, e.g. image
+analysis before recipes) and then in arrival order. Once a model's queue holds
+``GEMINI_QUEUE_MAX`` waiters, further calls fail at once with ``Overloaded``,
+so the endpoint can answer 429 with a ``Retry-After`` instead of holding the
+connection open.
+
+Calls the API rejects with a 429 or 503 are retried with exponential backoff
+and full jitter. A 429 also empties the model's bucket, so the calls queued
+behind it slow down instead of hitting the quota again.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import random
+import time
+from collections import Counter as Tally
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable, TooManyRequests
+
+from metrics import GEMINI_QUEUE_SECONDS, GEMINI_REJECTED, GEMINI_RETRIED
+
+# Requests per minute per model: "1000", or a default plus per-model overrides
+# such as "1000,gemini-1.5-pro=360". 0 disables the limit.
+GEMINI_RPM = os.getenv("GEMINI_RPM", "1000")
+# Calls a model can make at once after being idle
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+# Max calls waiting for one model's rate limit before new ones are turned away
+GEMINI_QUEUE_MAX = int(os.getenv("GEMINI_QUEUE_MAX", "64"))
+# Which kind of call is served first when a model is rate limited
+GEMINI_PRIORITY = os.getenv("GEMINI_PRIORITY", "vision,recipe")
+# Retries after a 429 or 503, and the backoff bounds in seconds
+GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", "3"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "0.5"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "8"))
+
+# API errors that mean "too much traffic right now"
+RATE_LIMITED = (ResourceExhausted, TooManyRequests)
+RETRYABLE = (*RATE_LIMITED, ServiceUnavailable)
+
+
+class Overloaded(Exception):
+    """Gemini capacity is used up for now; the client should retry after ``retry_after`` seconds."""
+
+    def __init__(self, message, retry_after, status_code=429):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def parse_rpm(spec):
+    """Parse a ``GEMINI_RPM`` value into ``(default, {model: rpm})``."""
+    default = 0.0
+    overrides = {}
+    for part in filter(None, (part.strip() for part in spec.split(","))):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            overrides[name.strip().removeprefix("models/")] = float(value)
+        else:
+            default = float(part)
+    return default, overrides
+
+
+class TokenBucket:
+    """``rate`` calls per second on average, with bursts of up to ``burst``."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Take a token and return 0, or return the seconds until one is available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _Lane:
+    """One model's bucket and the calls waiting on it."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        # Heap of (priority rank, arrival number, future)
+        self.waiters = []
+        self.depth = Tally()
+        self.pump = None
+
+
+class Scheduler:
+    """Admits model calls under per-model rate limits, by priority, and decides on retries."""
+
+    def __init__(self, rpm=GEMINI_RPM, burst=GEMINI_BURST, queue_max=GEMINI_QUEUE_MAX,
+                 priority=GEMINI_PRIORITY, retries=GEMINI_RETRIES, backoff_base=GEMINI_BACKOFF_BASE,
+                 backoff_max=GEMINI_BACKOFF_MAX, seed=None):
+        self.default_rpm, self.model_rpm = parse_rpm(rpm)
+        self.burst = burst
+        self.queue_max = queue_max
+        self.priorities = [name.strip() for name in priority.split(",") if name.strip()]
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._rng = random.Random(seed)
+        self._lanes = {}
+        self._arrivals = itertools.count()
+
+    def _lane(self, model_name):
+        lane = self._lanes.get(model_name)
+        if lane is None:
+            rpm = self.model_rpm.get(model_name, self.default_rpm)
+            lane = self._lanes[model_name] = _Lane(TokenBucket(rpm / 60, self.burst) if rpm > 0 else None)
+        return lane
+
+    def _rank(self, priority):
+        # Unknown or missing priorities go after every listed one
+        return self.priorities.index(priority) if priority in self.priorities else len(self.priorities)
+
+    def retry_after(self, model_name):
+        """Whole seconds until ``model_name``'s current queue has likely drained."""
+        lane = self._lane(model_name)
+        if lane.bucket is None:
+            return 1
+        waiting = sum(lane.depth.values())
+        return max(1, math.ceil((waiting + 1) / lane.bucket.rate))
+
+    def check(self, model_name):
+        """Raise ``Overloaded`` if a call to ``model_name`` would be turned away right now."""
+        lane = self._lane(model_name)
+        if sum(lane.depth.values()) >= self.queue_max:
+            GEMINI_REJECTED.inc(model=model_name, reason="queue_full")
+            raise Overloaded(
+                f"Too many requests waiting for {model_name}, try again later", self.retry_after(model_name)
+            )
+
+    async def acquire(self, model_name, priority=None):
+        """Wait until ``model_name``'s rate limit allows one more call."""
+        lane = self._lane(model_name)
+        if lane.bucket is None:
+            return
+        label = priority or "other"
+        if not lane.waiters and not lane.bucket.take():
+            GEMINI_QUEUE_SECONDS.observe(0, model=model_name, priority=label)
+            return
+        self.check(model_name)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(lane.waiters, (self._rank(priority), next(self._arrivals), future))
+        lane.depth[label] += 1
+        if lane.pump is None or lane.pump.done():
+            lane.pump = asyncio.ensure_future(self._pump(lane))
+        start = time.perf_counter()
+        try:
+            # Cancelling the caller cancels the future, and the pump skips it
+            await future
+        finally:
+            lane.depth[label] -= 1
+            GEMINI_QUEUE_SECONDS.observe(time.perf_counter() - start, model=model_name, priority=label)
+
+    async def _pump(self, lane):
+        """Hand out tokens as the bucket refills, best priority first."""
+        while lane.waiters:
+            if lane.waiters[0][2].done():
+                heapq.heappop(lane.waiters)
+                continue
+            wait = lane.bucket.take()
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+            heapq.heappop(lane.waiters)[2].set_result(None)
+
+    def retry_delay(self, model_name, error, attempt):
+        """Seconds to back off before retrying a call that raised ``error``.
+
+        Returns None for errors that are not worth retrying. Raises
+        ``Overloaded`` once a 429 or 503 has used up its retries.
+        """
+        if not isinstance(error, RETRYABLE):
+            return None
+        lane = self._lane(model_name)
+        if isinstance(error, RATE_LIMITED) and lane.bucket is not None:
+            lane.bucket.drain()
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        if attempt >= self.retries:
+            GEMINI_REJECTED.inc(model=model_name, reason=str(error.code))
+            status_code = 429 if isinstance(error, RATE_LIMITED) else 503
+            raise Overloaded(
+                f"Gemini is not accepting requests for {model_name} right now, try again later",
+                max(1, math.ceil(ceiling)),
+                status_code,
+            ) from error
+        GEMINI_RETRIED.inc(model=model_name, code=error.code)
+        # Full jitter, so callers that failed together do not retry together
+        return self._rng.uniform(0, ceiling)
+
+    def depths(self):
+        """``(model, priority, waiting calls)`` for every queue that has been used."""
+        for model_name, lane in self._lanes.items():
+            for priority, depth in lane.depth.items():
+                yield model_name, priority, depth
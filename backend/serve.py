@@ -0,0 +1,107 @@
+"""Production entry point: several worker processes behind one port.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+Each worker is a separate process with its own event loop, Gemini models,
+call layer, rate limits and in-memory state; the app's lifespan sets these up
+when the worker starts. With more than one worker, the analysis, recipe and
+labeled image caches and the recipe store default to the shared SQLite store
+at ``SHARED_CACHE_PATH``, so a result computed by one worker is served by all of
+them and labeled image URLs work whichever worker answers.
+
+The app is imported once here before any worker starts, so a configuration
+error stops the launch instead of every worker failing on its own. With
+``--server gunicorn`` (gunicorn must be installed) the workers are forked from
+that preloaded process and share its imported code copy-on-write; the default
+``uvicorn`` supervisor starts each worker with a fresh import.
+"""
+import argparse
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Worker processes; WEB_CONCURRENCY is the name uvicorn and gunicorn also read
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+HOST = os.getenv("HOST", "localhost")
+PORT = int(os.getenv("PORT", "8000"))
+# "uvicorn" or "gunicorn"
+SERVER = os.getenv("SERVER", "uvicorn")
+# SQLite file the workers share results through
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", os.path.join(".cache", "results.sqlite3"))
+
+# Caches that must be shared for results and labeled image URLs to be coherent across workers
+SHARED_CACHES = ("ANALYSIS", "RECIPE", "LABELED_IMAGE")
+
+
+def configure_shared_caches(workers, path=SHARED_CACHE_PATH, environ=os.environ):
+    """Point the caches at the shared store when there are several workers.
+
+    Explicit ``<PREFIX>_CACHE_BACKEND`` settings are kept; a per-worker
+    ``memory`` cache with several workers is reported, since each worker then
+    only sees its own results.
+    """
+    if workers < 2:
+        return []
+    warnings = []
+    for prefix in SHARED_CACHES:
+        environ.setdefault(f"{prefix}_CACHE_BACKEND", "disk")
+        environ.setdefault(f"{prefix}_CACHE_PATH", path)
+        if environ[f"{prefix}_CACHE_BACKEND"] == "memory":
+            warnings.append(f"{prefix}_CACHE_BACKEND=memory is private to each of the {workers} workers")
+    # Recipes generated by one worker can then answer requests in all of them
+    environ.setdefault("RECIPE_STORE_BACKEND", "disk")
+    environ.setdefault("RECIPE_STORE_PATH", path)
+    return warnings
+
+
+def preload():
+    """Import the app in this process, so configuration errors fail the launch."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import main
+    return main.app
+
+
+def run_uvicorn(host, port, workers):
+    import uvicorn
+
+    # An import string, so each worker process can import the app itself
+    uvicorn.run("main:app", host=host, port=port, workers=workers, app_dir=BACKEND_DIR)
+
+
+def run_gunicorn(app, host, port, workers):
+    from gunicorn.app.base import BaseApplication
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"{host}:{port}")
+            self.cfg.set("workers", workers)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker")
+            self.cfg.set("preload_app", True)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--server", choices=("uvicorn", "gunicorn"), default=SERVER)
+    args = parser.parse_args(argv)
+
+    for warning in configure_shared_caches(args.workers):
+        print(f"Warning: {warning}")
+    app = preload()
+    if args.server == "gunicorn":
+        run_gunicorn(app, args.host, args.port, args.workers)
+    else:
+        run_uvicorn(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Incremental extraction of JSON objects from a streamed model response."""
+import json
+import re
+
+
+class JsonArrayStreamParser:
+    """Pull complete objects out of ``{"<key>": [ {...}, {...} ]}`` as text arrives.
+
+    Call ``feed`` with each text chunk; it returns the objects whose closing
+    brace arrived in that chunk. Markdown fences or chatter around the JSON are
+    ignored. Objects that fail to parse are skipped.
+
+    The array is only picked up where the document starts: an object opening
+    at the start of a line (after an optional fence) with ``key`` as its first
+    field. Prose that quotes ``"<key>": [`` mid-sentence is skipped, and JSON
+    in any other shape yields nothing, for the caller's full parse to handle.
+    """
+
+    def __init__(self, key="recipes"):
+        self._array_start = re.compile(
+            r'^[ \t]*(?:```[\w-]*[ \t]*\n?[ \t]*)?\{\s*"' + re.escape(key) + r'"\s*:\s*\[', re.MULTILINE
+        )
+        self._buffer = ""
+        self._in_array = False
+        self._done = False
+        # Scanner state inside the array
+        self._pos = 0
+        self._depth = 0
+        self._start = None
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def done(self):
+        return self._done
+
+    def feed(self, text):
+        if self._done:
+            return []
+        self._buffer += text
+        if not self._in_array:
+            match = self._array_start.search(self._buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._buffer = self._buffer[match.end():]
+        return self._scan()
+
+    def _scan(self):
+        objects = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif char == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        objects.append(json.loads(buffer[self._start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    # Drop consumed text so the buffer only holds the object in progress
+                    buffer = buffer[i + 1:]
+                    i = 0
+                    self._start = None
+                    continue
+            elif char == "]" and self._depth == 0:
+                self._done = True
+                buffer = ""
+                i = 0
+                break
+            i += 1
+        self._buffer = buffer
+        self._pos = i
+        return objects
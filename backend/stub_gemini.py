@@ -0,0 +1,117 @@
+"""Offline stand-in for the Gemini models (``GEMINI_BACKEND=stub``).
+
+``StubModel`` has the parts of ``genai.GenerativeModel`` the app uses
+(``generate_content``, ``generate_content_async`` and ``stream=True``) and
+replays recorded responses instead of calling the API: image requests cycle
+through the recorded ``vision`` responses, text requests through the ``text``
+ones. Latency and errors are injected from a seeded random generator, so a
+run with the same settings and request order is reproducible.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+
+GEMINI_STUB_RECORDINGS = os.getenv(
+    "GEMINI_STUB_RECORDINGS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "fixtures", "gemini_recordings.json"),
+)
+# Median seconds per call, and the spread of a log-normal around it (0 = fixed)
+GEMINI_STUB_LATENCY = float(os.getenv("GEMINI_STUB_LATENCY", "0.5"))
+GEMINI_STUB_JITTER = float(os.getenv("GEMINI_STUB_JITTER", "0"))
+# Fraction of calls that fail with a 429 or 503, as the API does under load
+GEMINI_STUB_ERROR_RATE = float(os.getenv("GEMINI_STUB_ERROR_RATE", "0"))
+GEMINI_STUB_SEED = int(os.getenv("GEMINI_STUB_SEED", "0"))
+
+# Pieces a streamed response is split into
+STREAM_CHUNKS = 8
+
+
+def load_recordings(path=GEMINI_STUB_RECORDINGS):
+    """Recorded response texts, as ``{"vision": [...], "text": [...]}``."""
+    with open(path) as f:
+        recordings = json.load(f)
+    if not recordings.get("vision") or not recordings.get("text"):
+        raise ValueError(f"{path} needs at least one 'vision' and one 'text' response")
+    return recordings
+
+
+class StubModel:
+    """Replays recorded responses with configurable latency and injected errors."""
+
+    def __init__(self, model_name, recordings=None, latency=GEMINI_STUB_LATENCY, jitter=GEMINI_STUB_JITTER,
+                 error_rate=GEMINI_STUB_ERROR_RATE, seed=GEMINI_STUB_SEED):
+        # Same form as GenerativeModel.model_name
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.recordings = recordings if recordings is not None else load_recordings()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._positions = {"vision": 0, "text": 0}
+        self._lock = threading.Lock()
+
+    def _plan(self, contents):
+        """Pick the response text, delay and error (if any) for one call."""
+        parts = [contents] if isinstance(contents, str) else list(contents)
+        kind = "text" if all(isinstance(part, str) for part in parts) else "vision"
+        with self._lock:
+            self.calls += 1
+            responses = self.recordings[kind]
+            text = responses[self._positions[kind] % len(responses)]
+            self._positions[kind] += 1
+            delay = self.latency * (self._rng.lognormvariate(0, self.jitter) if self.jitter else 1)
+            error = None
+            if self._rng.random() < self.error_rate:
+                error_type = self._rng.choice((ResourceExhausted, ServiceUnavailable))
+                error = error_type(f"stub: injected {error_type.code} from {self.model_name}")
+        prompt = "".join(part for part in parts if isinstance(part, str))
+        usage = SimpleNamespace(
+            prompt_token_count=len(prompt) // 4,
+            candidates_token_count=len(text) // 4,
+            total_token_count=(len(prompt) + len(text)) // 4,
+        )
+        return text, delay, error, usage
+
+    @staticmethod
+    def _pieces(text):
+        size = max(1, -(-len(text) // STREAM_CHUNKS))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _stream(self, text, delay, usage):
+        pieces = self._pieces(text)
+        for index, piece in enumerate(pieces):
+            time.sleep(delay / len(pieces))
+            yield SimpleNamespace(text=piece, usage_metadata=usage if index == len(pieces) - 1 else None)
+
+    async def _stream_async(self, text, delay, usage):
+        pieces = self._pieces(text)
+        for index, piece in enumerate(pieces):
+            await asyncio.sleep(delay / len(pieces))
+            yield SimpleNamespace(text=piece, usage_metadata=usage if index == len(pieces) - 1 else None)
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        text, delay, error, usage = self._plan(contents)
+        if error is not None:
+            time.sleep(delay)
+            raise error
+        if stream:
+            return self._stream(text, delay, usage)
+        time.sleep(delay)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    async def generate_content_async(self, contents, stream=False, **kwargs):
+        text, delay, error, usage = self._plan(contents)
+        if error is not None:
+            await asyncio.sleep(delay)
+            raise error
+        if stream:
+            return self._stream_async(text, delay, usage)
+        await asyncio.sleep(delay)
+        return SimpleNamespace(text=text, usage_metadata=usage)
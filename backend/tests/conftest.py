@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# test_gemini.py and test_vision.py are scripts that call the live Gemini API
+# at import time; only collect them when a key is available
+collect_ignore = []
+if not os.getenv("GOOGLE_API_KEY"):
+    collect_ignore += ["test_gemini.py", "test_vision.py"]
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """main.py, importable without an API key; ``client`` swaps in the stub models."""
+    with pytest.MonkeyPatch.context() as mp:
+        if not os.getenv("GEMINI_API_KEY"):
+            mp.setenv("GEMINI_API_KEY", "test-stub")
+        import main
+    return main
+
+
+@pytest.fixture
+def client(main_module, monkeypatch):
+    """A TestClient on the app with stub models, fresh in-memory caches and no recipe store."""
+    from fastapi.testclient import TestClient
+
+    from cache import MemoryCache
+    from stub_gemini import StubModel
+
+    models = main_module.models
+    monkeypatch.setattr(models, "text", StubModel(models.text_name, latency=0))
+    monkeypatch.setattr(models, "vision", StubModel(models.vision_name, latency=0))
+    for name in ("analysis_cache", "recipe_cache", "labeled_image_store"):
+        monkeypatch.setattr(main_module, name, MemoryCache())
+    monkeypatch.setattr(main_module, "recipe_store", None)
+    with TestClient(main_module.app) as test_client:
+        yield test_client
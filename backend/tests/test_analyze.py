@@ -0,0 +1,163 @@
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def photo(color=(200, 120, 40)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def analyze(client, data, image="base64", headers=None):
+    return client.post(
+        f"/analyze-image/?image={image}", files={"file": ("fridge.jpg", data, "image/jpeg")}, headers=headers
+    )
+
+
+def test_labeled_image_url_is_served_and_revalidated(client):
+    response = analyze(client, photo(), image="url")
+    assert response.status_code == 200
+    url = response.json()["labeled_image_url"]
+
+    image = client.get(url)
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/jpeg"
+    assert "immutable" in image.headers["cache-control"]
+    etag = image.headers["etag"]
+
+    repeat = client.get(url, headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat.headers["etag"] == etag
+    assert repeat.headers["cache-control"] == image.headers["cache-control"]
+
+    assert client.get(url.rsplit("/", 1)[0] + "/missing").status_code == 404
+
+
+def test_image_none_returns_only_the_lists_and_revalidates(client):
+    response = analyze(client, photo(), image="none")
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"food_items", "ingredients"}
+    assert body["ingredients"][:3] == ["jam", "milk", "cheddar cheese"]
+    assert analyze(client, photo(), image="boxes").json()["boxes"]
+
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    repeat = analyze(client, photo(), image="none", headers={"If-None-Match": etag})
+    assert repeat.status_code == 304
+    assert repeat.content == b""
+    assert repeat.headers["etag"] == etag
+
+    # A different result gets a new body and tag
+    other = analyze(client, photo((10, 200, 90)), image="none", headers={"If-None-Match": etag})
+    assert other.status_code == 200
+    assert other.headers["etag"] != etag
+
+
+def analyze_batch(client, files):
+    return client.post("/analyze-images/?image=none", files=[("files", file) for file in files])
+
+
+def test_batch_reports_rejected_files_per_file(client):
+    response = analyze_batch(client, [
+        ("fridge.jpg", photo(), "image/jpeg"),
+        ("notes.txt", b"eggs, milk", "text/plain"),
+    ])
+    assert response.status_code == 200
+    fridge, notes = response.json()["images"]
+    assert fridge["filename"] == "fridge.jpg"
+    assert fridge["food_items"]
+    assert notes["filename"] == "notes.txt"
+    assert "error" in notes and "food_items" not in notes
+    assert response.json()["food_items"] == fridge["food_items"]
+
+
+def test_batch_of_only_rejected_files_keeps_their_status(client):
+    response = analyze_batch(client, [("notes.txt", b"eggs, milk", "text/plain")])
+    assert response.status_code == 415
+
+
+def test_batch_analyzes_identical_photos_once_and_merges_ingredients(client, main_module, monkeypatch):
+    from stub_gemini import StubModel
+
+    recordings = {
+        "vision": [
+            '{"milk bottle": [0.1, 0.1, 0.5, 0.5], "eggs": [0.5, 0.5, 0.9, 0.9]}',
+            '{"Milk Bottle": [0.1, 0.1, 0.5, 0.5], "yogurt cup": [0.2, 0.2, 0.4, 0.4], "milk": [0, 0, 1, 1]}',
+        ],
+        "text": ['{"recipes": []}'],
+    }
+    vision = StubModel(main_module.models.vision_name, recordings=recordings, latency=0)
+    monkeypatch.setattr(main_module.models, "vision", vision)
+    # One at a time, so the photos get the recordings in upload order
+    monkeypatch.setattr(main_module, "BATCH_MAX_CONCURRENCY", 1)
+
+    fridge, pantry = photo(), photo((10, 200, 90))
+    response = analyze_batch(client, [
+        ("fridge.jpg", fridge, "image/jpeg"),
+        ("pantry.jpg", pantry, "image/jpeg"),
+        ("fridge-again.jpg", fridge, "image/jpeg"),
+    ])
+    assert response.status_code == 200
+    assert vision.calls == 2
+    body = response.json()
+    assert [image["filename"] for image in body["images"]] == ["fridge.jpg", "pantry.jpg", "fridge-again.jpg"]
+    assert body["images"][2]["food_items"] == body["images"][0]["food_items"]
+    # Labels are merged case-insensitively, then canonicalized and de-duplicated
+    assert body["food_items"] == ["milk bottle", "eggs", "yogurt cup", "milk"]
+    assert body["ingredients"] == ["milk", "eggs", "yogurt"]
+
+
+def test_concurrent_uploads_share_a_flight_only_with_the_same_strategy(client, main_module, monkeypatch):
+    import asyncio
+
+    import httpx
+    from cache import MemoryCache
+    from stub_gemini import StubModel
+
+    vision = StubModel(main_module.models.vision_name, latency=0.1)
+    monkeypatch.setattr(main_module.models, "vision", vision)
+    data = photo()
+
+    async def upload_all(strategies):
+        transport = httpx.ASGITransport(app=main_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*(
+                http.post(f"/analyze-image/?image=none&fallback={strategy}",
+                          files={"file": ("fridge.jpg", data, "image/jpeg")})
+                for strategy in strategies
+            ))
+
+    responses = asyncio.run(upload_all(["serial", "serial", "serial"]))
+    assert [response.status_code for response in responses] == [200] * 3
+    assert vision.calls == 1
+
+    monkeypatch.setattr(main_module, "analysis_cache", MemoryCache())
+    responses = asyncio.run(upload_all(["serial", "race"]))
+    assert [response.status_code for response in responses] == [200] * 2
+    assert vision.calls == 3
+
+
+def test_labeled_image_follows_the_detection(client, main_module, monkeypatch):
+    from stub_gemini import StubModel
+
+    recordings = {
+        "vision": ['{"eggs": [0.1, 0.1, 0.5, 0.5]}', '{"eggs": [0.1, 0.1, 0.5, 0.5], "milk": [0.5, 0.5, 0.9, 0.9]}'],
+        "text": ['{"recipes": []}'],
+    }
+    monkeypatch.setattr(main_module.models, "vision", StubModel(main_module.models.vision_name, recordings=recordings, latency=0))
+    # Nothing cached, so the same photo is detected again and finds more
+    monkeypatch.setattr(main_module, "analysis_cache", None)
+
+    first = analyze(client, photo(), image="url").json()
+    second = analyze(client, photo(), image="url").json()
+    assert first["food_items"] == ["eggs"]
+    assert second["food_items"] == ["eggs", "milk"]
+    assert first["labeled_image_url"] != second["labeled_image_url"]
+    assert client.get(first["labeled_image_url"]).content != client.get(second["labeled_image_url"]).content
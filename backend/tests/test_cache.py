@@ -0,0 +1,90 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import DiskCache, MemoryCache, content_key
+
+
+def test_content_key_is_stable_and_part_aware():
+    assert content_key("a", b"bc") == content_key("a", b"bc")
+    assert content_key("ab", "c") != content_key("a", "bc")
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache(max_entries=2, ttl=-1)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = DiskCache(path, max_entries=2, ttl=60)
+    reader = DiskCache(path, max_entries=2, ttl=60)
+    writer.set("a", {"food_items": ["milk"]})
+    assert reader.get("a") == {"food_items": ["milk"]}
+    writer.set("b", 2)
+    writer.set("c", 3)
+    assert len(reader) == 2
+    assert writer.stats()["evictions"] == 1
+
+
+def test_single_flight_shares_one_call():
+    import asyncio
+
+    from cache import SingleFlight
+
+    flights = SingleFlight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"recipes": []}
+
+    async def burst():
+        return await asyncio.gather(*(flights.run("key", compute) for _ in range(10)))
+
+    results = asyncio.run(burst())
+    assert len(calls) == 1
+    assert all(result == {"recipes": []} for result in results)
+    assert flights.stats() == {"in_flight": 0, "deduplicated": 9}
+
+
+def test_disk_cache_round_trips_bytes(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=2, ttl=60)
+    cache.set("image", b"\xff\xd8\xff\x00")
+    assert cache.get("image") == b"\xff\xd8\xff\x00"
+
+
+def test_disk_cache_reconnects_in_a_forked_child(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.sqlite3"), max_entries=4, ttl=60)
+    cache.set("parent", {"from": "parent"})
+    pid = os.fork()
+    if pid == 0:
+        try:
+            ok = cache.get("parent") == {"from": "parent"}
+            cache.set("child", {"from": "child"})
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert cache.get("child") == {"from": "child"}
+    cache.close()
+    assert cache.get("parent") == {"from": "parent"}
@@ -0,0 +1,24 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from canonical import canonical_recipe_request, recipe_request_key
+
+
+def test_ordering_casing_and_whitespace_do_not_change_the_key():
+    first = recipe_request_key(["Eggs", " milk"], {"allergies": ["Peanuts", "dairy"], "mealType": "Dinner"})
+    second = recipe_request_key("milk,  EGGS", {"allergies": ["dairy", "peanuts "], "mealType": " dinner"})
+    assert first == second
+
+
+def test_missing_and_empty_preferences_are_equivalent():
+    assert recipe_request_key(["eggs"], None) == recipe_request_key(["eggs"], {"allergies": [], "prepTime": ""})
+
+
+def test_different_preferences_change_the_key():
+    assert recipe_request_key(["eggs"], {"mealType": "breakfast"}) != recipe_request_key(["eggs"], {"mealType": "dinner"})
+
+
+def test_canonical_form_deduplicates():
+    assert canonical_recipe_request(["Milk", "milk", "  "], {})["ingredients"] == ["milk"]
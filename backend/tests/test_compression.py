@@ -0,0 +1,77 @@
+import asyncio
+import gzip
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import CompressionMiddleware, accepted_encodings, available_encodings
+from etags import etag_matches, make_etag
+
+
+def response_app(body, content_type=b"application/json", chunks=1):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", content_type), (b"content-length", str(len(body)).encode()),
+        ]})
+        size = -(-len(body) // chunks)
+        for index in range(chunks):
+            more = index < chunks - 1
+            await send({"type": "http.response.body", "body": body[index * size:(index + 1) * size], "more_body": more})
+    return app
+
+
+def call(app, accept_encoding="gzip"):
+    scope = {"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    headers = dict(messages[0]["headers"])
+    return headers, b"".join(message.get("body", b"") for message in messages[1:])
+
+
+BODY = b'{"recipes": [' + b'{"title": "Scrambled Eggs", "ingredients": ["eggs", "milk"]},' * 50 + b"{}]}"
+
+
+def test_compresses_one_piece_responses_the_client_accepts():
+    headers, body = call(CompressionMiddleware(response_app(BODY), encodings=["gzip"]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert int(headers[b"content-length"]) == len(body) < len(BODY)
+    assert gzip.decompress(body) == BODY
+    assert b"Accept-Encoding" in headers[b"vary"]
+
+
+def test_leaves_small_streamed_image_and_unaccepted_responses_alone():
+    cases = [
+        (response_app(b'{"ok": true}'), "gzip"),
+        (response_app(BODY, chunks=3), "gzip"),
+        (response_app(BODY, content_type=b"application/x-ndjson"), "gzip"),
+        (response_app(BODY, content_type=b"image/jpeg"), "gzip"),
+        (response_app(BODY), "br, gzip;q=0"),
+    ]
+    for app, accept_encoding in cases:
+        headers, body = call(CompressionMiddleware(app, encodings=["gzip"], min_size=1024), accept_encoding)
+        assert b"content-encoding" not in headers
+        assert body in (BODY, b'{"ok": true}')
+
+
+def test_negotiation():
+    assert accepted_encodings("gzip, deflate, br;q=0.5, zstd;q=0") == {"gzip", "deflate", "br"}
+    assert available_encodings("gzip, none") == ["gzip"]
+    assert available_encodings("none") == []
+
+
+def test_etags():
+    etag = make_etag(b'{"recipes": []}')
+    assert etag.startswith('W/"')
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", {etag.removeprefix("W/")}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag(b'{"recipes": [1]}'), etag)
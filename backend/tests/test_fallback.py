@@ -0,0 +1,72 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fallback import FallbackRunner
+
+
+def model(delay, result=None, error=None):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return result
+
+    call.calls = calls
+    return call
+
+
+def run(runner, primary, backup, strategy=None):
+    return asyncio.run(runner.run(
+        [("pro", primary, 1.0), ("flash", backup, 1.0)],
+        usable=bool,
+        strategy=strategy,
+    ))
+
+
+def test_serial_only_calls_fallback_when_primary_is_unusable():
+    runner = FallbackRunner(strategy="serial")
+    backup = model(0, "flash")
+    assert run(runner, model(0, "pro"), backup) == "pro"
+    assert not backup.calls
+    assert run(runner, model(0, ""), backup) == "flash"
+    assert run(runner, model(0, error=RuntimeError("503")), backup) == "flash"
+
+
+def test_hedged_starts_fallback_after_delay_and_takes_first_usable():
+    runner = FallbackRunner(strategy="hedged", hedge_delay=0.01)
+    assert run(runner, model(0.5, "pro"), model(0.01, "flash")) == "flash"
+    stats = runner.stats.snapshot()["models"]
+    assert stats["flash"]["wins"] == 1
+    assert stats["pro"]["cancelled"] == 1
+
+
+def test_race_waits_for_a_usable_result():
+    runner = FallbackRunner(strategy="race")
+    assert run(runner, model(0.05, "pro"), model(0, "")) == "pro"
+
+
+def test_timeouts_fall_back_and_errors_propagate_when_everything_fails():
+    runner = FallbackRunner(strategy="serial")
+    result = asyncio.run(runner.run([("pro", model(1, "pro"), 0.01), ("flash", model(0, "flash"), 1)], usable=bool))
+    assert result == "flash"
+    assert runner.stats.snapshot()["models"]["pro"]["timeouts"] == 1
+    with pytest.raises(RuntimeError):
+        run(runner, model(0, error=RuntimeError("a")), model(0, error=RuntimeError("b")))
+
+
+def test_failed_attempts_are_logged_with_their_traceback(caplog, capsys):
+    runner = FallbackRunner(strategy="serial")
+    with caplog.at_level("WARNING", logger="fallback"):
+        assert run(runner, model(0, error=RuntimeError("503")), model(0, "flash")) == "flash"
+    [record] = caplog.records
+    assert "pro" in record.getMessage() and "503" in record.getMessage()
+    assert record.exc_info[0] is RuntimeError
+    assert capsys.readouterr().out == ""
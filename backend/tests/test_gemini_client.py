@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import ModelClient
+from scheduler import Scheduler
+
+
+class BlockingModel:
+    """A model whose ``generate_content`` blocks like the SDK's, counting calls running at once."""
+
+    model_name = "models/blocking"
+
+    def __init__(self, latency=0.05, chunks=100):
+        self.latency = latency
+        self.chunks = chunks
+        self.running = 0
+        self.max_running = 0
+        self.streamed = 0
+        self.stream_closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        if stream:
+            return self._stream()
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.latency)
+        with self._lock:
+            self.running -= 1
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+    def _stream(self):
+        try:
+            for _ in range(self.chunks):
+                time.sleep(self.latency / self.chunks)
+                self.streamed += 1
+                yield SimpleNamespace(text="chunk", usage_metadata=None)
+        finally:
+            self.stream_closed.set()
+
+
+def make_client(max_concurrency=4):
+    return ModelClient(max_concurrency=max_concurrency, scheduler=Scheduler(rpm="0"))
+
+
+def test_blocking_calls_do_not_block_the_event_loop():
+    client = make_client()
+    model = BlockingModel(latency=0.2)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        response = await client.generate_content(model, "prompt")
+        task.cancel()
+        return response, ticks
+
+    response, ticks = asyncio.run(run())
+    assert response.text == "ok"
+    # The loop kept running other work for most of the call
+    assert ticks >= 10
+
+
+def test_concurrency_is_capped_at_max_concurrency():
+    client = make_client(max_concurrency=2)
+    model = BlockingModel(latency=0.05)
+
+    async def run():
+        return await asyncio.gather(*(client.generate_content(model, "prompt") for _ in range(6)))
+
+    start = time.perf_counter()
+    assert [response.text for response in asyncio.run(run())] == ["ok"] * 6
+    assert model.max_running == 2
+    assert client.in_flight == 0
+    # Three rounds of two calls
+    assert time.perf_counter() - start >= 0.15
+
+
+def test_a_cancelled_stream_stops_the_pump_thread():
+    client = make_client()
+    model = BlockingModel(latency=2, chunks=100)
+
+    async def run():
+        received = []
+
+        async def consume():
+            async for text in client.stream_content(model, "prompt"):
+                received.append(text)
+
+        task = asyncio.ensure_future(consume())
+        while len(received) < 2:
+            await asyncio.sleep(0.005)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return received
+
+    start = time.perf_counter()
+    received = asyncio.run(run())
+    assert len(received) >= 2
+    # The pump stopped pulling chunks and closed the SDK stream instead of running it to the end
+    assert model.stream_closed.wait(1)
+    assert model.streamed < model.chunks
+    assert time.perf_counter() - start < 1
+    assert client.in_flight == 0
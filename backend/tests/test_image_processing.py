@@ -0,0 +1,46 @@
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import prepare_image
+
+
+def encode(image, **save_kwargs):
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", **save_kwargs)
+    return buffer.getvalue()
+
+
+def test_large_images_are_downscaled_keeping_aspect_ratio():
+    contents = encode(Image.new("RGB", (4000, 3000), "white"))
+    prepared = prepare_image(contents, "image/jpeg", max_edge=1000)
+    assert prepared.original_size == (4000, 3000)
+    assert prepared.size == (1000, 750)
+    assert prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).size == (1000, 750)
+
+
+def test_exif_orientation_is_applied():
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 degrees clockwise
+    contents = encode(Image.new("RGB", (400, 200), "white"), exif=exif)
+    prepared = prepare_image(contents, "image/jpeg", max_edge=1000)
+    assert prepared.size == (200, 400)
+
+
+def test_small_upright_jpeg_is_sent_unchanged():
+    contents = encode(Image.new("RGB", (300, 200), "white"))
+    prepared = prepare_image(contents, "image/jpeg", max_edge=1000)
+    assert prepared.data == contents
+
+
+def test_png_with_alpha_is_reencoded_as_jpeg():
+    buffer = io.BytesIO()
+    Image.new("RGBA", (300, 200)).save(buffer, format="PNG")
+    prepared = prepare_image(buffer.getvalue(), "image/png", max_edge=1000)
+    assert prepared.mime_type == "image/jpeg"
+    assert Image.open(io.BytesIO(prepared.data)).format == "JPEG"
@@ -0,0 +1,132 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingredients import INGREDIENT_ALIASES_PATH, IngredientIndex, ingredient_index, singular
+
+
+def test_canonicalizes_recorded_labels():
+    labels = [
+        "strawberry jam jar", "milk bottle", "cheddar cheese", "eggs", "spinach",
+        "butter", "yogurt cup", "carrots", "orange juice carton", "bread loaf", "tomatoes",
+    ]
+    assert [ingredient_index.canonicalize(label) for label in labels] == [
+        "jam", "milk", "cheddar cheese", "eggs", "spinach",
+        "butter", "yogurt", "carrots", "orange juice", "bread", "tomatoes",
+    ]
+
+
+def test_cleans_case_numbers_punctuation_and_packaging():
+    assert ingredient_index.canonicalize("2% Milk Carton") == "milk"
+    assert ingredient_index.canonicalize("  Eggs (dozen) ") == "eggs"
+    assert ingredient_index.canonicalize("jar") is None
+    assert ingredient_index.canonicalize("") is None
+
+
+def test_only_whole_names_are_renamed():
+    assert ingredient_index.canonicalize("peanut butter jar") == "peanut butter"
+    assert ingredient_index.canonicalize("jalapeño peppers") == "chili peppers"
+    assert ingredient_index.canonicalize("2 tbsp Soy Sauce") == "soy sauce"
+
+
+@pytest.mark.parametrize("label", [
+    "ice cream", "bean sprouts", "lemon juice", "rice vinegar", "chicken broth", "egg noodles",
+])
+def test_unknown_modifiers_are_kept(label):
+    assert ingredient_index.canonicalize(f"{label} carton") == label
+
+
+def test_unknown_labels_are_kept_as_cleaned():
+    assert ingredient_index.canonicalize("Kimchi JAR") == "kimchi"
+
+
+def test_canonicalize_all_drops_duplicates_in_order():
+    labels = ["yogurt cup", "eggs", "yogurt cup", "egg carton", "jar"]
+    assert ingredient_index.canonicalize_all(labels) == ["yogurt", "eggs"]
+
+
+def test_prepare_drops_allergy_groups_and_avoided_ingredients():
+    kept, removed = ingredient_index.prepare(
+        ["strawberry jam jar", "milk bottle", "cheddar cheese", "eggs", "spinach", "mushrooms"],
+        {"allergies": ["Dairy"], "avoidIngredients": ["mushroom"]},
+    )
+    assert kept == ["jam", "eggs", "spinach"]
+    assert removed == ["milk bottle", "cheddar cheese", "mushrooms"]
+
+
+def test_prepare_drops_labels_that_mention_an_allergen():
+    kept, removed = ingredient_index.prepare(["peanut sauce", "rice"], {"allergies": ["peanuts"]})
+    assert kept == ["rice"]
+    assert removed == ["peanut sauce"]
+
+
+def test_every_phrase_in_a_label_is_mentioned():
+    assert ingredient_index.lookup("2 cups chicken broth") == ("chicken broth", frozenset({"chicken", "broth"}))
+    assert ingredient_index.lookup("ice cream")[1] == {"ice cream", "heavy cream"}
+    kept, removed = ingredient_index.prepare(["chicken broth", "egg noodles", "rice"], {"avoidIngredients": ["chicken"]})
+    assert kept == ["egg noodles", "rice"]
+    assert removed == ["chicken broth"]
+
+
+def test_unknown_terms_drop_labels_containing_their_words():
+    kept, removed = ingredient_index.prepare(["spicy kimchi jar", "sesame oil", "rice"], {
+        "allergies": ["sesame"], "avoidIngredients": ["Kimchi"],
+    })
+    assert kept == ["rice"]
+    assert removed == ["spicy kimchi jar", "sesame oil"]
+
+
+def test_distinct_names_do_not_mention_their_parts():
+    assert ingredient_index.lookup("peanut butter jar") == ("peanut butter", frozenset({"peanut butter", "peanuts"}))
+    kept, _ = ingredient_index.prepare(["peanut butter", "coconut milk", "chicken eggs", "milk"], {
+        "allergies": ["dairy"], "avoidIngredients": ["chicken"],
+    })
+    assert kept == ["peanut butter", "coconut milk", "eggs"]
+
+
+@pytest.mark.parametrize("allergy, labels", [
+    ("dairy", ["milk bottle", "cheddar cheese", "ice cream", "sour cream", "butter"]),
+    ("eggs", ["egg carton", "mayo", "egg noodles"]),
+    ("gluten", ["bread loaf", "spaghetti", "ramen", "egg noodles", "flour tortilla", "soy sauce"]),
+    ("peanuts", ["peanut butter", "peanut sauce"]),
+    ("tree nuts", ["almond milk", "walnuts", "cashew"]),
+    ("soy", ["tofu", "soy milk", "tamari"]),
+    ("shellfish", ["shrimp", "crab fried rice", "lobster tail", "clams", "mussels", "scallops", "oyster sauce"]),
+    ("fish", ["salmon fillet", "canned tuna", "anchovies", "fish sauce", "white fish", "sardines"]),
+    ("seafood", ["crab", "anchovy", "prawns"]),
+    ("meat", ["chicken broth", "2 cups chicken broth", "ground beef", "bacon strips", "lamb chops", "sausage"]),
+])
+def test_allergy_groups_remove_every_member_and_dish(allergy, labels):
+    kept, removed = ingredient_index.prepare([*labels, "spinach"], {"allergies": [allergy]})
+    assert kept == ["spinach"]
+    assert removed == labels
+
+
+def test_prepare_accepts_comma_separated_strings():
+    kept, removed = ingredient_index.prepare("eggs, milk bottle, oat milk", {"allergies": "dairy"})
+    assert kept == ["eggs", "oat milk"]
+    assert removed == ["milk bottle"]
+
+
+def test_alias_table_is_consistent():
+    with open(INGREDIENT_ALIASES_PATH, encoding="utf-8") as f:
+        table = json.load(f)
+    index = IngredientIndex.from_file()
+    # Every name resolves to its own entry, so no alias shadows another ingredient
+    for canonical, aliases in table["ingredients"].items():
+        for name in (canonical, *aliases):
+            assert index.canonicalize(name) == canonical, name
+    for group, members in table["groups"].items():
+        assert set(members) <= set(table["ingredients"]), group
+    for canonical, parts in table["distinct"].items():
+        assert {canonical, *parts} <= set(table["ingredients"]), canonical
+
+
+def test_singular():
+    assert [singular(word) for word in ("berries", "tomatoes", "peaches", "eggs", "hummus", "asparagus", "peas")] == [
+        "berry", "tomato", "peach", "egg", "hummus", "asparagus", "pea",
+    ]
@@ -0,0 +1,225 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jobs import JobFailed, JobManager
+from scheduler import Overloaded
+
+
+async def two_stages(job):
+    for stage in ("first", "second"):
+        job.begin_stage(stage)
+        await asyncio.sleep(job.payload.get("delay", 0))
+        job.finish_stage(stage, {"stage": stage})
+    if job.payload.get("fail"):
+        raise JobFailed("No ingredients left", status_code=400)
+
+
+async def settle(job):
+    await asyncio.wait([job.task])
+    return job
+
+
+def test_runs_stages_and_records_results_and_events():
+    async def run():
+        manager = JobManager(two_stages)
+        job = manager.submit({})
+        assert job.status == "queued"
+        return await settle(job), manager
+
+    job, manager = asyncio.run(run())
+    assert job.status == "succeeded"
+    assert job.results == {"first": {"stage": "first"}, "second": {"stage": "second"}}
+    assert job.payload is None
+    assert [(event["type"], event["status"] if event["type"] == "status" else event["stage"]) for event in job.events] == [
+        ("status", "queued"), ("status", "running"), ("status", "running"), ("stage", "first"),
+        ("status", "running"), ("stage", "second"), ("status", "succeeded"),
+    ]
+    assert [event["id"] for event in job.events] == list(range(1, 8))
+    assert manager.stats()["completed"]["succeeded"] == 1
+
+
+def test_failures_carry_their_status_code():
+    async def run():
+        return await settle(JobManager(two_stages).submit({"fail": True}))
+
+    job = asyncio.run(run())
+    assert job.status == "failed"
+    assert job.error == "No ingredients left"
+    assert job.events[-1]["status_code"] == 400
+    assert "second" in job.results
+
+
+def test_concurrency_and_queue_limits():
+    async def run():
+        manager = JobManager(two_stages, concurrency=2, queue_max=3)
+        jobs = [manager.submit({"delay": 0.05}) for _ in range(3)]
+        with pytest.raises(Overloaded):
+            manager.submit({})
+        await asyncio.sleep(0.02)
+        statuses = [job.status for job in jobs]
+        await asyncio.wait([job.task for job in jobs])
+        return manager, statuses
+
+    manager, statuses = asyncio.run(run())
+    assert statuses == ["running", "running", "queued"]
+    assert manager.rejected == 1
+    assert manager.stats()["completed"]["succeeded"] == 3
+
+
+def test_cancels_queued_and_running_jobs():
+    async def run():
+        manager = JobManager(two_stages, concurrency=1)
+        running = manager.submit({"delay": 10})
+        queued = manager.submit({})
+        never_started = manager.submit({})
+        # Cancelled before its task ever ran
+        manager.cancel(never_started.id)
+        await asyncio.sleep(0.01)
+        manager.cancel(running.id)
+        manager.cancel(queued.id)
+        await asyncio.wait([running.task, queued.task, never_started.task])
+        return running, queued, never_started
+
+    for job in asyncio.run(run()):
+        assert job.status == "cancelled"
+        assert job.events[-1]["status"] == "cancelled"
+
+
+def test_followers_get_events_as_they_happen_and_resume_after_an_id():
+    async def run():
+        manager = JobManager(two_stages)
+        job = manager.submit({"delay": 0.01})
+        live = [event async for event in job.follow()]
+        resumed = [event async for event in job.follow(after=5)]
+        return job, live, resumed
+
+    job, live, resumed = asyncio.run(run())
+    assert live == job.events
+    assert resumed == job.events[5:]
+
+
+def test_follow_sends_keepalives_while_idle():
+    async def run():
+        job = JobManager(two_stages).submit({"delay": 0.1})
+        events = []
+        async for event in job.follow(keepalive=0.02):
+            events.append(event)
+        return events
+
+    assert None in asyncio.run(run())
+
+
+def test_finished_jobs_expire_after_ttl_or_beyond_the_retention_limit():
+    async def run():
+        manager = JobManager(two_stages, retain_max=2, ttl=60)
+        jobs = [await settle(manager.submit({})) for _ in range(3)]
+        manager.expire()
+        kept = set(manager.jobs)
+        jobs[1].finished_at = time.time() - 120
+        return jobs, kept, manager.get(jobs[1].id), manager.get(jobs[2].id)
+
+    jobs, kept, expired, recent = asyncio.run(run())
+    assert kept == {jobs[1].id, jobs[2].id}
+    assert expired is None
+    assert recent is jobs[2]
+
+
+def photo():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), (200, 120, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def submit(client, preferences=None, image="boxes"):
+    return client.post(
+        f"/jobs/?image={image}",
+        files={"file": ("fridge.jpg", photo(), "image/jpeg")},
+        data={"preferences": json.dumps(preferences)} if preferences is not None else None,
+    )
+
+
+def wait_until_finished(client, url, timeout=5):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(url).json()
+        if job["status"] in ("succeeded", "failed", "cancelled") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.01)
+
+
+def server_sent_events(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_job_runs_the_pipeline_over_http(client):
+    response = submit(client, {"allergies": ["dairy"]}, image="url")
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    location = response.headers["location"]
+    assert location.endswith(f"/jobs/{response.json()['id']}")
+
+    job = wait_until_finished(client, location)
+    assert job["status"] == "succeeded"
+    assert job["results"]["ingredients"]["removed"] == ["milk bottle", "cheddar cheese"]
+    assert "milk" not in job["results"]["ingredients"]["ingredients"]
+    assert job["results"]["recipes"]["recipes"]
+    # The labeled image link was built from the submitting request's base URL
+    assert client.get(job["results"]["analysis"]["labeled_image_url"]).status_code == 200
+
+
+def test_job_events_stream_and_resume(client):
+    location = submit(client).headers["location"]
+    wait_until_finished(client, location)
+
+    response = client.get(f"{location}/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = server_sent_events(response.text)
+    assert [event_id for event_id, _, _ in events] == [str(index) for index in range(1, len(events) + 1)]
+    assert [data["stage"] for _, kind, data in events if kind == "stage"] == ["analysis", "ingredients", "recipes"]
+    _, kind, data = events[-1]
+    assert (kind, data["status"]) == ("status", "succeeded")
+
+    resumed = server_sent_events(client.get(f"{location}/events", headers={"Last-Event-ID": "3"}).text)
+    assert resumed == events[3:]
+
+
+def test_delete_cancels_a_running_job(client, main_module, monkeypatch):
+    from stub_gemini import StubModel
+
+    monkeypatch.setattr(main_module.models, "vision", StubModel(main_module.models.vision_name, latency=1))
+    location = submit(client).headers["location"]
+    response = client.delete(location)
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    assert client.get(location).json()["status"] == "cancelled"
+
+
+def test_unknown_jobs_are_404(client):
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.get("/jobs/missing/events").status_code == 404
+    assert client.delete("/jobs/missing").status_code == 404
+
+
+def test_full_queue_turns_jobs_away(client, main_module, monkeypatch):
+    from stub_gemini import StubModel
+
+    monkeypatch.setattr(main_module.models, "vision", StubModel(main_module.models.vision_name, latency=1))
+    monkeypatch.setattr(main_module, "job_manager", JobManager(main_module.run_job, concurrency=1, queue_max=1))
+    location = submit(client).headers["location"]
+    response = submit(client)
+    assert response.status_code == 429
+    assert int(response.headers["retry-after"]) >= 1
+    assert client.delete(location).json()["status"] == "cancelled"
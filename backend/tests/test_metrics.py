@@ -0,0 +1,71 @@
+import asyncio
+import os
+import sys
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import REQUEST_SECONDS, Registry, RequestTimings, TimingMiddleware, span
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, stage="parse")
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'latency_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="parse"} 3' in text
+
+
+def test_collected_samples_are_grouped_per_metric():
+    registry = Registry()
+    registry.add_collector(lambda: [
+        ("hits_total", "counter", "Hits", {"cache": "a"}, 1),
+        ("size", "gauge", "Size", {"cache": "a"}, 2),
+        ("hits_total", "counter", "Hits", {"cache": "b"}, 3),
+    ])
+    lines = registry.render().splitlines()
+    assert lines.count("# TYPE hits_total counter") == 1
+    assert lines.index('hits_total{cache="b"} 3') == lines.index('hits_total{cache="a"} 1') + 1
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("calls_total", "Calls", ["model"]).inc(model='say "hi"\n')
+    assert 'calls_total{model="say \\"hi\\"\\n"} 1' in registry.render()
+
+
+def test_repeated_spans_are_summed_in_the_header():
+    timings = RequestTimings()
+    timings.add("gemini", 0.25, "pro")
+    timings.add("gemini", 0.5, "pro")
+    timings.add("parse", 0.001)
+    header = timings.header()
+    assert 'gemini;desc="pro";dur=750.0' in header
+    assert "parse;dur=1.0" in header
+    assert "total;dur=" in header
+
+
+def test_middleware_adds_server_timing_and_times_the_route():
+    async def endpoint(request):
+        with span("render"):
+            await asyncio.sleep(0.01)
+        return PlainTextResponse("ok")
+
+    app = TimingMiddleware(Starlette(routes=[Route("/items/{item_id}", endpoint)]), server_timing=True)
+
+    async def request():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await client.get("/items/42")
+
+    response = asyncio.run(request())
+    assert response.headers["server-timing"].startswith("render;dur=")
+    assert response.headers["timing-allow-origin"] == "*"
+    assert any(key[1] == "/items/{item_id}" for key in REQUEST_SECONDS._values)
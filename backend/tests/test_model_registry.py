@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import ModelRegistry
+
+
+def test_models_share_generation_config_and_safety_settings():
+    registry = ModelRegistry("text-model", "vision-model", generation_config={"temperature": 0.2},
+                             safety_settings="BLOCK_ONLY_HIGH", backend="live")
+    assert registry.text.model_name == "models/text-model"
+    assert registry.vision.model_name == "models/vision-model"
+    assert registry.generation_config == {"temperature": 0.2}
+    assert registry.safety_settings == "BLOCK_ONLY_HIGH"
+
+    # Both models are built from the same settings
+    built = []
+    ModelRegistry("text-model", "vision-model", generation_config={"temperature": 0.2},
+                  safety_settings="BLOCK_ONLY_HIGH", backend=lambda *args: built.append(args))
+    assert built == [
+        ("text-model", {"temperature": 0.2}, "BLOCK_ONLY_HIGH"),
+        ("vision-model", {"temperature": 0.2}, "BLOCK_ONLY_HIGH"),
+    ]
+
+
+def test_models_are_rebuilt_once_in_a_new_process():
+    built = []
+    registry = ModelRegistry("text-model", "vision-model", backend=lambda name, *_: built.append(name) or name)
+    assert not registry.rebuild_after_fork()
+    registry.pid = -1
+    assert registry.rebuild_after_fork()
+    assert not registry.rebuild_after_fork()
+    assert built == ["text-model", "vision-model"] * 2
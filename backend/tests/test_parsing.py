@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import (
+    DetectionList,
+    ModelOutputError,
+    RecipeList,
+    extract_json,
+    parse_detected_items,
+    parse_recipes,
+    response_schema,
+    validate_recipe,
+)
+
+with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "model_outputs.json")) as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("case", CORPUS["detections"], ids=lambda case: case["name"])
+def test_detection_corpus(case):
+    food_items, items_with_boxes = parse_detected_items(case["text"])
+    assert food_items == case["food_items"]
+    assert len(items_with_boxes) == case.get("boxes", len(case["food_items"]))
+    assert all(len(box) == 4 for _, box in items_with_boxes)
+
+
+@pytest.mark.parametrize("case", CORPUS["recipes"], ids=lambda case: case["name"])
+def test_recipe_corpus(case):
+    if case["titles"] is None:
+        with pytest.raises(ModelOutputError):
+            parse_recipes(case["text"])
+        return
+    recipes = parse_recipes(case["text"])["recipes"]
+    assert [recipe["title"] for recipe in recipes] == case["titles"]
+    if "prep_time" in case:
+        assert recipes[0]["prep_time"] == case["prep_time"]
+
+
+def test_extract_json_ignores_brackets_inside_strings():
+    assert extract_json('note: {"a": "}]{[", "b": [1, 2]} trailing }') == {"a": "}]{[", "b": [1, 2]}
+
+
+def test_trailing_comma_repair_leaves_strings_alone():
+    assert extract_json('{"a": "x,]", "b": [1,],}') == {"a": "x,]", "b": [1]}
+
+
+def test_validate_recipe_keeps_extra_fields_and_drops_missing_ones():
+    recipe = validate_recipe({"title": "T", "ingredients": ["a"], "instructions": ["b"], "cuisine": "Thai"})
+    assert recipe == {"title": "T", "ingredients": ["a"], "instructions": ["b"], "cuisine": "Thai"}
+    assert validate_recipe({"title": "T"}) is None
+
+
+def test_extract_json_is_linear_on_unbalanced_input():
+    # The old greedy regex backtracked on this; the scan gives up after MAX_CANDIDATES starts
+    with pytest.raises(ModelOutputError):
+        extract_json("{" * 50_000)
+    with pytest.raises(ModelOutputError):
+        extract_json("[" * 50_000)
+
+
+def test_response_schema_uses_the_gemini_subset():
+    recipe = response_schema(RecipeList)["properties"]["recipes"]["items"]
+    assert recipe["required"] == ["title", "ingredients", "instructions"]
+    assert recipe["properties"]["prep_time"] == {"type": "string", "nullable": True}
+    assert recipe["properties"]["servings"] == {"type": "integer", "nullable": True}
+    box = response_schema(DetectionList)["properties"]["items"]["items"]["properties"]["box"]
+    assert box["min_items"] == box["max_items"] == 4
+    assert "$defs" not in json.dumps(response_schema(RecipeList))
+
+
+def test_schema_mode_output_parses():
+    text = json.dumps({"items": [{"name": "milk", "box": [0.1, 0.2, 0.3, 0.4]}]})
+    assert parse_detected_items(text) == (["milk"], [("milk", [0.1, 0.2, 0.3, 0.4])])
+
+
+def mutations(text, rng):
+    yield text[:rng.randrange(len(text) + 1)]
+    index = rng.randrange(len(text))
+    yield text[:index] + text[index + 1:]
+    yield text[:index] + rng.choice('{}[]",:\\`') + text[index:]
+    yield text.replace(",", ",,", 1)
+    yield "```json\n" + text
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_fuzzed_outputs_never_raise_unexpected_errors(seed):
+    rng = random.Random(seed)
+    for case in CORPUS["detections"] + CORPUS["recipes"]:
+        if not case["text"]:
+            continue
+        for text in mutations(case["text"], rng):
+            food_items, items_with_boxes = parse_detected_items(text)
+            assert len(set(food_items)) == len(food_items)
+            try:
+                recipes = parse_recipes(text)["recipes"]
+            except ModelOutputError:
+                continue
+            assert all(isinstance(recipe["title"], str) for recipe in recipes)
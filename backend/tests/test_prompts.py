@@ -0,0 +1,34 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompts import RECIPE_FORMAT_INSTRUCTIONS, build_recipe_prompt
+
+
+def test_constraints_follow_the_preference_order():
+    prompt = build_recipe_prompt(
+        ["eggs", "milk"],
+        {"avoidIngredients": ["cilantro"], "allergies": ["peanuts", "shellfish"], "mealType": "breakfast"},
+    )
+    assert "ingredients listed: eggs, milk." in prompt
+    assert ("DO NOT include these allergens: peanuts, shellfish. The recipe should be for a breakfast. "
+            "DO NOT use these ingredients: cilantro.") in prompt
+
+
+def test_empty_preferences_add_no_constraints():
+    prompt = build_recipe_prompt(["eggs"], {"allergies": [], "mealType": None})
+    assert "DO NOT" not in prompt.replace(RECIPE_FORMAT_INSTRUCTIONS, "")
+
+
+def test_string_preferences_are_not_split_into_characters():
+    assert "allergens: peanuts." in build_recipe_prompt(["eggs"], {"allergies": "peanuts"})
+
+
+def test_numeric_preferences_are_formatted_as_text():
+    assert "preparation time should be around 30." in build_recipe_prompt(["eggs"], {"prepTime": 30})
+
+
+def test_structured_prompt_leaves_out_the_format():
+    assert build_recipe_prompt(["eggs"], {}).endswith(RECIPE_FORMAT_INSTRUCTIONS)
+    assert '"recipes"' not in build_recipe_prompt(["eggs"], {}, structured=True)
@@ -0,0 +1,112 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recipe_store import RecipeStore
+
+
+def recipe(title, *ingredients):
+    return {"title": title, "ingredients": list(ingredients), "instructions": ["Cook"]}
+
+
+BREAKFAST = [
+    recipe("Scrambled Eggs", "3 eggs", "2 tbsp milk", "1 tbsp butter", "salt and pepper"),
+    recipe("French Toast", "2 slices of bread", "2 eggs", "1/4 cup milk", "1 tsp cinnamon"),
+    recipe("Egg Fried Rice", "2 cups cooked rice", "2 eggs", "1 tbsp soy sauce", "1 tbsp vegetable oil"),
+    recipe("Peanut Noodles", "200g pasta", "3 tbsp peanut butter", "1 tbsp soy sauce"),
+]
+
+
+def store(**kwargs):
+    recipe_store = RecipeStore(**kwargs)
+    recipe_store.add(BREAKFAST, {})
+    return recipe_store
+
+
+def titles(recipes):
+    return [recipe["title"] for recipe in recipes] if recipes is not None else None
+
+
+def test_answers_from_recipes_the_request_can_cook():
+    recipes = store().search(["Eggs", "milk bottle", "butter", "bread loaf", "cinnamon", "rice", "soy sauce"], {})
+    # All fully covered; French Toast uses the most of the request
+    assert titles(recipes) == ["French Toast", "Scrambled Eggs", "Egg Fried Rice"]
+    assert recipes[1] is BREAKFAST[0]
+
+
+def test_falls_back_when_too_few_recipes_are_covered():
+    recipe_store = store()
+    assert recipe_store.search(["eggs", "milk", "butter"], {}) is None
+    assert recipe_store.stats()["misses"] == 1
+
+
+def test_coverage_threshold():
+    # French Toast has 3 of its 4 ingredients; 0.75 clears a 0.7 threshold but not 0.8
+    request = ["eggs", "milk", "butter", "bread", "rice", "soy sauce"]
+    assert store(min_coverage=0.8).search(request, {}) is None
+    assert titles(store(min_coverage=0.7).search(request, {})) == ["Scrambled Eggs", "Egg Fried Rice", "French Toast"]
+
+
+def test_skips_recipes_with_allergens_or_avoided_ingredients():
+    request = ["eggs", "milk", "butter", "bread", "cinnamon", "rice", "soy sauce", "pasta", "peanut butter"]
+    recipe_store = store(matches=2)
+    assert titles(recipe_store.search(request, {"allergies": ["dairy"], "avoidIngredients": "peanuts"})) is None
+    assert titles(recipe_store.search(request, {"allergies": ["dairy"]})) == ["Egg Fried Rice", "Peanut Noodles"]
+
+
+def test_free_text_preferences_must_match():
+    request = ["eggs", "milk", "butter", "bread", "cinnamon", "rice", "soy sauce"]
+    recipe_store = store()
+    assert recipe_store.search(request, {"cuisineTypes": ["Italian"]}) is None
+    recipe_store.add(BREAKFAST, {"cuisineTypes": ["italian "]})
+    assert recipe_store.search(request, {"cuisineTypes": ["Italian"]}) is not None
+
+
+def test_ranks_preferred_ingredients_first():
+    request = ["eggs", "milk", "butter", "bread", "cinnamon", "rice", "soy sauce"]
+    recipes = store().search(request, {"preferredIngredients": ["rice"]})
+    assert titles(recipes)[0] == "Egg Fried Rice"
+
+
+def test_duplicates_are_stored_once_and_the_oldest_are_dropped():
+    assert store().add(BREAKFAST, {}) == 0
+    recipe_store = store(max_recipes=3)
+    assert len(recipe_store) == 3
+    request = ["eggs", "milk", "butter", "bread", "cinnamon", "rice", "soy sauce", "pasta", "peanut butter"]
+    assert recipe_store.search(request, {}) == BREAKFAST[1:]
+
+
+def test_disk_store_is_shared_and_survives_restarts(tmp_path):
+    path = str(tmp_path / "recipes.sqlite3")
+    request = ["eggs", "milk", "butter", "bread", "cinnamon", "rice", "soy sauce"]
+    first = RecipeStore(path)
+    second = RecipeStore(path)
+    first.add(BREAKFAST, {})
+    # The other worker picks up new rows on its next refresh
+    second._last_refresh = 0.0
+    assert titles(second.search(request, {})) == ["French Toast", "Scrambled Eggs", "Egg Fried Rice"]
+    first.close()
+    second.close()
+    assert len(RecipeStore(path)) == 4
+
+
+def test_exclusions_are_checked_against_the_recipe_text():
+    soup = recipe("Vegetable Soup", "2 cups chicken broth", "2 carrots", "1 onion")
+    crab_rice = recipe("Crab Fried Rice", "2 cups cooked rice", "2 eggs", "1 tbsp soy sauce")
+    recipe_store = RecipeStore(matches=1)
+    recipe_store.add([soup, crab_rice], {})
+    request = ["chicken broth", "carrots", "onion", "rice", "eggs", "soy sauce"]
+    assert titles(recipe_store.search(request, {})) == ["Vegetable Soup"]
+    assert titles(recipe_store.search(request, {"avoidIngredients": ["chicken"]})) == ["Crab Fried Rice"]
+    assert titles(recipe_store.search(request, {"allergies": ["meat"]})) == ["Crab Fried Rice"]
+    assert titles(recipe_store.search(request, {"allergies": ["shellfish"]})) == ["Vegetable Soup"]
+    assert recipe_store.search(request, {"allergies": ["shellfish"], "avoidIngredients": ["chicken"]}) is None
+
+
+def test_unknown_exclusions_match_the_words_of_the_recipe():
+    recipe_store = RecipeStore(matches=1)
+    recipe_store.add([recipe("Sesame Noodles", "200g noodles", "1 tbsp sesame oil", "1 tbsp soy sauce")], {})
+    request = ["noodles", "sesame oil", "soy sauce"]
+    assert titles(recipe_store.search(request, {})) == ["Sesame Noodles"]
+    assert recipe_store.search(request, {"allergies": ["Sesame"]}) is None
@@ -0,0 +1,31 @@
+import io
+import os
+import sys
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from renderer import BoxRenderer, load_font
+
+BOXES = [("milk", [0.1, 0.1, 0.5, 0.5]), ("whole image", [0, 0, 1, 1]), ("bad", [0.1, 0.2])]
+
+
+def test_renders_in_the_requested_format():
+    for image_format in ("JPEG", "WEBP", "PNG"):
+        output = BoxRenderer(max_edge=0, image_format=image_format).render(Image.new("RGB", (200, 100)), BOXES)
+        assert Image.open(io.BytesIO(output)).format == image_format
+
+
+def test_large_images_are_reduced_for_display():
+    output = BoxRenderer(max_edge=500, image_format="JPEG").render(Image.new("RGB", (2000, 1000)), BOXES)
+    assert Image.open(io.BytesIO(output)).size == (500, 250)
+
+
+def test_non_rgb_images_are_converted():
+    output = BoxRenderer(max_edge=0, image_format="JPEG").render(Image.new("RGBA", (200, 100)), BOXES)
+    assert Image.open(io.BytesIO(output)).mode == "RGB"
+
+
+def test_fonts_are_loaded_once_per_size():
+    assert load_font(20) is load_font(20)
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from google.api_core.exceptions import InvalidArgument, ResourceExhausted, ServiceUnavailable
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gemini_client import ModelClient
+from scheduler import Overloaded, Scheduler, parse_rpm
+
+
+class FlakyModel:
+    """Fails with each of ``errors`` in turn, then answers."""
+
+    model_name = "models/flaky"
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        if stream:
+            return iter([SimpleNamespace(text="ok", usage_metadata=None)])
+        return SimpleNamespace(text="ok", usage_metadata=None)
+
+
+def test_parse_rpm_default_and_overrides():
+    assert parse_rpm("1000,models/gemini-1.5-pro=360, flash = 15") == (1000, {"gemini-1.5-pro": 360, "flash": 15})
+    assert parse_rpm("gemini-1.5-pro=2") == (0, {"gemini-1.5-pro": 2})
+
+
+def test_token_bucket_limits_rate_after_burst():
+    scheduler = Scheduler(rpm="1200", burst=2)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(scheduler.acquire("flash") for _ in range(6)))
+        return time.perf_counter() - start
+
+    # Two calls go at once, the other four at 20 per second
+    assert 0.18 < asyncio.run(run()) < 0.5
+
+
+def test_waiters_are_served_by_priority_then_arrival():
+    scheduler = Scheduler(rpm="600", burst=1, priority="vision,recipe")
+    order = []
+
+    async def call(priority, label):
+        await scheduler.acquire("flash", priority)
+        order.append(label)
+
+    async def run():
+        await scheduler.acquire("flash", "recipe")
+        tasks = [asyncio.ensure_future(call("recipe", "recipe 1"))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(call("vision", "vision 1")), asyncio.ensure_future(call("recipe", "recipe 2"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(call("vision", "vision 2")))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    assert order == ["vision 1", "vision 2", "recipe 1", "recipe 2"]
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    scheduler = Scheduler(rpm="60", burst=1, queue_max=2)
+
+    async def run():
+        await scheduler.acquire("pro")
+        waiters = [asyncio.ensure_future(scheduler.acquire("pro")) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as error:
+            await scheduler.acquire("pro")
+        # Cancelled waiters leave the queue
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        return error.value
+
+    error = asyncio.run(run())
+    assert error.status_code == 429
+    assert error.retry_after == 3
+    assert dict(((model, priority), depth) for model, priority, depth in scheduler.depths()) == {("pro", "other"): 0}
+
+
+def test_rate_limited_calls_are_retried_with_backoff():
+    client = ModelClient(scheduler=Scheduler(rpm="0", backoff_base=0.01, seed=1))
+    model = FlakyModel(ResourceExhausted("quota"), ServiceUnavailable("busy"))
+    response = asyncio.run(client.generate_content(model, "prompt", priority="recipe"))
+    assert response.text == "ok"
+    assert model.calls == 3
+
+
+def test_exhausted_retries_become_overloaded_and_other_errors_are_not_retried():
+    client = ModelClient(scheduler=Scheduler(rpm="0", retries=1, backoff_base=0.01))
+    model = FlakyModel(ServiceUnavailable("busy"), ServiceUnavailable("busy"))
+    with pytest.raises(Overloaded) as error:
+        asyncio.run(client.generate_content(model, "prompt"))
+    assert error.value.status_code == 503
+    assert model.calls == 2
+
+    model = FlakyModel(InvalidArgument("bad prompt"))
+    with pytest.raises(InvalidArgument):
+        asyncio.run(client.generate_content(model, "prompt"))
+    assert model.calls == 1
+
+
+def test_streams_are_retried_before_the_first_chunk():
+    client = ModelClient(scheduler=Scheduler(rpm="0", backoff_base=0.01))
+    model = FlakyModel(ResourceExhausted("quota"))
+
+    async def collect():
+        return [text async for text in client.stream_content(model, "prompt", priority="recipe")]
+
+    assert asyncio.run(collect()) == ["ok"]
+    assert model.calls == 2
@@ -0,0 +1,26 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serve import configure_shared_caches
+
+
+def test_several_workers_share_the_disk_caches():
+    environ = {}
+    assert configure_shared_caches(1, "shared.sqlite3", environ) == []
+    assert environ == {}
+    assert configure_shared_caches(4, "shared.sqlite3", environ) == []
+    for prefix in ("ANALYSIS", "RECIPE", "LABELED_IMAGE"):
+        assert environ[f"{prefix}_CACHE_BACKEND"] == "disk"
+        assert environ[f"{prefix}_CACHE_PATH"] == "shared.sqlite3"
+    assert environ["RECIPE_STORE_BACKEND"] == "disk"
+    assert environ["RECIPE_STORE_PATH"] == "shared.sqlite3"
+
+
+def test_explicit_cache_settings_are_kept_and_private_caches_reported():
+    environ = {"RECIPE_CACHE_BACKEND": "memory", "ANALYSIS_CACHE_BACKEND": "none"}
+    warnings = configure_shared_caches(2, "shared.sqlite3", environ)
+    assert environ["RECIPE_CACHE_BACKEND"] == "memory"
+    assert environ["ANALYSIS_CACHE_BACKEND"] == "none"
+    assert warnings == ["RECIPE_CACHE_BACKEND=memory is private to each of the 2 workers"]
@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import parse_recipes
+from streaming import JsonArrayStreamParser
+from stub_gemini import load_recordings
+
+DOCUMENT = '{"recipes": [{"title": "Omelette", "steps": ["Whisk", "Cook"]}, {"title": "Toast"}]}'
+
+
+def feed_all(chunks, key="recipes"):
+    parser = JsonArrayStreamParser(key)
+    emitted = []
+    for chunk in chunks:
+        emitted.append(parser.feed(chunk))
+    return parser, emitted
+
+
+def test_objects_are_emitted_when_their_closing_brace_arrives():
+    chunks = [DOCUMENT[i:i + 7] for i in range(0, len(DOCUMENT), 7)]
+    parser, emitted = feed_all(chunks)
+    assert [obj for objects in emitted for obj in objects] == [
+        {"title": "Omelette", "steps": ["Whisk", "Cook"]}, {"title": "Toast"},
+    ]
+    # Each object arrives with the chunk holding its closing brace, not at the end
+    first = next(index for index, objects in enumerate(emitted) if objects)
+    assert first < len(chunks) - 3
+    assert parser.done
+
+
+def test_single_character_chunks():
+    parser, emitted = feed_all(list(DOCUMENT))
+    assert [obj["title"] for objects in emitted for obj in objects] == ["Omelette", "Toast"]
+
+
+def test_escaped_quotes_and_braces_inside_strings():
+    document = r'{"recipes": [{"title": "Mum\u2019s \"best\" {quick} pie", "note": "use a [9\"] tin \\"}, {"title": "}"}]}'
+    _, emitted = feed_all([document[i:i + 3] for i in range(0, len(document), 3)])
+    assert [obj for objects in emitted for obj in objects] == [
+        {"title": "Mum\u2019s \"best\" {quick} pie", "note": 'use a [9"] tin \\'}, {"title": "}"},
+    ]
+
+
+def test_fences_and_prose_before_the_array():
+    text = 'Here are three recipes for you!\n\n```json\n' + DOCUMENT + '\n```\nEnjoy.'
+    _, emitted = feed_all([text[i:i + 11] for i in range(0, len(text), 11)])
+    assert [obj["title"] for objects in emitted for obj in objects] == ["Omelette", "Toast"]
+
+
+def test_prose_quoting_the_key_does_not_emit_bogus_objects():
+    text = (
+        'I will answer with "recipes": [ one {"title": "string"} object per dish ], like this:\n'
+        "```json\n" + DOCUMENT + "\n```"
+    )
+    parser, emitted = feed_all([text[i:i + 5] for i in range(0, len(text), 5)])
+    assert [obj["title"] for objects in emitted for obj in objects] == ["Omelette", "Toast"]
+    assert parser.done
+
+
+def test_other_shapes_yield_nothing_for_the_full_parse():
+    _, emitted = feed_all(['Sure! {"recipes": [{"title": "Omelette"}]}'])
+    assert emitted == [[]]
+
+
+def test_recorded_responses_stream_the_same_recipes_as_a_full_parse():
+    for text in load_recordings()["text"]:
+        _, emitted = feed_all([text[i:i + 40] for i in range(0, len(text), 40)])
+        streamed = [obj for objects in emitted for obj in objects]
+        assert [obj["title"] for obj in streamed] == [recipe["title"] for recipe in parse_recipes(text)["recipes"]]
+
+
+def test_stream_endpoint_sends_each_recipe_then_done(client):
+    payload = {"ingredients": ["eggs", "spinach", "cheddar cheese"], "preferences": {}}
+    response = client.post("/generate-recipe/stream/", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "content-encoding" not in response.headers
+    events = [json.loads(line) for line in response.text.splitlines()]
+    recipes = parse_recipes(load_recordings()["text"][0])["recipes"]
+    assert events[:-1] == [{"type": "recipe", "index": index, "recipe": recipe} for index, recipe in enumerate(recipes)]
+    assert events[-1] == {"type": "done", "cached": False}
+
+    # The same request again is answered from the recipe cache
+    events = [json.loads(line) for line in client.post("/generate-recipe/stream/", json=payload).text.splitlines()]
+    assert [event["recipe"] for event in events[:-1]] == recipes
+    assert events[-1] == {"type": "done", "cached": True}
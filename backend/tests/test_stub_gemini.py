@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+from google.api_core.exceptions import GoogleAPICallError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsing import parse_detected_items, parse_recipes
+from stub_gemini import StubModel, load_recordings
+
+IMAGE = {"mime_type": "image/jpeg", "data": b"\xff\xd8\xff"}
+
+
+def test_replays_vision_and_text_recordings_in_order():
+    recordings = load_recordings()
+    model = StubModel("gemini-1.5-pro", latency=0)
+    assert model.model_name == "models/gemini-1.5-pro"
+    for expected in recordings["vision"]:
+        assert model.generate_content(["prompt", IMAGE]).text == expected
+    assert model.generate_content("prompt").text == recordings["text"][0]
+    assert model.generate_content(["prompt", IMAGE]).text == recordings["vision"][0]
+
+
+def test_recordings_parse():
+    model = StubModel("gemini-2.0-flash", latency=0)
+    for _ in load_recordings()["vision"]:
+        assert parse_detected_items(model.generate_content(["prompt", IMAGE]).text)[1]
+    for _ in load_recordings()["text"]:
+        assert parse_recipes(model.generate_content("prompt").text)["recipes"]
+
+
+def test_injected_errors_are_seeded_and_look_like_api_errors():
+    def outcomes(seed):
+        model = StubModel("gemini-2.0-flash", latency=0, error_rate=0.3, seed=seed)
+        results = []
+        for _ in range(50):
+            try:
+                model.generate_content("prompt")
+                results.append(None)
+            except GoogleAPICallError as e:
+                results.append(e.code)
+        return results
+
+    assert outcomes(1) == outcomes(1)
+    assert {code for code in outcomes(1) if code} == {429, 503}
+    assert 5 < sum(1 for code in outcomes(1) if code) < 30
+
+
+def test_streams_with_usage_on_the_last_chunk():
+    model = StubModel("gemini-2.0-flash", latency=0.01)
+
+    async def collect():
+        response = await model.generate_content_async("prompt", stream=True)
+        return [chunk async for chunk in response]
+
+    chunks = asyncio.run(collect())
+    assert "".join(chunk.text for chunk in chunks) == load_recordings()["text"][0]
+    assert chunks[-1].usage_metadata.candidates_token_count > 0
+    assert all(chunk.usage_metadata is None for chunk in chunks[:-1])
+
+
+def test_latency_is_applied():
+    model = StubModel("gemini-2.0-flash", latency=0.05)
+    start = time.perf_counter()
+    model.generate_content("prompt")
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_rejects_incomplete_recordings(tmp_path):
+    path = tmp_path / "recordings.json"
+    path.write_text('{"vision": ["{}"]}')
+    with pytest.raises(ValueError):
+        load_recordings(str(path))
@@ -0,0 +1,162 @@
+import asyncio
+import io
+import os
+import sys
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.datastructures import Headers, UploadFile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_processing import CorruptImage, ImageTooLarge, prepare_image
+from uploads import BodySizeLimitMiddleware, read_upload
+
+JPEG_HEADER = b"\xff\xd8\xff\xe0"
+
+
+def upload(data, content_type="image/jpeg", size=None):
+    return UploadFile(io.BytesIO(data), size=size, headers=Headers({"content-type": content_type}))
+
+
+def read(file, **kwargs):
+    return asyncio.run(read_upload(file, **kwargs))
+
+
+def limited_app(max_bytes):
+    """An upload endpoint like /analyze-image/ behind ``BodySizeLimitMiddleware``."""
+    from fastapi import FastAPI, File, UploadFile as FastAPIUpload
+
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=max_bytes)
+    app.state.reads = 0
+
+    @app.post("/upload/")
+    async def receive_upload(file: FastAPIUpload = File(...)):
+        app.state.reads += 1
+        return {"size": len(await read_upload(file))}
+
+    return app
+
+
+def test_reads_the_whole_upload_in_chunks():
+    data = JPEG_HEADER + b"0" * 1000
+    assert read(upload(data), chunk_size=64) == data
+
+
+def test_rejects_oversized_uploads():
+    with pytest.raises(HTTPException) as error:
+        read(upload(JPEG_HEADER + b"0" * 1000), max_bytes=500, chunk_size=64)
+    assert error.value.status_code == 413
+    with pytest.raises(HTTPException) as error:
+        read(upload(JPEG_HEADER, size=10_000), max_bytes=500)
+    assert error.value.status_code == 413
+
+
+def test_rejects_non_images_by_type_and_magic_bytes():
+    for file in (upload(JPEG_HEADER, content_type="text/plain"), upload(b"GIF-ish but not really")):
+        with pytest.raises(HTTPException) as error:
+            read(file)
+        assert error.value.status_code == 415
+
+
+def test_decompression_bombs_are_rejected_before_decoding():
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("L", (2000, 2000)).save(buffer, format="PNG")
+    with pytest.raises(ImageTooLarge):
+        prepare_image(buffer.getvalue(), "image/png", max_pixels=1_000_000)
+
+
+def jpeg(size):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 120, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("size", [(64, 48), (3000, 2000)])
+def test_truncated_images_are_corrupt(size):
+    data = jpeg(size)
+    assert prepare_image(data).original_size == size
+    with pytest.raises(CorruptImage):
+        prepare_image(data[:len(data) // 2])
+
+
+def test_truncated_uploads_get_a_415(client):
+    truncated = jpeg((3000, 2000))[:20000]
+    response = client.post("/analyze-image/?image=none", files={"file": ("fridge.jpg", truncated, "image/jpeg")})
+    assert response.status_code == 415
+    assert response.json()["detail"].startswith("Could not decode image")
+
+    files = [("files", ("fridge.jpg", jpeg((64, 48)), "image/jpeg")), ("files", ("cut.jpg", truncated, "image/jpeg"))]
+    fridge, cut = client.post("/analyze-images/?image=none", files=files).json()["images"]
+    assert fridge["food_items"]
+    assert cut["error"].startswith("Could not decode image")
+    response = client.post("/analyze-images/?image=none", files=[files[1]])
+    assert response.status_code == 415
+
+    job = client.post("/jobs/", files={"file": ("fridge.jpg", truncated, "image/jpeg")}).json()
+    for _ in range(500):
+        job = client.get(f"/jobs/{job['id']}").json()
+        if job["status"] == "failed":
+            break
+        time.sleep(0.01)
+    assert job["error"].startswith("Could not decode image")
+
+
+def test_body_over_the_declared_content_length_limit_gets_a_413(main_module):
+    """The app rejects a too-large Content-Length from the headers, without reading the body."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/analyze-image/", "raw_path": b"/analyze-image/", "query_string": b"", "root_path": "",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=x"), (b"content-length", b"10000000000")],
+        "server": ("test", 80), "client": ("127.0.0.1", 1),
+    }
+    messages = []
+
+    async def receive():
+        raise AssertionError("the body should not be read")
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(main_module.app(scope, receive, send))
+    assert messages[0]["status"] == 413
+    assert b"larger than" in b"".join(message.get("body", b"") for message in messages[1:])
+
+
+def test_streamed_body_over_the_limit_gets_a_413():
+    from fastapi.testclient import TestClient
+
+    app = limited_app(max_bytes=4096)
+    with TestClient(app) as client:
+        small = client.post("/upload/", files={"file": ("a.jpg", JPEG_HEADER + b"0" * 100, "image/jpeg")})
+        assert small.json() == {"size": 104}
+
+        response = client.post("/upload/", files={"file": ("a.jpg", JPEG_HEADER + b"0" * 10_000, "image/jpeg")})
+        assert response.status_code == 413
+
+        # Chunked, so there is no Content-Length to check up front
+        boundary = "x"
+        head = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + JPEG_HEADER
+
+        def body():
+            yield head
+            for _ in range(10):
+                yield b"0" * 1024
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        response = client.post(
+            "/upload/", content=body(), headers={"content-type": f"multipart/form-data; boundary={boundary}"}
+        )
+        assert "content-length" not in response.request.headers
+        assert response.status_code == 413
+        assert "larger than 4096 bytes" in response.json()["detail"]
+    assert app.state.reads == 1
@@ -0,0 +1,95 @@
+"""Bounded ingestion of image uploads.
+
+Uploads are read in chunks and rejected as early as possible: by declared
+size, by content type, by magic bytes on the first chunk, and as soon as the
+running total passes ``UPLOAD_MAX_BYTES``. ``BodySizeLimitMiddleware`` caps the
+whole request body before the multipart parser spools it.
+"""
+import os
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from image_processing import image_mime_type
+
+# Max size of a single uploaded image
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# Max size of a whole request body (a batch holds several images)
+REQUEST_MAX_BYTES = int(os.getenv("REQUEST_MAX_BYTES", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Formats Pillow can decode without plugins and the model accepts
+ALLOWED_IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+
+
+async def read_upload(upload, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Read an UploadFile in chunks. Raises a 413 or 415 HTTPException for bad uploads."""
+    if upload.size is not None and upload.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Image is larger than {max_bytes} bytes")
+    if upload.content_type and not upload.content_type.startswith("image/"):
+        raise HTTPException(status_code=415, detail=f"Unsupported content type: {upload.content_type}")
+
+    first = await upload.read(chunk_size)
+    if image_mime_type(first[:16]) not in ALLOWED_IMAGE_TYPES:
+        raise HTTPException(status_code=415, detail="File is not a JPEG, PNG, WebP or GIF image")
+
+    chunks = [first]
+    total = len(first)
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Image is larger than {max_bytes} bytes")
+        chunks.append(chunk)
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies over ``max_bytes`` with a 413, by Content-Length or while streaming."""
+
+    def __init__(self, app, max_bytes=REQUEST_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        too_large = JSONResponse({"detail": f"Request body is larger than {self.max_bytes} bytes"}, status_code=413)
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                return await too_large(scope, receive, send)
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Stop feeding the app; whatever error it responds with is replaced by a 413
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def limited_send(message):
+            nonlocal rejected
+            if not exceeded:
+                await send(message)
+            elif message["type"] == "http.response.start" and not rejected:
+                rejected = True
+                await too_large(scope, receive, send)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except Exception:
+            # The app gave up on the truncated body (e.g. ClientDisconnect)
+            if not exceeded:
+                raise
+        if exceeded and not rejected:
+            await too_large(scope, receive, send)
@@ -14,6 +14,9 @@ export async function POST(req: Request) {
     const requestData = await req.json();
     const { ingredients, preferences: clientPreferences } = requestData;
     
+    // Clients that can consume NDJSON ask for the streaming variant with ?stream=1
+    const stream = new URL(req.url).searchParams.get('stream') === '1';
+    
     // Get user preferences from cookie if user is logged in and client didn't provide preferences
     let userPreferences = clientPreferences || {};
     if (userId && !clientPreferences) {
@@ -34,7 +37,9 @@ export async function POST(req: Request) {
     // Call the backend API
     const backendUrl = process.env.BACKEND_URL || 'http://localhost:8000';
     
-    const response = await fetch(`${backendUrl}/generate-recipe/`, {
+    const endpoint = stream ? 'generate-recipe/stream/' : 'generate-recipe/';
+    const fetchStart = Date.now();
+    const response = await fetch(`${backendUrl}/${endpoint}`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
@@ -42,16 +47,36 @@ export async function POST(req: Request) {
       body: JSON.stringify(backendRequestData),
     });
     
+    // Pass the backend's Server-Timing spans (sent when it runs with SERVER_TIMING=1)
+    // through to the browser, plus the time this route waited for the response headers
+    const backendTiming = response.headers.get('Server-Timing');
+    const timingHeaders = {
+      'Server-Timing': [backendTiming, `backend-fetch;dur=${Date.now() - fetchStart}`]
+        .filter(Boolean)
+        .join(', '),
+    };
+    
     if (!response.ok) {
       const errorData = await response.json();
       return NextResponse.json(
         { error: errorData.detail || 'Failed to generate recipe' },
-        { status: response.status }
+        { status: response.status, headers: timingHeaders }
       );
     }
     
+    if (stream) {
+      // Pass each recipe event through as soon as the backend emits it
+      return new Response(response.body, {
+        headers: {
+          'Content-Type': 'application/x-ndjson',
+          'Cache-Control': 'no-cache',
+          ...timingHeaders,
+        },
+      });
+    }
+    
     const recipe = await response.json();
-    return NextResponse.json(recipe);
+    return NextResponse.json(recipe, { headers: timingHeaders });
   } catch (error) {
     console.error('Error generating recipe:', error);
     return NextResponse.json(
@@ -68,8 +68,9 @@ export default function RecipePage() {
         userPreferences = preferencesData.preferences || {};
       }
       
-      // Then send both ingredients and preferences to the backend
-      const response = await fetch("/api/generate-recipe", {
+      // Then send both ingredients and preferences to the backend, streaming
+      // each recipe back as soon as it has been generated
+      const response = await fetch("/api/generate-recipe?stream=1", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -80,30 +81,43 @@ export default function RecipePage() {
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`Error: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      if (data.error) {
-        setError(data.error);
-      } else {
-        // Check if we have the new format with multiple recipes
-        if (data.recipes && Array.isArray(data.recipes) && data.recipes.length > 0) {
-          // Set the first recipe as the selected one
-          setRecipe(data.recipes[0]);
-          // Use the actual recipes from the response
-          setAlternativeRecipes(data.recipes);
-        } else {
-          // Fallback for old format
-          setRecipe(data);
-          setAlternativeRecipes([
-            data,
-            {...data, title: `${data.title} Variation 1`},
-            {...data, title: `${data.title} Variation 2`},
-          ]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const recipes: Recipe[] = [];
+      let buffer = "";
+
+      const handleLine = (line: string) => {
+        if (!line.trim()) return;
+        const event = JSON.parse(line);
+        if (event.type === "recipe") {
+          recipes.push(event.recipe);
+          if (recipes.length === 1) {
+            // Show the first recipe right away instead of waiting for all three
+            setRecipe(event.recipe);
+            setLoading(false);
+          }
+          setAlternativeRecipes([...recipes]);
+        } else if (event.type === "error") {
+          setError(event.detail);
         }
+      };
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split("\n");
+        buffer = lines.pop() ?? "";
+        lines.forEach(handleLine);
+      }
+      handleLine(buffer);
+
+      if (recipes.length === 0) {
+        setError((current) => current ?? "Failed to parse recipe");
       }
     } catch (error) {
       console.error("Error generating recipe:", error);
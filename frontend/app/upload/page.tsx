@@ -125,41 +125,31 @@ export default function UploadPage() {
     setAllDetectedItems([]);
 
     try {
-      // Process each file sequentially
-      const results: AnalyzedImage[] = [];
-      const allItems: string[] = [];
+      // Send every photo in one request; the backend analyzes them concurrently
+      // and merges the detected items
+      const formData = new FormData();
+      files.forEach(file => formData.append("files", file));
       
-      for (let i = 0; i < files.length; i++) {
-        const formData = new FormData();
-        formData.append("file", files[i]);
-        
-        // Send the request to the backend
-        const response = await fetch("http://localhost:8000/analyze-image/", {
-          method: "POST",
-          body: formData,
-        });
-
-        if (!response.ok) {
-          throw new Error(`Error analyzing image ${i+1}: ${response.status}`);
-        }
+      // Ask for a URL to each labeled image rather than inlining it as base64 in the JSON
+      const response = await fetch("http://localhost:8000/analyze-images/?image=url", {
+        method: "POST",
+        body: formData,
+      });
 
-        const data = await response.json();
-        
-        // Add to results
-        const imageResult: AnalyzedImage = {
-          image: `data:image/jpeg;base64,${data.labeled_image}`,
-          items: data.food_items || []
-        };
-        
-        results.push(imageResult);
-        
-        // Add unique items to the all items list
-        data.food_items?.forEach((item: string) => {
-          if (!allItems.includes(item)) {
-            allItems.push(item);
-          }
-        });
+      if (!response.ok) {
+        throw new Error(`Error analyzing images: ${response.status}`);
       }
+
+      const data = await response.json();
+      
+      // Images that failed individually are skipped
+      const results: AnalyzedImage[] = data.images
+        .filter((result: { error?: string }) => !result.error)
+        .map((result: { labeled_image_url?: string; labeled_image?: string; food_items?: string[] }) => ({
+          image: result.labeled_image_url ?? `data:image/jpeg;base64,${result.labeled_image}`,
+          items: result.food_items || []
+        }));
+      const allItems: string[] = data.food_items || [];
       
       setAnalyzedImages(results);
       setAllDetectedItems(allItems);
@@ -270,6 +260,7 @@ export default function UploadPage() {
                     <Image 
                       src={currentImage.image}
                       alt="Analyzed fridge contents"
+                      unoptimized
                       fill
                       style={{ objectFit: 'contain' }}
                       className="p-2"